@@ -0,0 +1,157 @@
+"""
+chat_context.py — token-budgeted multi-turn context with a rolling summary
+"""
+import functools
+import re
+
+MESSAGE_OVERHEAD = 4    # role/separator tokens the chat format adds per message
+_ENCODER = None
+
+def _encoder():
+    """tiktoken's o200k encoder when installed, else False (character heuristic)."""
+    global _ENCODER
+    if _ENCODER is None:
+        try:
+            import tiktoken
+            _ENCODER = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _ENCODER = False
+    return _ENCODER
+
+@functools.lru_cache(maxsize=4096)
+def count_tokens(text):
+    enc = _encoder()
+    if enc:
+        return len(enc.encode(text))
+    return (len(text) + 3) // 4
+
+def truncate_to_tokens(text, max_tokens):
+    """Longest prefix of `text` (cut at a word boundary) that fits in `max_tokens`."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens - 1:
+            lo = mid
+        else:
+            hi = mid - 1
+    cut = text[:lo]
+    return (cut.rsplit(" ", 1)[0] if " " in cut else cut) + "…"
+
+@functools.lru_cache(maxsize=32)
+def compact_plan(raw, max_tokens=400):
+    """Plan text with table pipes, separators and extra whitespace removed, capped at `max_tokens`."""
+    lines = []
+    for line in raw.splitlines():
+        line = line.strip()
+        if not line or re.fullmatch(r"\|?[\s:\-|]+\|?", line):
+            continue
+        if line.startswith("|"):
+            line = "; ".join(c.strip() for c in line.strip("|").split("|") if c.strip())
+        lines.append(re.sub(r"\s+", " ", line.lstrip("#*- ").strip()))
+    return truncate_to_tokens("\n".join(lines), max_tokens)
+
+class ChatContext:
+    """
+    Conversation turns with cached token counts.
+
+    `messages()` always fits `budget` tokens: system prompt, optional plan
+    context, the rolling summary and as many recent turns as fit. When the
+    kept turns exceed their share of the budget, the oldest are moved out
+    (down to `low_water` of it, so compaction runs in batches rather than on
+    every turn) and folded into the summary by `compact()`.
+    """
+    def __init__(self, budget=3000, reply_reserve=600, summary_tokens=300, plan_tokens=400, low_water=0.6):
+        self.budget = budget
+        self.reply_reserve = reply_reserve
+        self.summary_tokens = summary_tokens
+        self.plan_tokens = plan_tokens
+        self.low_water = low_water
+        self.turns = []         # [(role, text, tokens)]
+        self.turn_tokens = 0
+        self.summary = ""
+        self.pending = []       # turns evicted but not yet summarized
+
+    def add(self, role, text):
+        n = count_tokens(text) + MESSAGE_OVERHEAD
+        self.turns.append((role, text, n))
+        self.turn_tokens += n
+
+    def pop(self):
+        """Remove and return the newest turn as (role, text), e.g. a message whose request failed."""
+        role, text, n = self.turns.pop()
+        self.turn_tokens -= n
+        return role, text
+
+    def clear(self):
+        self.turns, self.turn_tokens, self.summary, self.pending = [], 0, "", []
+
+    def _turn_budget(self, system, plan):
+        fixed = count_tokens(system) + MESSAGE_OVERHEAD + self.reply_reserve
+        fixed += self.summary_tokens + MESSAGE_OVERHEAD
+        if plan:
+            fixed += self.plan_tokens + MESSAGE_OVERHEAD
+        return max(0, self.budget - fixed)
+
+    def needs_compaction(self, system, plan=None):
+        return self.turn_tokens > self._turn_budget(system, plan)
+
+    def _evict(self):
+        role, text, n = self.turns.pop(0)
+        self.turn_tokens -= n
+        self.pending.append((role, text))
+
+    def compact(self, system, plan=None, summarize=None):
+        """
+        Evict the oldest turns down to the low-water mark and fold them into the
+        summary. `summarize(summary, turns, max_tokens)` returns the new summary;
+        without it (or if it fails) evicted turns are kept as clipped excerpts.
+        """
+        target = self._turn_budget(system, plan) * self.low_water
+        while len(self.turns) > 1 and self.turn_tokens > target:
+            self._evict()
+        # the kept window starts at a user turn
+        while len(self.turns) > 1 and self.turns[0][0] != "you":
+            self._evict()
+        if not self.pending:
+            return
+        summary = None
+        if summarize is not None:
+            try:
+                summary = summarize(self.summary, self.pending, self.summary_tokens)
+            except Exception:
+                summary = None
+        if not summary:
+            excerpts = [f"{'User' if r == 'you' else 'Assistant'}: {truncate_to_tokens(t, 40)}"
+                        for r, t in self.pending]
+            summary = "\n".join(([self.summary] if self.summary else []) + excerpts)
+            # keep the most recent excerpts when clipping
+            while count_tokens(summary) > self.summary_tokens and "\n" in summary:
+                summary = summary.split("\n", 1)[1]
+        self.summary = truncate_to_tokens(summary, self.summary_tokens)
+        self.pending = []
+
+    def messages(self, system, plan=None):
+        """OpenAI chat messages for the next request, within the token budget."""
+        msgs = [{"role": "system", "content": system}]
+        if plan:
+            msgs.append({"role": "system",
+                         "content": "The student's current study plan:\n" + compact_plan(plan, self.plan_tokens)})
+        if self.summary:
+            msgs.append({"role": "system", "content": "Summary of the earlier conversation:\n" + self.summary})
+        room = self._turn_budget(system, plan)
+        recent = []
+        for role, text, n in reversed(self.turns):
+            if n > room:
+                if not recent:  # the newest turn always goes in, clipped if need be
+                    recent.append({"role": "user" if role == "you" else "assistant",
+                                   "content": truncate_to_tokens(text, max(1, room - MESSAGE_OVERHEAD))})
+                break
+            room -= n
+            recent.append({"role": "user" if role == "you" else "assistant", "content": text})
+        msgs.extend(reversed(recent))
+        return msgs
+
+    def prompt_tokens(self, messages):
+        return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD for m in messages)
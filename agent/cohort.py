@@ -0,0 +1,212 @@
+"""
+cohort.py — asyncio generation of LLM study plans for a whole cohort, with
+bounded concurrency, a token-bucket rate limit and resumable JSONL output
+Run: python -m agent.cohort profiles.jsonl --out plans.jsonl --concurrency 16 --rps 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from agent.llm_client import is_retryable, retry_after
+from agent.plan_model import PLAN_RESPONSE_FORMAT, StudyPlan
+from agent.prompts import plan_messages
+from agent.utils import percentile
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, with bursts of up to `burst`."""
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def load_checkpoint(path):
+    """
+    Ids already completed successfully in an earlier run of `path`.
+    A half-written last line (crash mid-write) is cut off so appends stay valid JSONL.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    for line in data[:end].decode("utf-8").splitlines():
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue
+        if rec.get("ok"):
+            done.add(rec["id"])
+    return done
+
+def iter_profiles(src):
+    """(id, profile) for every non-blank JSONL line; id is the profile's "id" or its line number."""
+    for index, line in enumerate(src):
+        if line.strip():
+            profile = json.loads(line)
+            yield str(profile.get("id", index)), profile
+
+class CohortGenerator:
+    """
+    Generates one plan per profile with `concurrency` workers sharing an
+    AsyncOpenAI client and a TokenBucket. Results are appended to the output
+    JSONL as they complete (completion order, one line per attempt set), which
+    doubles as the checkpoint: a rerun skips ids already written with ok=true.
+    """
+    def __init__(self, client, model="gpt-4o-mini", temperature=0.25, structured=True,
+                 concurrency=8, rps=5.0, burst=None, max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        self.client = client
+        self.model = model
+        self.temperature = temperature
+        self.structured = structured
+        self.concurrency = concurrency
+        self.rps = rps
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    async def _complete(self, bucket, messages):
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            try:
+                kwargs = {"response_format": PLAN_RESPONSE_FORMAT} if self.structured else {}
+                res = await self.client.chat.completions.create(
+                    model=self.model, messages=messages, temperature=self.temperature, **kwargs
+                )
+                return res.choices[0].message.content or "", attempt + 1
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                hinted = retry_after(e)
+                if hinted is not None:
+                    delay = max(delay, min(hinted, self.backoff_max))
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _generate(self, bucket, pid, profile):
+        name = profile.get("name") or "Student"
+        t0 = time.perf_counter()
+        rec = {"id": pid, "name": name}
+        try:
+            content, attempts = await self._complete(bucket, plan_messages(profile, self.structured))
+            if self.structured:
+                rec["plan"] = StudyPlan.from_json(content, name).to_dict()
+            else:
+                rec["raw"] = content
+            rec.update(ok=True, attempts=attempts)
+        except Exception as e:
+            rec.update(ok=False, error=f"{type(e).__name__}: {e}")
+        rec["latency"] = time.perf_counter() - t0
+        return rec
+
+    async def run(self, profiles, out_path, resume=True):
+        """Generate plans for an iterable of (id, profile) into `out_path`; returns stats."""
+        done = load_checkpoint(out_path) if resume else set()
+        bucket = TokenBucket(self.rps, self.burst)
+        work = asyncio.Queue(maxsize=2 * self.concurrency)
+        latencies, stats = [], {"ok": 0, "failed": 0, "skipped": 0, "retries": 0}
+
+        with open(out_path, "a" if resume else "w", encoding="utf-8") as out:
+            async def worker():
+                while True:
+                    item = await work.get()
+                    if item is None:
+                        return
+                    rec = await self._generate(bucket, *item)
+                    out.write(json.dumps(rec, default=str) + "\n")
+                    out.flush()
+                    if rec["ok"]:
+                        stats["ok"] += 1
+                        stats["retries"] += rec["attempts"] - 1
+                        latencies.append(rec["latency"])
+                    else:
+                        stats["failed"] += 1
+
+            t0 = time.perf_counter()
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            try:
+                for pid, profile in profiles:
+                    if pid in done:
+                        stats["skipped"] += 1
+                        continue
+                    await work.put((pid, profile))  # waits while workers are saturated
+                for _ in workers:
+                    await work.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                # on cancellation or error, stop in-flight requests before the file closes
+                for w in workers:
+                    w.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+            elapsed = time.perf_counter() - t0
+
+        latencies.sort()
+        stats.update(seconds=elapsed, plans_per_sec=stats["ok"] / elapsed if elapsed else 0.0,
+                     p50=percentile(latencies, 50), p95=percentile(latencies, 95),
+                     max=latencies[-1] if latencies else 0.0)
+        return stats
+
+def make_async_client(api_key=None, base_url=None, max_connections=64, timeout=60.0):
+    from openai import DEFAULT_CONNECTION_LIMITS, AsyncOpenAI, DefaultAsyncHttpxClient
+    limits = type(DEFAULT_CONNECTION_LIMITS)(max_connections=max_connections,
+                                             max_keepalive_connections=max_connections)
+    http = DefaultAsyncHttpxClient(limits=limits, timeout=timeout)
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http, max_retries=0)
+
+def print_report(stats, out=sys.stderr):
+    print(f"generated {stats['ok']} plans ({stats['failed']} failed, {stats['skipped']} already done, "
+          f"{stats['retries']} retries) in {stats['seconds']:.2f}s ({stats['plans_per_sec']:.2f} plans/sec)",
+          file=out)
+    print(f"latency p50 {stats['p50'] * 1000:.0f} ms  p95 {stats['p95'] * 1000:.0f} ms  "
+          f"max {stats['max'] * 1000:.0f} ms", file=out)
+
+async def _main(args):
+    client = make_async_client(args.api_key or os.environ.get("OPENAI_API_KEY"),
+                               args.base_url or os.environ.get("OPENAI_BASE_URL"),
+                               max_connections=args.concurrency)
+    gen = CohortGenerator(client, model=args.model, temperature=args.temperature,
+                          structured=not args.markdown, concurrency=args.concurrency,
+                          rps=args.rps, burst=args.burst)
+    try:
+        with open(args.profiles, encoding="utf-8") as src:
+            return await gen.run(iter_profiles(src), args.out, resume=not args.restart)
+    finally:
+        await client.close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("profiles", help="JSONL of Planner profiles (name, subjects, weekly_hours, deadline, ...)")
+    ap.add_argument("--out", required=True, help="JSONL output; also the resume checkpoint")
+    ap.add_argument("--model", default="gpt-4o-mini")
+    ap.add_argument("--temperature", type=float, default=0.25)
+    ap.add_argument("--markdown", action="store_true", help="Request markdown plans instead of JSON")
+    ap.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    ap.add_argument("--rps", type=float, default=5.0, help="Request rate limit (requests/sec)")
+    ap.add_argument("--burst", type=float, default=None, help="Token bucket size (default: rps)")
+    ap.add_argument("--restart", action="store_true", help="Ignore and overwrite an existing --out")
+    ap.add_argument("--api-key", default=None)
+    ap.add_argument("--base-url", default=None)
+    args = ap.parse_args()
+    print_report(asyncio.run(_main(args)))
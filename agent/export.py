@@ -0,0 +1,188 @@
+"""
+export.py — streaming iCalendar (RFC 5545) and CSV exporters for timetables
+and PlannerTool schedules; every exporter is a generator of text chunks
+"""
+import csv
+import hashlib
+import re
+from datetime import date, datetime, timedelta, timezone
+
+from agent.utils import week_days
+
+CHUNK_ROWS = 2000               # CSV rows per yielded chunk
+CHUNK_EVENTS = 500              # .ics events per yielded chunk
+PRODID = "-//AI Study Planner Pro//Timetable export//EN"
+
+_ESCAPES = re.compile(r"([\\;,])")
+
+def ics_text(value):
+    """TEXT value escaped per RFC 5545 (backslash, semicolon, comma, newline)."""
+    return _ESCAPES.sub(r"\\\1", str(value)).replace("\r\n", "\\n").replace("\n", "\\n")
+
+def fold(line):
+    """Content line folded at 75 octets (CRLF + space), never inside a UTF-8 character."""
+    if len(line) <= 75 and line.isascii():
+        return line + "\r\n"
+    out, part, size = [], [], 0
+    for ch in line:
+        n = len(ch.encode("utf-8"))
+        if size + n > 75:
+            out.append("".join(part))
+            part, size = [" "], 1
+        part.append(ch)
+        size += n
+    out.append("".join(part))
+    return "\r\n".join(out) + "\r\n"
+
+def _stamp(dt):
+    return dt.strftime("%Y%m%dT%H%M%S")
+
+def _uid(*parts):
+    return hashlib.sha1("\0".join(str(p) for p in parts).encode("utf-8")).hexdigest() + "@ai-study-planner"
+
+def _at(day, hhmm):
+    h, m = (int(x) for x in hhmm.split(":"))
+    return datetime(day.year, day.month, day.day, h, m)
+
+def vevent(uid, start, end, summary, dtstamp, rrule=None, description=None):
+    """One VEVENT with floating (local wall-clock) start and end times."""
+    lines = ["BEGIN:VEVENT", f"UID:{uid}", f"DTSTAMP:{dtstamp}",
+             f"DTSTART:{_stamp(start)}", f"DTEND:{_stamp(end)}", fold(f"SUMMARY:{ics_text(summary)}")[:-2]]
+    if rrule:
+        lines.append(f"RRULE:{rrule}")
+    if description:
+        lines.append(fold(f"DESCRIPTION:{ics_text(description)}")[:-2])
+    lines.append("END:VEVENT")
+    return "\r\n".join(lines) + "\r\n"
+
+def calendar(events, name=None, chunk_events=CHUNK_EVENTS):
+    """Wrap a generator of VEVENT strings in a VCALENDAR, `chunk_events` events per yielded chunk."""
+    head = ["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN"]
+    if name:
+        head.append(f"X-WR-CALNAME:{ics_text(name)}")
+    batch = ["".join(fold(line) for line in head)]
+    for event in events:
+        batch.append(event)
+        if len(batch) >= chunk_events:
+            yield "".join(batch)
+            batch.clear()
+    batch.append("END:VCALENDAR\r\n")
+    yield "".join(batch)
+
+def timetable_ics(timetable, start=None, until=None, name="Study timetable"):
+    """
+    .ics chunks for a generate_smart_timetable DataFrame (Day, Slot, Subject,
+    Hours). Each row becomes a weekly event on its next weekday from `start`
+    (default today), repeating through `until` when that is later; the event
+    starts with its slot and lasts `Hours`, within the slot (the whole slot when Hours is 0).
+    """
+    from agent.timetable import SLOT_TIMES, SLOTS   # a timetable means pandas is loaded already
+    start = start or date.today()
+    dtstamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    days = week_days()
+    rrule = f"FREQ=WEEKLY;UNTIL={until:%Y%m%d}T235959" if until and until > start else None
+
+    def events():
+        for i, (day_name, slot, subject, hours) in enumerate(
+                timetable[["Day", "Slot", "Subject", "Hours"]].itertuples(index=False, name=None)):
+            first, last = SLOT_TIMES.get(slot, SLOT_TIMES[SLOTS[0]])
+            day = start + timedelta(days=(days.index(day_name) - start.weekday()) % 7)
+            begin, end = _at(day, first), _at(day, last)
+            if hours:
+                end = min(end, begin + timedelta(minutes=round(float(hours) * 60)))
+            yield vevent(_uid("timetable", i, day_name, slot, subject), begin, end, subject, dtstamp,
+                         rrule=rrule, description=f"{slot} · {hours} h")
+    return calendar(events(), name)
+
+def schedule_ics(schedule, recur=True, name="Study schedule"):
+    """
+    .ics chunks for a PlannerTool schedule ({iso_date: [block, ...]}), read day
+    by day. With `recur`, a block repeated on the same weekday, time and
+    subject in consecutive weeks is one event with RRULE:FREQ=WEEKLY;COUNT=n;
+    only runs that can still be extended (at most one week of blocks) are held
+    in memory. Without it, every block is its own event.
+    """
+    dtstamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    def event(key, first, count):
+        start, end, subject = key[1:]
+        rrule = f"FREQ=WEEKLY;COUNT={count}" if count > 1 else None
+        return vevent(_uid("schedule", first, *key), _at(first, start), _at(first, end), subject, dtstamp,
+                      rrule=rrule)
+
+    def events():
+        runs = {}   # (weekday, start, end, subject) -> [first day, count, last day]
+        for iso, blocks in schedule.items():
+            day = date.fromisoformat(iso)
+            if not recur:
+                for b in blocks:
+                    yield event((None, b["start"], b["end"], b["subject"]), day, 1)
+                continue
+            for b in blocks:
+                key = (day.weekday(), b["start"], b["end"], b["subject"])
+                run = runs.get(key)
+                if run is not None and run[2] == day - timedelta(days=7):
+                    run[1] += 1
+                    run[2] = day
+                else:
+                    if run is not None:
+                        yield event(key, run[0], run[1])
+                    runs[key] = [day, 1, day]
+            # a run whose last day is a week or more behind can no longer grow
+            stale = [k for k, r in runs.items() if (day - r[2]).days >= 7]
+            for k in stale:
+                r = runs.pop(k)
+                yield event(k, r[0], r[1])
+        for k, r in runs.items():
+            yield event(k, r[0], r[1])
+    return calendar(events(), name)
+
+class _Lines(list):
+    # csv.writer target collecting one string per row (a StringIO holds 4 bytes per character)
+    write = list.append
+
+def csv_chunks(header, rows, chunk_rows=CHUNK_ROWS):
+    """CSV text for `header` and an iterable of rows, `chunk_rows` rows per chunk."""
+    lines = _Lines()
+    writer = csv.writer(lines)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if len(lines) >= chunk_rows:
+            yield "".join(lines)
+            lines.clear()
+    if lines:
+        yield "".join(lines)
+
+def timetable_csv(timetable, chunk_rows=CHUNK_ROWS):
+    """CSV chunks for a timetable DataFrame (every column, no index), converted slice by slice."""
+    def rows():
+        for i in range(0, len(timetable), chunk_rows):
+            yield from timetable.iloc[i:i + chunk_rows].itertuples(index=False, name=None)
+    return csv_chunks(list(timetable.columns), rows(), chunk_rows)
+
+def schedule_csv(schedule, chunk_rows=CHUNK_ROWS):
+    """CSV chunks for a PlannerTool schedule: Date, Day, Start, End, Subject, Hours."""
+    days = week_days()
+    rows = ((iso, days[date.fromisoformat(iso).weekday()], b["start"], b["end"], b["subject"], b["hours"])
+            for iso, blocks in schedule.items() for b in blocks)
+    return csv_chunks(["Date", "Day", "Start", "End", "Subject", "Hours"], rows, chunk_rows)
+
+def write_chunks(chunks, out):
+    """Write text chunks to a path or a text file object; returns the number of characters written."""
+    if isinstance(out, str):
+        with open(out, "w", encoding="utf-8", newline="") as f:
+            return write_chunks(chunks, f)
+    n = 0
+    for chunk in chunks:
+        out.write(chunk)
+        n += len(chunk)
+    return n
+
+def export_bytes(chunks):
+    """
+    UTF-8 bytes of the chunks for st.download_button (pass a callable so the
+    export only runs on click). The whole export is built in memory, as the
+    button needs it as bytes; use write_chunks to stream it to a file instead.
+    """
+    return b"".join(chunk.encode("utf-8") for chunk in chunks)
@@ -0,0 +1,406 @@
+"""
+history.py — searchable plan history stored as versions over content-addressed
+rows and blocks, with row-level diffs between any two versions
+"""
+import difflib
+import hashlib
+import json
+import re
+import threading
+import zlib
+
+from agent.plan_model import StudyPlan
+
+COMPRESS_BYTES = 256    # objects larger than this are stored zlib-compressed
+BLOCK_ROWS = 8          # rows per day block; an edit rewrites one block
+SECTIONS = ("weekly", "daily")
+
+def plan_hash(name, raw):
+    return hashlib.sha256(f"{name}\0{raw}".encode("utf-8")).hexdigest()
+
+def _put(objects, value):
+    """Add `value` to {hash: json bytes} under its content hash and return the hash."""
+    data = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    # 64 bits is plenty within one user's objects, and keeps version trees small
+    h = hashlib.blake2b(data, digest_size=8).hexdigest()
+    objects[h] = data
+    return h
+
+def _encode(data):
+    return b"z" + zlib.compress(data, 6) if len(data) > COMPRESS_BYTES else b"j" + data
+
+def _decode(stored):
+    return json.loads(zlib.decompress(stored[1:]) if stored[:1] == b"z" else stored[1:])
+
+def _runs(rows):
+    """Consecutive rows of the same day, at most BLOCK_ROWS per run."""
+    runs = []
+    for row in rows:
+        if runs and runs[-1][-1]["day"] == row["day"] and len(runs[-1]) < BLOCK_ROWS:
+            runs[-1].append(row)
+        else:
+            runs.append([row])
+    return runs
+
+def _text_sections(raw):
+    """
+    Raw text split before every heading line and after lines whose CRC ends
+    in three zero bits (~8 lines per section, chosen by content so an edit
+    only changes the sections around it). Joining with newlines gives `raw` back.
+    """
+    sections, current = [], []
+    for line in raw.split("\n"):
+        if line.startswith("#") and current:
+            sections.append("\n".join(current))
+            current = []
+        current.append(line)
+        if zlib.crc32(line.encode("utf-8")) & 7 == 0:
+            sections.append("\n".join(current))
+            current = []
+    sections.append("\n".join(current))
+    return sections
+
+def build_tree(raw, plan):
+    """
+    (tree, {hash: json bytes}) for one plan version. The tree maps "weekly"
+    and "daily" (structured plans) to a list of per-day blocks of up to
+    BLOCK_ROWS row hashes; "tips" to the list of tips; and "raw" to a list of text
+    section hashes, unless the raw text is the plan's own markdown. Every
+    list is itself an object, so versions that share content share objects
+    and a version only adds the path from its tree to what changed.
+    """
+    objects = {}
+    tree = {}
+    if not plan or StudyPlan.from_dict(plan).to_markdown() != raw:
+        tree["raw"] = _put(objects, [_put(objects, section) for section in _text_sections(raw)])
+    if plan:
+        for section in SECTIONS:
+            tree[section] = _put(objects, [_put(objects, [_put(objects, dict(row)) for row in run])
+                                           for run in _runs(plan.get(section) or [])])
+        tree["tips"] = _put(objects, list(plan.get("tips") or []))
+    return tree, objects
+
+def _row_key(section, row):
+    return (row["day"], row["subject"]) if section == "weekly" else (row["day"], row["start"])
+
+def describe_row(section, row):
+    """Short text of a weekly row or daily block for diffs."""
+    if section == "weekly":
+        text = f"{row['hours']:g} h"
+        if row.get("focus"):
+            text += f" · {row['focus']}"
+        if row.get("revision_hours"):
+            text += f" · revision {row['revision_hours']:g} h"
+        return text
+    return f"{row['start']}–{row['end']} {row['subject']}" + (f": {row['task']}" if row.get("task") else "")
+
+def _tokens(meta):
+    words = re.findall(r"\w+", meta["name"].lower())
+    words += [s.lower() for s in meta["subjects"]]
+    day = meta["time"][:10]
+    words += [day, day[:7]]  # YYYY-MM-DD and YYYY-MM
+    return set(words)
+
+def _text_diff(sections_a, fetch_a, sections_b, fetch_b):
+    shared = set(sections_a) & set(sections_b)
+    text_a = fetch_a([h for h in sections_a if h not in shared])
+    text_b = fetch_b([h for h in sections_b if h not in shared])
+    lines_a = [line for h in sections_a if h not in shared for line in text_a[h].split("\n")]
+    lines_b = [line for h in sections_b if h not in shared for line in text_b[h].split("\n")]
+    changes = []
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, lines_a, lines_b, autojunk=False).get_opcodes():
+        if op == "equal":
+            continue
+        before, after = lines_a[i1:i2], lines_b[j1:j2]
+        for k in range(max(len(before), len(after))):
+            old = before[k] if k < len(before) else ""
+            new = after[k] if k < len(after) else ""
+            if old.strip() or new.strip():
+                change = "changed" if old and new else ("removed" if old else "added")
+                changes.append({"section": "text", "change": change, "key": "", "before": old, "after": new})
+    return changes
+
+class PlanHistory:
+    """
+    Newest-first history of one user's plans.
+
+    Each plan is a version record whose tree (see build_tree) references
+    content-addressed objects in the bank: text sections, per-day blocks and
+    individual rows are each stored once per user, so a regenerated plan that
+    changes one subject only adds that subject's rows, their day blocks and a
+    tree of a few hashes; subjects and planned hours are a summary object
+    shared by versions that agree on them. Only metadata (id, hash, name,
+    time, subjects, hours) is kept in memory, with a token index over name,
+    subjects and date, so paging and search never touch the payloads.
+    """
+    def __init__(self, bank, user_id, page_size=10):
+        self.bank = bank
+        self.user_id = user_id
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._meta = None       # newest first
+        self._positions = None  # record id -> position in _meta, rebuilt after changes
+        self._by_hash = {}
+        self._index = {}        # token -> set of record ids
+        self._compactions = bank.compactions  # bank compactions reflected in _meta
+
+    # ---- index ----
+    def _ensure_index(self):
+        if self._compactions != self.bank.compactions:
+            # retention deleted records: rebuild the index and drop the objects only they used
+            self._compactions = self.bank.compactions
+            self._meta, self._by_hash, self._index = None, {}, {}
+            self._sweep()
+        if self._meta is not None:
+            return
+        metas = []
+        records = self.bank.query_range(self.user_id, newest_first=True)
+        summaries = self._fetch([r["record"]["summary"] for r in records])
+        for r in records:
+            rec = r["record"]
+            h = rec["hash"]
+            if h in self._by_hash:
+                continue
+            summary = summaries[rec["summary"]]
+            meta = {"id": r["id"], "hash": h, "name": rec["name"], "time": rec["time"],
+                    "subjects": summary["subjects"], "hours": summary["hours"]}
+            metas.append(meta)
+            self._add_to_index(meta)
+        self._meta = metas
+        self._positions = None
+
+    def _fetch(self, hashes):
+        return {h: _decode(v) for h, v in self.bank.get_objects(self.user_id, hashes).items()}
+
+    def _add_to_index(self, meta):
+        self._by_hash[meta["hash"]] = meta
+        for tok in _tokens(meta):
+            self._index.setdefault(tok, set()).add(meta["id"])
+
+    def _drop_from_index(self, meta):
+        self._by_hash.pop(meta["hash"], None)
+        for tok in _tokens(meta):
+            ids = self._index.get(tok)
+            if ids is not None:
+                ids.discard(meta["id"])
+                if not ids:
+                    del self._index[tok]
+
+    # ---- writes ----
+    def insert(self, index, plan):
+        """
+        Save a plan dict (name, raw, plan, time and optional hours, its planned
+        {subject: weekly hours}); an identical plan is moved to the front.
+        """
+        if index != 0:
+            raise IndexError("plans can only be inserted at the front of the history")
+        name = plan.get("name", "Student")
+        raw = plan.get("raw", "")
+        structured = plan.get("plan")
+        subjects = sorted({r["subject"] for r in structured["weekly"]}) if structured else []
+        h = plan_hash(name, raw)
+        with self._lock:
+            self._ensure_index()
+            old = self._by_hash.get(h)
+            if old is not None:
+                self._drop_from_index(old)
+                self._meta.remove(old)
+                self.bank.delete(self.user_id, old["id"])
+            tree, objects = build_tree(raw, structured)
+            # subjects and hours rarely change between regenerations, so they are an object too
+            summary = _put(objects, {"subjects": subjects, "hours": plan.get("hours")})
+            self.bank.put_objects(self.user_id, {k: _encode(v) for k, v in objects.items()})
+            record = {"hash": h, "name": name, "time": plan.get("time", ""), "summary": summary, "tree": tree}
+            record_id = self.bank.add_sync(self.user_id, record)
+            meta = {"id": record_id, "hash": h, "name": name, "time": record["time"], "subjects": subjects,
+                    "hours": plan.get("hours")}
+            self._meta.insert(0, meta)
+            self._positions = None
+            self._add_to_index(meta)
+
+    def remove(self, plan_id):
+        with self._lock:
+            self._ensure_index()
+            for meta in self._meta:
+                if meta["id"] == plan_id:
+                    self._drop_from_index(meta)
+                    self._meta.remove(meta)
+                    self._positions = None
+                    break
+            self.bank.delete(self.user_id, plan_id)
+        self.sweep()
+
+    def clear(self):
+        with self._lock:
+            self.bank.delete(self.user_id)
+            self.bank.delete_objects(self.user_id)
+            self._meta, self._by_hash, self._index, self._positions = [], {}, {}, None
+
+    def sweep(self):
+        """
+        Delete objects no version references any more; returns how many. Runs
+        after removals, and on the first access after bank retention deleted
+        records.
+        """
+        with self._lock:
+            return self._sweep()
+
+    def _sweep(self):
+        live, raw_lists, block_lists = set(), [], []
+        for r in self.bank.query_range(self.user_id):
+            tree = r["record"]["tree"]
+            live.add(r["record"]["summary"])
+            live.update(tree.values())
+            raw_lists += [tree["raw"]] if "raw" in tree else []
+            block_lists += [tree[s] for s in SECTIONS if s in tree]
+        lists = {h: _decode(v) for h, v in self.bank.get_objects(self.user_id, raw_lists + block_lists).items()}
+        for hashes in lists.values():
+            live.update(hashes)
+        blocks = [b for h in block_lists for b in lists.get(h, [])]
+        for stored in self.bank.get_objects(self.user_id, blocks).values():
+            live.update(_decode(stored))
+        dead = self.bank.object_hashes(self.user_id) - live
+        if dead:
+            self.bank.delete_objects(self.user_id, dead)
+        return len(dead)
+
+    # ---- reads ----
+    def search(self, query=""):
+        """Metadata of plans matching every word of `query` (prefix match on name/subject/date)."""
+        with self._lock:
+            self._ensure_index()
+            words = re.findall(r"[\w-]+", query.lower())
+            if not words:
+                return list(self._meta)
+            matched = None
+            for w in words:
+                ids = set()
+                for tok, tok_ids in self._index.items():
+                    if tok.startswith(w):
+                        ids |= tok_ids
+                matched = ids if matched is None else matched & ids
+                if not matched:
+                    return []
+            return [m for m in self._meta if m["id"] in matched]
+
+    def page(self, page_no=0, query=""):
+        """(metadata for one page, total matches); page_no is zero-based."""
+        metas = self.search(query) if query else self.search()
+        start = page_no * self.page_size
+        return metas[start:start + self.page_size], len(metas)
+
+    def previous(self, plan_id):
+        """Metadata of the version saved just before `plan_id`, or None for the oldest (or an unknown id)."""
+        with self._lock:
+            self._ensure_index()
+            if self._positions is None:
+                self._positions = {m["id"]: i for i, m in enumerate(self._meta)}
+            i = self._positions.get(plan_id)
+            return self._meta[i + 1] if i is not None and i + 1 < len(self._meta) else None
+
+    def _version(self, plan_id):
+        """(record, tree, fetch) for one entry; fetch(hashes) -> {hash: value}. None if it is gone."""
+        r = self.bank.get(self.user_id, plan_id)
+        if r is None:
+            return None
+        rec = r["record"]
+        return rec, rec["tree"], self._fetch
+
+    def load(self, plan_id):
+        """Full plan (name, time, raw, plan) for one entry, rebuilt from its objects on demand."""
+        version = self._version(plan_id)
+        if version is None:
+            return None
+        rec, tree, fetch = version
+        # one query per tree level: lists, then text sections and day blocks, then rows
+        values = fetch(tree.values())
+        values.update(fetch([h for k in ("raw", *SECTIONS) if k in tree for h in values[tree[k]]]))
+        plan = None
+        if "tips" in tree:
+            values.update(fetch([h for s in SECTIONS for b in values[tree[s]] for h in values[b]]))
+            plan = {"name": rec["name"], "tips": values[tree["tips"]]}
+            for section in SECTIONS:
+                plan[section] = [values[h] for b in values[tree[section]] for h in values[b]]
+        if "raw" in tree:
+            raw = "\n".join(values[h] for h in values[tree["raw"]])
+        else:
+            raw = StudyPlan.from_dict(plan).to_markdown()
+        return {"id": plan_id, "hash": rec["hash"], "name": rec["name"], "time": rec["time"],
+                "raw": raw, "plan": plan}
+
+    def _text_tree(self, plan_id, tree, fetch):
+        """(section hashes, fetch) of a version's raw text, splitting it now when it is derived from the plan."""
+        if "raw" in tree:
+            return fetch([tree["raw"]])[tree["raw"]], fetch
+        objects = {}
+        sections = [_put(objects, section) for section in _text_sections(self.load(plan_id)["raw"])]
+        return sections, lambda hashes: {h: json.loads(objects[h]) for h in hashes}
+
+    def diff(self, old_id, new_id):
+        """
+        Row-level changes from plan `old_id` to `new_id`, as dicts with
+        section, change ("added", "removed" or "changed"), key, before and after.
+        Sections, day blocks and text sections with equal hashes are skipped
+        unread, and only rows whose hashes differ are loaded. Structured plans are compared
+        by weekly row (day, subject), daily block (day, start) and tip;
+        otherwise by line of the changed text sections. None if either is gone.
+        """
+        old, new = self._version(old_id), self._version(new_id)
+        if old is None or new is None:
+            return None
+        (_, a, fetch_a), (_, b, fetch_b) = old, new
+        if "tips" not in a or "tips" not in b:
+            return _text_diff(*self._text_tree(old_id, a, fetch_a), *self._text_tree(new_id, b, fetch_b))
+        changes = []
+        for section in SECTIONS:
+            if a[section] == b[section]:
+                continue
+            list_a, list_b = fetch_a([a[section]])[a[section]], fetch_b([b[section]])[b[section]]
+            shared = set(list_a) & set(list_b)
+            blocks_a = fetch_a([h for h in list_a if h not in shared])
+            blocks_b = fetch_b([h for h in list_b if h not in shared])
+            rows_a = [h for blk in list_a if blk not in shared for h in blocks_a[blk]]
+            rows_b = [h for blk in list_b if blk not in shared for h in blocks_b[blk]]
+            common = set(rows_a) & set(rows_b)
+            values_a = fetch_a([h for h in rows_a if h not in common])
+            values_b = fetch_b([h for h in rows_b if h not in common])
+            removed = {}
+            for h in rows_a:
+                if h not in common:
+                    removed.setdefault(_row_key(section, values_a[h]), []).append(values_a[h])
+            for h in rows_b:
+                if h in common:
+                    continue
+                row = values_b[h]
+                key = _row_key(section, row)
+                before = removed.get(key)
+                if before:
+                    changes.append({"section": section, "change": "changed", "key": f"{key[0]} · {key[1]}",
+                                    "before": describe_row(section, before.pop(0)),
+                                    "after": describe_row(section, row)})
+                else:
+                    changes.append({"section": section, "change": "added", "key": f"{key[0]} · {key[1]}",
+                                    "before": "", "after": describe_row(section, row)})
+            for key, rows in removed.items():
+                for row in rows:
+                    changes.append({"section": section, "change": "removed", "key": f"{key[0]} · {key[1]}",
+                                    "before": describe_row(section, row), "after": ""})
+        if a["tips"] != b["tips"]:
+            tips_a, tips_b = fetch_a([a["tips"]])[a["tips"]], fetch_b([b["tips"]])[b["tips"]]
+            changes += [{"section": "tips", "change": "removed", "key": "", "before": t, "after": ""}
+                        for t in tips_a if t not in tips_b]
+            changes += [{"section": "tips", "change": "added", "key": "", "before": "", "after": t}
+                        for t in tips_b if t not in tips_a]
+        return changes
+
+    def storage(self):
+        """(object count, stored object bytes) of this user's plans."""
+        return self.bank.object_stats(self.user_id)
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_index()
+            return len(self._meta)
+
+    def __iter__(self):
+        return iter(self.search())
@@ -0,0 +1,150 @@
+"""
+llm_backend.py — pluggable chat completion backends: the pooled OpenAI client
+and a deterministic offline stand-in for demos, smoke tests and benchmarks
+"""
+import abc
+import ast
+import hashlib
+import json
+import random
+import re
+import time
+
+from agent.llm_cache import cache_key
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+TASKS = ["Read notes and summarize key ideas", "Solve practice problems", "Review flashcards",
+         "Work through past exam questions", "Watch a lecture and take notes", "Self-test and fix mistakes"]
+TIPS = ["Use active recall instead of re-reading.", "Take a 10 minute break every 50 minutes.",
+        "Review mistakes at the end of each week.", "Sleep at least 7 hours before exams.",
+        "Start each session with the hardest topic.", "Keep your phone out of reach while studying."]
+
+class LLMBackend(abc.ABC):
+    """
+    Interface app.py and the agent package use for chat completions.
+    complete() returns (content, shared), where `shared` is True when the result
+    came from an identical in-flight request; stream() yields text deltas. With
+    `timeout`, a call that gets no answer (for a stream, no next delta) within
+    that many seconds raises TimeoutError.
+    """
+    @abc.abstractmethod
+    def complete(self, model, messages, temperature, response_format=None, timeout=None):
+        ...
+
+    @abc.abstractmethod
+    def stream(self, model, messages, temperature, timeout=None):
+        ...
+
+    def close(self):
+        pass
+
+def prompt_subjects(messages):
+    """Subjects from the Planner prompt's 'Subjects: [...]' line, or None for other prompts."""
+    for m in reversed(messages):
+        match = re.search(r"^Subjects: (\[.*\])$", m.get("content", ""), re.M)
+        if match:
+            try:
+                return [str(s) for s in ast.literal_eval(match.group(1))] or ["General"]
+            except (ValueError, SyntaxError):
+                return ["General"]
+    return None
+
+def fake_plan(subjects, structured, rng, weeks=1, blocks_per_day=2, tips=4):
+    """A realistic plan for `subjects`: JSON matching PLAN_SCHEMA, or the Planner's markdown."""
+    weekly, daily = [], []
+    for w in range(weeks):
+        for d, day in enumerate(DAYS):
+            label = day if weeks == 1 else f"Week {w + 1} {day}"
+            start = 9 * 60
+            for b in range(blocks_per_day):
+                subj = subjects[(d * blocks_per_day + b + w) % len(subjects)]
+                hours = rng.choice([1, 1.5, 2, 2.5])
+                end = start + int(hours * 60)
+                weekly.append({"day": label, "subject": subj, "hours": hours,
+                               "focus": f"{subj} unit {w * 7 + d + 1}", "revision_hours": rng.choice([0, 0.5, 1])})
+                daily.append({"day": label, "start": f"{start // 60:02d}:{start % 60:02d}",
+                              "end": f"{end // 60:02d}:{end % 60:02d}", "subject": subj,
+                              "task": f"{rng.choice(TASKS)} ({subj})"})
+                start = end + 30
+    tip_list = rng.sample(TIPS, min(tips, len(TIPS)))
+    if structured:
+        return json.dumps({"weekly": weekly, "daily": daily, "tips": tip_list})
+    lines = ["## Weekly Overview", "| Day | Subject | Study Hours | Focus Area | Revision Hours |",
+             "|---|---|---|---|---|"]
+    lines += [f"| {r['day']} | {r['subject']} | {r['hours']} | {r['focus']} | {r['revision_hours']} |" for r in weekly]
+    lines += ["", "## Daily Breakdown"]
+    lines += [f"- **{b['day']}** {b['start']}-{b['end']}: {b['task']}" for b in daily]
+    lines += ["", "## Study Tips"] + [f"- {t}" for t in tip_list]
+    return "\n".join(lines) + "\n"
+
+def fake_reply(rng, sentences=3):
+    words = ["review", "practice", "focus", "schedule", "concepts", "examples", "revise", "notes", "goals"]
+    return " ".join(" ".join(rng.choice(words) for _ in range(8)).capitalize() + "." for _ in range(sentences))
+
+class FakeBackend(LLMBackend):
+    """
+    Offline backend. The same request always gets the same answer: Planner
+    prompts get a plan for their subjects (JSON when `response_format` is set),
+    anything else a short reply. Size is set by weeks / blocks_per_day / tips,
+    latency is lognormal around `latency` seconds (spread `sigma`; `model_latency`
+    overrides it per model name), and streams are cut into `stream_chunk`-character
+    deltas `chunk_delay` seconds apart.
+    """
+    def __init__(self, latency=0.0, sigma=0.0, weeks=1, blocks_per_day=2, tips=4,
+                 stream_chunk=16, chunk_delay=0.0, seed=0, model_latency=None):
+        self.latency = latency
+        self.model_latency = dict(model_latency or {})
+        self.sigma = sigma
+        self.weeks = weeks
+        self.blocks_per_day = blocks_per_day
+        self.tips = tips
+        self.stream_chunk = stream_chunk
+        self.chunk_delay = chunk_delay
+        self.seed = seed
+        self.calls = 0
+
+    def _respond(self, model, messages, temperature, response_format):
+        key = cache_key(model, temperature, messages, response_format)
+        rng = random.Random(int(hashlib.sha256(f"{self.seed}:{key}".encode()).hexdigest()[:16], 16))
+        latency = self.model_latency.get(model, self.latency)
+        delay = latency * rng.lognormvariate(0, self.sigma) if latency else 0.0
+        subjects = prompt_subjects(messages)
+        if subjects is None:
+            content = fake_reply(rng)
+        else:
+            content = fake_plan(subjects, bool(response_format), rng, self.weeks, self.blocks_per_day, self.tips)
+        self.calls += 1
+        return content, delay
+
+    @staticmethod
+    def _wait(model, delay, timeout):
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"{model} did not respond within {timeout:g}s")
+        if delay:
+            time.sleep(delay)
+
+    def complete(self, model, messages, temperature, response_format=None, timeout=None):
+        content, delay = self._respond(model, messages, temperature, response_format)
+        self._wait(model, delay, timeout)
+        return content, False
+
+    def stream(self, model, messages, temperature, timeout=None):
+        content, delay = self._respond(model, messages, temperature, None)
+
+        def deltas():
+            self._wait(model, delay, timeout)  # time to first token
+            for i in range(0, len(content), self.stream_chunk):
+                if self.chunk_delay and i:
+                    time.sleep(self.chunk_delay)
+                yield content[i:i + self.stream_chunk]
+        return deltas()
+
+def make_backend(kind="openai", **options):
+    """Backend by name: "openai" (LLMClient options) or "fake" (FakeBackend options)."""
+    if kind == "fake":
+        return FakeBackend(**options)
+    if kind == "openai":
+        from agent.llm_client import LLMClient
+        return LLMClient(**options)
+    raise ValueError(f"unknown LLM backend {kind!r}")
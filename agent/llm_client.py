@@ -0,0 +1,167 @@
+"""
+llm_client.py — shared OpenAI client with connection pooling, single-flight
+coalescing of identical in-flight requests and jittered retries
+"""
+import random
+import threading
+import time
+
+from openai import (
+    DEFAULT_CONNECTION_LIMITS, APIConnectionError, APIStatusError, APITimeoutError, DefaultHttpxClient, OpenAI,
+)
+
+from agent.llm_backend import LLMBackend
+from agent.llm_cache import cache_key
+
+RETRY_STATUS = {408, 409, 429}
+
+def is_retryable(exc):
+    if isinstance(exc, APIStatusError):
+        return exc.status_code in RETRY_STATUS or exc.status_code >= 500
+    # APITimeoutError is a subclass of APIConnectionError
+    return isinstance(exc, APIConnectionError)
+
+def retry_after(exc):
+    """Seconds requested by a Retry-After header, if the error carries one."""
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def iter_stream_deltas(stream, model="", timeout=None):
+    """Yield the text deltas of a streamed chat completion; closing the generator closes the response."""
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    except APITimeoutError as e:
+        if timeout is None:
+            raise
+        raise TimeoutError(f"{model} sent nothing for {timeout:g}s") from e
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Collapse concurrent calls that share a key onto a single execution.
+    Followers block until the leader finishes and receive its result (or error).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Return (result, shared) where `shared` is True for coalesced followers."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+class LLMClient(LLMBackend):
+    """
+    Process-wide chat completion client. One instance owns a bounded httpx
+    connection pool that every Streamlit session shares.
+    """
+    def __init__(self, api_key=None, base_url=None, max_connections=20, max_keepalive=10,
+                 timeout=60.0, max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # the SDK's own Limits type, so this works whichever httpx flavour it ships with
+        limits = type(DEFAULT_CONNECTION_LIMITS)(
+            max_connections=max_connections, max_keepalive_connections=max_keepalive
+        )
+        self._http = DefaultHttpxClient(limits=limits, timeout=timeout)
+        # retries are handled here so they are jittered and shared by coalesced callers
+        self.client = OpenAI(api_key=api_key, base_url=base_url, http_client=self._http, max_retries=0)
+        self._flight = SingleFlight()
+
+    def _backoff(self, attempt, exc):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        hinted = retry_after(exc)
+        if hinted is not None:
+            delay = max(delay, min(hinted, self.backoff_max))
+        return delay
+
+    def with_retries(self, fn, retry_timeouts=True):
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                if isinstance(e, APITimeoutError) and not retry_timeouts:
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    def _client(self, timeout):
+        # a per-call timeout is the caller's deadline, so it is not retried
+        return self.client if timeout is None else self.client.with_options(timeout=timeout)
+
+    def complete(self, model, messages, temperature, response_format=None, timeout=None):
+        """Return (content, shared); identical concurrent requests share one upstream call."""
+        client = self._client(timeout)
+
+        def call():
+            kwargs = {"response_format": response_format} if response_format else {}
+            res = client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, **kwargs
+            )
+            return res.choices[0].message.content or ""
+        key = cache_key(model, temperature, messages, response_format)
+        try:
+            return self._flight.do(key, lambda: self.with_retries(call, retry_timeouts=timeout is None))
+        except APITimeoutError as e:
+            if timeout is None:
+                raise
+            raise TimeoutError(f"{model} did not respond within {timeout:g}s") from e
+
+    def stream(self, model, messages, temperature, timeout=None):
+        """Open a streamed completion (retrying the request, not a half-read stream) and yield deltas."""
+        client = self._client(timeout)
+        try:
+            stream = self.with_retries(lambda: client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, stream=True
+            ), retry_timeouts=timeout is None)
+        except APITimeoutError as e:
+            if timeout is None:
+                raise
+            raise TimeoutError(f"{model} did not respond within {timeout:g}s") from e
+        return iter_stream_deltas(stream, model, timeout)
+
+    def close(self):
+        self._http.close()
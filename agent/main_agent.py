@@ -4,13 +4,22 @@ This file demonstrates:
 - session memory
 - a planner tool
 - observability hooks
+- headless batch planning over JSONL profiles
 Run: python -m agent.main_agent --demo
+     python -m agent.main_agent --batch profiles.jsonl --out schedules.jsonl
 """
 import argparse
+import json
+import os
+import queue
+import sys
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, timedelta
 from agent.memory import SessionMemory, MemoryBank
 from agent.tools import PlannerTool
-from agent.observability import Logger, Trace
+from agent.observability import Logger, Metrics, Trace, json_safe
 
 def build_agent():
     logger = Logger()
@@ -19,7 +28,7 @@ def build_agent():
     planner = PlannerTool(logger=logger, memory=memory_bank)
     return dict(logger=logger, session=session, memory_bank=memory_bank, planner=planner)
 
-def run_demo():
+def run_demo(metrics_path=None, ics_path=None, csv_path=None):
     env = build_agent()
     logger = env["logger"]
     session = env["session"]
@@ -32,29 +41,184 @@ def run_demo():
         "name": "Student",
         "subjects": ["Math", "Algorithms", "DBMS"],
         "weekly_hours": 20,
-        "deadlines": {"Math": "2025-12-10", "DBMS": "2025-11-30"},
+        "deadlines": {"Math": (date.today() + timedelta(days=21)).isoformat(),
+                      "DBMS": (date.today() + timedelta(days=10)).isoformat()},
         "priority": {"Math": 0.5, "Algorithms": 0.3, "DBMS": 0.2}
     }
     session.set("profile", user_profile)
     logger.info("User profile saved in session")
 
     # Planner tool usage
-    schedule = planner.create_schedule(user_profile)
+    with Trace.span("schedule_build"):
+        schedule = planner.create_schedule(user_profile)
     logger.info("Schedule created")
-    print("\n=== GENERATED WEEKLY PLAN ===")
+    print("\n=== GENERATED STUDY PLAN ===")
     for day, blocks in schedule.items():
-        print(f"\n{day}:")
+        print(f"\n{day} ({date.fromisoformat(day):%A}):")
         for b in blocks:
             print(f" - {b['start']} to {b['end']}: {b['subject']} ({b['hours']} hrs)")
 
-    Trace.end_trace("demo-session")
+    summary = Trace.end_trace("demo-session")
+    print("\nTRACE SUMMARY:", json_safe(summary))
+    if metrics_path:
+        Metrics.export_prometheus(metrics_path)
+        logger.info(f"Metrics written to {metrics_path}")
+    if ics_path or csv_path:
+        from agent.export import schedule_csv, schedule_ics, write_chunks
+        if ics_path:
+            write_chunks(schedule_ics(schedule), ics_path)
+            logger.info(f"Calendar written to {ics_path}")
+        if csv_path:
+            write_chunks(schedule_csv(schedule), csv_path)
+            logger.info(f"Schedule CSV written to {csv_path}")
     logger.info("Demo finished")
 
+_worker_planner = None
+
+def plan_chunk(chunk):
+    """
+    Worker: plan a chunk of (index, json line) pairs.
+    Returns (pid, seconds, output lines, errors); bad lines become {"index", "error"} records.
+    """
+    global _worker_planner
+    if _worker_planner is None:
+        _worker_planner = PlannerTool()
+    t0 = time.perf_counter()
+    out = []
+    errors = 0
+    for index, line in chunk:
+        try:
+            profile = json.loads(line)
+            schedule = _worker_planner.create_schedule(profile)
+            out.append(json.dumps({"index": index, "name": profile.get("name"), "schedule": schedule}))
+        except Exception as e:
+            out.append(json.dumps({"index": index, "error": f"{type(e).__name__}: {e}"}))
+            errors += 1
+    return os.getpid(), time.perf_counter() - t0, out, errors
+
+def _iter_chunks(src, chunk_size):
+    chunk = []
+    for index, line in enumerate(src):
+        if line.strip():
+            chunk.append((index, line))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+def _write_loop(out_q, dst, failures):
+    # after a write error the queue is still drained, so producers never block on it
+    while True:
+        lines = out_q.get()
+        if lines is None:
+            if not failures:
+                try:
+                    dst.flush()
+                except Exception as e:
+                    failures.append(e)
+            return
+        if failures:
+            continue
+        try:
+            dst.write("\n".join(lines) + "\n")
+        except Exception as e:
+            failures.append(e)
+
+def run_batch(src, dst, workers=None, chunk_size=64, queue_size=None):
+    """
+    Stream JSONL profiles from `src` to JSONL schedules on `dst` using a process pool.
+
+    At most `queue_size` chunks are in flight in the pool and at most `queue_size`
+    finished chunks wait for the writer, so memory stays flat for any input size
+    and a slow writer stalls reading instead of buffering. Output is in completion
+    order; each line carries the input line's `index`. If writing to `dst` fails
+    (e.g. a closed pipe), pending work is cancelled and the error is raised here.
+    Returns stats: profiles (planned), errors (error records written), seconds,
+    profiles_per_sec and per-worker timings.
+    """
+    workers = workers or os.cpu_count() or 1
+    queue_size = queue_size or 2 * workers
+    out_q = queue.Queue(maxsize=queue_size)
+    write_failures = []
+    writer = threading.Thread(target=_write_loop, args=(out_q, dst, write_failures), daemon=True)
+    writer.start()
+    per_worker = {}
+    total = 0
+    failed = 0
+
+    def drain(done):
+        nonlocal total, failed
+        for fut in done:
+            pid, seconds, lines, errors = fut.result()
+            w = per_worker.setdefault(pid, {"chunks": 0, "profiles": 0, "errors": 0, "seconds": 0.0})
+            w["chunks"] += 1
+            w["profiles"] += len(lines) - errors
+            w["errors"] += errors
+            w["seconds"] += seconds
+            total += len(lines) - errors
+            failed += errors
+            if write_failures:
+                raise write_failures[0]
+            out_q.put(lines)  # blocks while the writer is behind
+
+    t0 = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            try:
+                pending = set()
+                for chunk in _iter_chunks(src, chunk_size):
+                    if len(pending) >= queue_size:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        drain(done)
+                    pending.add(pool.submit(plan_chunk, chunk))
+                drain(wait(pending).done)
+            except BaseException:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+    finally:
+        out_q.put(None)
+        writer.join()
+    if write_failures:
+        raise write_failures[0]
+    elapsed = time.perf_counter() - t0
+    return {"profiles": total, "errors": failed, "seconds": elapsed,
+            "profiles_per_sec": total / elapsed if elapsed else 0.0, "workers": per_worker}
+
+def print_batch_report(stats, out=sys.stderr):
+    print(f"planned {stats['profiles']} profiles in {stats['seconds']:.2f}s "
+          f"({stats['profiles_per_sec']:.1f} profiles/sec), {stats['errors']} failed", file=out)
+    for pid, w in sorted(stats["workers"].items()):
+        rate = w["profiles"] / w["seconds"] if w["seconds"] else 0.0
+        print(f"  worker {pid}: {w['chunks']} chunks, {w['profiles']} profiles, {w['errors']} failed, "
+              f"{w['seconds']:.2f}s busy ({rate:.1f}/sec)", file=out)
+
+def run_batch_cli(args):
+    src = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+    dst = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    try:
+        stats = run_batch(src, dst, workers=args.workers, chunk_size=args.chunk_size)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    print_batch_report(stats)
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--demo", action="store_true", help="Run demo")
+    parser.add_argument("--metrics", help="Write latency histograms (Prometheus text format) to this file")
+    parser.add_argument("--ics", help="With --demo, write the schedule as an iCalendar (.ics) file")
+    parser.add_argument("--csv", help="With --demo, write the schedule as CSV")
+    parser.add_argument("--batch", metavar="PATH", help="Plan every profile in a JSONL file ('-' for stdin)")
+    parser.add_argument("--out", default="-", help="JSONL output for --batch ('-' for stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Profiles per work item")
     args = parser.parse_args()
-    if args.demo:
-        run_demo()
+    if args.batch:
+        run_batch_cli(args)
+    elif args.demo:
+        run_demo(metrics_path=args.metrics, ics_path=args.ics, csv_path=args.csv)
     else:
-        print("Run with --demo to execute a demo.")
\ No newline at end of file
+        print("Run with --demo to execute a demo, or --batch PATH to plan a JSONL file.")
\ No newline at end of file
@@ -1,23 +1,250 @@
 """
-memory.py — Session memory and MemoryBank stub
+memory.py — Session memory with TTL, LRU and disk snapshots, MemoryBank stub and a SQLite-backed MemoryBank
 """
+import atexit
 import datetime
-from collections import defaultdict
+import hashlib
+import json
+import os
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+
+from agent.observability import Logger
+
+_STOP = object()
+_log = None
+
+def _logger():
+    # built on first use, so importing this module never sets up logging
+    global _log
+    if _log is None:
+        _log = Logger(name="StudyPlannerAgent.memory")
+    return _log
+
+class SessionStore:
+    """
+    Thread-safe key/value state for many sessions, bounded in memory and
+    snapshotted to disk.
+
+    Values are pickled on `set` (so `get` returns a private copy) and can expire
+    after a per-key `ttl` in seconds. Sessions are kept in LRU order; when the
+    pickled size of all sessions exceeds `max_bytes`, the least recently used
+    ones are written to `snapshot_dir` and dropped from memory. A background
+    thread writes changed sessions every `snapshot_interval` seconds as one
+    zlib-compressed file each, and removes sessions idle for `session_ttl`
+    seconds. A session that is not in memory is restored from its file on
+    first access, so a restart only pays for the sessions that come back.
+    Without `snapshot_dir` the store is memory-only and evicted sessions are lost.
+    """
+    def __init__(self, snapshot_dir=None, max_bytes=64 * 1024 * 1024, snapshot_interval=30.0,
+                 session_ttl=7 * 86400):
+        self.snapshot_dir = snapshot_dir
+        self.max_bytes = max_bytes
+        self.snapshot_interval = snapshot_interval
+        self.session_ttl = session_ttl
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # session_id -> {key: (blob, expires or None)}, LRU first
+        self._sizes = {}
+        self._touched = {}              # session_id -> last access (epoch seconds)
+        self._dirty = set()
+        self._total = 0
+        self._stop = threading.Event()
+        self._thread = None
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+            self._thread = threading.Thread(target=self._snapshot_loop, name="session-snapshots", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    # ---- files ----
+    def _path(self, session_id):
+        name = hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.snapshot_dir, f"{name}.snap")
+
+    def _read(self, session_id):
+        if not self.snapshot_dir:
+            return None
+        try:
+            with open(self._path(session_id), "rb") as f:
+                data = pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError):
+            return None  # unreadable snapshot: start the session afresh
+        if time.time() - data["touched"] > self.session_ttl:
+            return None
+        return data
+
+    def _write(self, session_id, entries, touched):
+        path = self._path(session_id)
+        if not entries:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return
+        blob = zlib.compress(pickle.dumps({"touched": touched, "entries": entries}, pickle.HIGHEST_PROTOCOL), 6)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+
+    # ---- in-memory state (callers hold the lock) ----
+    def _session(self, session_id):
+        entries = self._sessions.get(session_id)
+        if entries is None:
+            data = self._read(session_id)
+            entries = data["entries"] if data else {}
+            self._sessions[session_id] = entries
+            self._sizes[session_id] = sum(len(b) for b, _ in entries.values())
+            self._total += self._sizes[session_id]
+        self._sessions.move_to_end(session_id)
+        self._touched[session_id] = time.time()
+        return entries
+
+    def _resize(self, session_id):
+        size = sum(len(b) for b, _ in self._sessions[session_id].values())
+        self._total += size - self._sizes[session_id]
+        self._sizes[session_id] = size
+
+    def _forget(self, session_id):
+        self._sessions.pop(session_id, None)
+        self._total -= self._sizes.pop(session_id, 0)
+        self._touched.pop(session_id, None)
+        self._dirty.discard(session_id)
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._sessions) > 1:
+            session_id = next(iter(self._sessions))
+            if session_id in self._dirty and self.snapshot_dir:
+                self._write(session_id, self._sessions[session_id], self._touched[session_id])
+            self._forget(session_id)
+
+    # ---- API ----
+    def get(self, session_id, key, default=None):
+        with self._lock:
+            entries = self._session(session_id)
+            entry = entries.get(key)
+            if entry is None:
+                return default
+            blob, expires = entry
+            if expires is not None and expires <= time.time():
+                del entries[key]
+                self._resize(session_id)
+                self._dirty.add(session_id)
+                return default
+        return pickle.loads(blob)
+
+    def set(self, session_id, key, value, ttl=None):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            entries = self._session(session_id)
+            old = entries.get(key)
+            if old is not None and old[0] == blob and (expires is None) == (old[1] is None):
+                if expires is not None:
+                    entries[key] = (blob, expires)
+                return  # unchanged: nothing to snapshot
+            entries[key] = (blob, expires)
+            self._resize(session_id)
+            self._dirty.add(session_id)
+            self._evict()
+
+    def delete(self, session_id, key):
+        with self._lock:
+            entries = self._session(session_id)
+            if entries.pop(key, None) is not None:
+                self._resize(session_id)
+                self._dirty.add(session_id)
+
+    def touch(self, session_id):
+        """Mark a session as in use without changing it, so it is neither evicted first nor swept as idle."""
+        with self._lock:
+            self._session(session_id)
+
+    def keys(self, session_id):
+        now = time.time()
+        with self._lock:
+            return [k for k, (_, exp) in self._session(session_id).items() if exp is None or exp > now]
+
+    def drop(self, session_id):
+        """Forget a whole session, in memory and on disk."""
+        with self._lock:
+            self._forget(session_id)
+            if self.snapshot_dir:
+                self._write(session_id, {}, 0)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self._total, "dirty": len(self._dirty)}
+
+    # ---- maintenance ----
+    def sweep(self):
+        """Drop expired keys and sessions idle for longer than `session_ttl`."""
+        now = time.time()
+        with self._lock:
+            for session_id in list(self._sessions):
+                if now - self._touched[session_id] > self.session_ttl:
+                    self._forget(session_id)
+                    if self.snapshot_dir:
+                        self._write(session_id, {}, 0)
+                    continue
+                entries = self._sessions[session_id]
+                expired = [k for k, (_, exp) in entries.items() if exp is not None and exp <= now]
+                for k in expired:
+                    del entries[k]
+                if expired:
+                    self._resize(session_id)
+                    self._dirty.add(session_id)
+
+    def snapshot(self):
+        """Write every changed session to disk; returns how many were written."""
+        if not self.snapshot_dir:
+            return 0
+        with self._lock:
+            pending = list(self._dirty)
+        written = 0
+        for session_id in pending:
+            # one session per lock hold, so readers only ever wait for a single file write
+            with self._lock:
+                if session_id not in self._dirty:
+                    continue  # evicted (and written) or dropped meanwhile
+                self._dirty.discard(session_id)
+                self._write(session_id, self._sessions[session_id], self._touched[session_id])
+                written += 1
+        return written
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self.snapshot_interval):
+            self.sweep()
+            self.snapshot()
+
+    def close(self):
+        if self._thread is not None and not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+            self.snapshot()
 
 class SessionMemory:
-    def __init__(self):
-        self._store = {}
+    """Key/value memory of one session: a view onto a SessionStore (a private in-memory one by default)."""
+    def __init__(self, store=None, session_id="default"):
+        self.store = store or SessionStore()
+        self.session_id = session_id
         self._created_at = datetime.datetime.utcnow()
 
-    def set(self, key, value):
-        self._store[key] = value
+    def set(self, key, value, ttl=None):
+        self.store.set(self.session_id, key, value, ttl)
 
     def get(self, key, default=None):
-        return self._store.get(key, default)
+        return self.store.get(self.session_id, key, default)
 
     def delete(self, key):
-        if key in self._store:
-            del self._store[key]
+        self.store.delete(self.session_id, key)
 
 class MemoryBank:
     """
@@ -30,4 +257,264 @@ class MemoryBank:
         self._data[user_id].append({"ts": datetime.datetime.utcnow().isoformat(), "record": record})
 
     def query(self, user_id):
-        return list(self._data.get(user_id, []))
\ No newline at end of file
+        return list(self._data.get(user_id, []))
+
+class SQLiteMemoryBank:
+    """
+    Persistent MemoryBank with the same add/query interface.
+
+    Records live in one SQLite table (WAL mode) indexed on (user_id, ts).
+    `add` only enqueues; a background thread writes batches of up to
+    `batch_size` records every `flush_interval` seconds. Reads flush pending
+    writes first, so callers always see their own records. A batch that
+    fails to write (e.g. the database stays locked) is logged and dropped;
+    the writer keeps running. Retention (`retention_days`,
+    `max_records_per_user`) is applied by `compact`, which the writer also
+    runs every `compact_interval` seconds; `compactions` counts the runs that
+    deleted records, so caches built from them can tell they are stale.
+
+    A second table holds content-addressed objects (opaque bytes keyed by
+    user and hash), written synchronously and stored once per user. A third
+    holds per-day running totals (`add_totals`), one row per user, day and
+    name, which retention never deletes.
+    """
+    def __init__(self, path, flush_interval=0.5, batch_size=256, retention_days=None,
+                 max_records_per_user=None, compact_interval=3600):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self.max_records_per_user = max_records_per_user
+        self.compact_interval = compact_interval
+        self.compactions = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._read_lock = threading.Lock()
+        self._reader = self._connect()
+        self._reader.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL,"
+            " ts TEXT NOT NULL, record TEXT NOT NULL)"
+        )
+        self._reader.execute("CREATE INDEX IF NOT EXISTS records_user_ts ON records(user_id, ts)")
+        self._reader.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            " user_id TEXT NOT NULL, hash TEXT NOT NULL, data BLOB NOT NULL,"
+            " PRIMARY KEY (user_id, hash)) WITHOUT ROWID"
+        )
+        self._reader.execute(
+            "CREATE TABLE IF NOT EXISTS totals ("
+            " user_id TEXT NOT NULL, day TEXT NOT NULL, name TEXT NOT NULL, value REAL NOT NULL,"
+            " PRIMARY KEY (user_id, day, name)) WITHOUT ROWID"
+        )
+        self._reader.commit()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name="memorybank-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    # ---- writes ----
+    def add(self, user_id, record, ts=None):
+        ts = ts or datetime.datetime.utcnow().isoformat()
+        row = (user_id, ts, json.dumps(record, default=str))
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("memory bank is closed")
+            self._queue.put(row)
+
+    def add_sync(self, user_id, record, ts=None):
+        """Write one record immediately (after any queued ones) and return its id."""
+        ts = ts or datetime.datetime.utcnow().isoformat()
+        self.flush()
+        with self._read_lock:
+            cur = self._reader.execute(
+                "INSERT INTO records (user_id, ts, record) VALUES (?, ?, ?)",
+                (user_id, ts, json.dumps(record, default=str)),
+            )
+            self._reader.commit()
+            return cur.lastrowid
+
+    def flush(self):
+        """Block until every queued record has been written."""
+        self._queue.join()
+
+    def _write_loop(self):
+        db = self._connect()
+        last_compact = time.monotonic()
+        while True:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            stop = _STOP in batch
+            rows = [r for r in batch if r is not _STOP]
+            try:
+                if rows:
+                    db.executemany("INSERT INTO records (user_id, ts, record) VALUES (?, ?, ?)", rows)
+                    db.commit()
+            except sqlite3.Error:
+                db.rollback()
+                _logger().error("memory bank write failed, records dropped", exc_info=True, records=len(rows))
+            try:
+                if time.monotonic() - last_compact >= self.compact_interval:
+                    last_compact = time.monotonic()
+                    self._compact(db)
+            except sqlite3.Error:
+                db.rollback()
+                _logger().error("memory bank compaction failed", exc_info=True)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                db.close()
+                return
+
+    # ---- reads ----
+    def query(self, user_id):
+        return self.query_range(user_id)
+
+    def query_range(self, user_id, since=None, until=None, limit=None, offset=0, newest_first=False):
+        """Records of `user_id` with since <= ts < until (ISO strings), paged by limit/offset."""
+        self.flush()
+        sql = "SELECT id, ts, record FROM records WHERE user_id = ?"
+        args = [user_id]
+        if since is not None:
+            sql += " AND ts >= ?"
+            args.append(since)
+        if until is not None:
+            sql += " AND ts < ?"
+            args.append(until)
+        sql += " ORDER BY ts DESC, id DESC" if newest_first else " ORDER BY ts, id"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            args += [-1 if limit is None else limit, offset]
+        with self._read_lock:
+            rows = self._reader.execute(sql, args).fetchall()
+        return [{"id": i, "ts": ts, "record": json.loads(rec)} for i, ts, rec in rows]
+
+    def get(self, user_id, record_id):
+        self.flush()
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT id, ts, record FROM records WHERE user_id = ? AND id = ?", (user_id, record_id)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "ts": row[1], "record": json.loads(row[2])}
+
+    def count(self, user_id):
+        self.flush()
+        with self._read_lock:
+            return self._reader.execute("SELECT COUNT(*) FROM records WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def delete(self, user_id, record_id=None):
+        """Delete one record, or every record of the user when `record_id` is None."""
+        self.flush()
+        with self._read_lock:
+            if record_id is None:
+                self._reader.execute("DELETE FROM records WHERE user_id = ?", (user_id,))
+            else:
+                self._reader.execute("DELETE FROM records WHERE user_id = ? AND id = ?", (user_id, record_id))
+            self._reader.commit()
+
+    # ---- content-addressed objects ----
+    def put_objects(self, user_id, objects):
+        """Store {hash: bytes} for `user_id`; hashes already stored are skipped. Returns how many were new."""
+        with self._read_lock:
+            before = self._reader.total_changes
+            self._reader.executemany("INSERT OR IGNORE INTO objects (user_id, hash, data) VALUES (?, ?, ?)",
+                                     [(user_id, h, data) for h, data in objects.items()])
+            self._reader.commit()
+            return self._reader.total_changes - before
+
+    def get_objects(self, user_id, hashes):
+        """{hash: bytes} for the stored ones among `hashes`."""
+        hashes = list(set(hashes))
+        found = {}
+        with self._read_lock:
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                found.update(self._reader.execute(
+                    f"SELECT hash, data FROM objects WHERE user_id = ? AND hash IN ({','.join('?' * len(part))})",
+                    [user_id, *part]).fetchall())
+        return found
+
+    def object_hashes(self, user_id):
+        with self._read_lock:
+            return {h for (h,) in self._reader.execute("SELECT hash FROM objects WHERE user_id = ?", (user_id,))}
+
+    def object_stats(self, user_id):
+        """(object count, stored bytes) of `user_id`."""
+        with self._read_lock:
+            n, size = self._reader.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM objects"
+                                           " WHERE user_id = ?", (user_id,)).fetchone()
+        return n, size
+
+    def delete_objects(self, user_id, hashes=None):
+        """Delete the given objects, or every object of the user when `hashes` is None."""
+        with self._read_lock:
+            if hashes is None:
+                self._reader.execute("DELETE FROM objects WHERE user_id = ?", (user_id,))
+            else:
+                self._reader.executemany("DELETE FROM objects WHERE user_id = ? AND hash = ?",
+                                         [(user_id, h) for h in hashes])
+            self._reader.commit()
+
+    # ---- per-day totals ----
+    def add_totals(self, user_id, day, amounts):
+        """Add {name: amount} to the totals of `user_id` for `day` (an ISO date)."""
+        with self._read_lock:
+            self._reader.executemany(
+                "INSERT INTO totals (user_id, day, name, value) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (user_id, day, name) DO UPDATE SET value = value + excluded.value",
+                [(user_id, day, name, amount) for name, amount in amounts.items()])
+            self._reader.commit()
+
+    def totals(self, user_id):
+        """[(day, name, total)] of `user_id`, oldest day first."""
+        with self._read_lock:
+            return self._reader.execute("SELECT day, name, value FROM totals WHERE user_id = ? ORDER BY day, name",
+                                        (user_id,)).fetchall()
+
+    # ---- maintenance ----
+    def compact(self):
+        self.flush()
+        with self._read_lock:
+            self._compact(self._reader)
+
+    def _compact(self, db):
+        before = db.total_changes
+        if self.retention_days is not None:
+            cutoff = (datetime.datetime.utcnow() - datetime.timedelta(days=self.retention_days)).isoformat()
+            db.execute("DELETE FROM records WHERE ts < ?", (cutoff,))
+        if self.max_records_per_user is not None:
+            db.execute(
+                "DELETE FROM records WHERE id IN ("
+                " SELECT id FROM (SELECT id, ROW_NUMBER() OVER"
+                "  (PARTITION BY user_id ORDER BY ts DESC, id DESC) AS rn FROM records)"
+                " WHERE rn > ?)",
+                (self.max_records_per_user,),
+            )
+        db.commit()
+        if db.total_changes != before:
+            self.compactions += 1
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._writer.join()
+        self._reader.close()
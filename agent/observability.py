@@ -1,42 +1,485 @@
 """
-observability.py — lightweight Logger and Trace helpers
+observability.py — queue-backed structured Logger, span-based Trace, latency
+metrics and an opt-in per-rerun stage Profiler
 """
+import atexit
+import bisect
+import functools
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime
 
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, session, trace and any structured fields."""
+    def format(self, record):
+        out = {"ts": datetime.utcfromtimestamp(record.created).isoformat(timespec="microseconds"),
+               "level": record.levelname, "logger": record.name, "msg": record.getMessage()}
+        if getattr(record, "session_id", None):
+            out["session"] = record.session_id
+        if getattr(record, "trace_id", None):
+            out["trace"] = record.trace_id
+        out.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that does the least work on the calling thread and drops records past `maxsize` queued."""
+    def __init__(self, q, maxsize):
+        super().__init__(q)
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def prepare(self, record):
+        # the listener runs in this process, so the record can be handed over as is;
+        # only the message is resolved now, in case its args are mutated later
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        # a SimpleQueue put is ~10x cheaper than a bounded Queue's, so the bound is checked here
+        if self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+        else:
+            self.queue.put(record)
+
+class _LogState:
+    lock = threading.Lock()
+    handler = None
+    listener = None
+    debug_sample_rate = 1.0
+
+def _reset_after_fork():
+    # the listener thread does not exist in a forked child; configure again on first use
+    _LogState.handler = _LogState.listener = None
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def configure_logging(level="INFO", path=None, max_bytes=5_000_000, backups=3, debug_sample_rate=0.01,
+                      stream=True, queue_size=10_000, name="StudyPlannerAgent"):
+    """
+    (Re)install the process-wide handlers of the `name` logger: a bounded queue
+    drained by a QueueListener thread, which writes human-readable lines to
+    stderr (`stream`) and JSON lines to `path`, rotated at `max_bytes`.
+    debug() calls through Logger are kept with probability `debug_sample_rate`.
+    """
+    with _LogState.lock:
+        if _LogState.listener is not None:
+            _LogState.listener.stop()
+        handlers = []
+        if stream:
+            console = logging.StreamHandler()
+            console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            handlers.append(console)
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            rotating = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                            encoding="utf-8")
+            rotating.setFormatter(JsonFormatter())
+            handlers.append(rotating)
+        q = queue.SimpleQueue()
+        handler = _QueueHandler(q, queue_size)
+        listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=True)
+        lg = logging.getLogger(name)
+        for old in [h for h in lg.handlers if isinstance(h, _QueueHandler)]:
+            lg.removeHandler(old)
+        lg.addHandler(handler)
+        lg.setLevel(level)
+        lg.propagate = False
+        listener.start()
+        _LogState.handler, _LogState.listener = handler, listener
+        _LogState.debug_sample_rate = debug_sample_rate
+        return handler
+
+def flush_logging():
+    """Block until every queued record has been written (stops and restarts the listener)."""
+    with _LogState.lock:
+        if _LogState.listener is not None:
+            _LogState.listener.stop()
+            _LogState.listener.start()
+
+@atexit.register
+def _stop_logging():
+    with _LogState.lock:
+        if _LogState.listener is not None:
+            _LogState.listener.stop()
+            _LogState.listener = None
+
 class Logger:
+    """
+    Structured logger for one agent or session. Handlers are installed once per
+    process (configure_logging, with defaults on first use), and records reach
+    them through a queue, so a call on the request thread costs a few
+    microseconds whatever the handlers do. Keyword arguments become JSON fields;
+    every record carries `session_id` and the thread's current trace id.
+    """
+    def __init__(self, session_id=None, name="StudyPlannerAgent"):
+        if _LogState.handler is None:
+            with _LogState.lock:
+                needs_setup = _LogState.handler is None
+            if needs_setup:
+                # defaults go on the top-level logger; a child like "X.memory" propagates to it
+                configure_logging(name=name.split(".")[0])
+        self._lg = logging.getLogger(name)
+        self.session_id = session_id
+
+    def _log(self, level, msg, args, fields, exc_info=False):
+        if self._lg.isEnabledFor(level):
+            if exc_info:
+                exc_info = sys.exc_info()
+            # built directly: the handlers never print the caller's file and line, so skip findCaller
+            record = self._lg.makeRecord(self._lg.name, level, "", 0, msg, args, exc_info or None, extra={
+                "session_id": self.session_id, "trace_id": getattr(Trace._local, "trace_id", None),
+                "fields": fields})
+            self._lg.handle(record)
+
+    def info(self, msg, *args, **fields):
+        self._log(logging.INFO, msg, args, fields)
+
+    def warning(self, msg, *args, **fields):
+        self._log(logging.WARNING, msg, args, fields)
+
+    def error(self, msg, *args, exc_info=False, **fields):
+        self._log(logging.ERROR, msg, args, fields, exc_info)
+
+    def debug(self, msg, *args, **fields):
+        """Sampled: only `debug_sample_rate` of debug events are kept (the rate is logged with them)."""
+        if not self._lg.isEnabledFor(logging.DEBUG):
+            return
+        rate = _LogState.debug_sample_rate
+        if rate < 1.0:
+            if random.random() >= rate:
+                return
+            fields["sample_rate"] = rate
+        self._log(logging.DEBUG, msg, args, fields)
+
+# upper bounds in seconds; +Inf is implicit
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
     def __init__(self):
-        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
-        self._lg = logging.getLogger("StudyPlannerAgent")
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
 
-    def info(self, msg):
-        self._lg.info(msg)
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
 
-    def error(self, msg):
-        self._lg.error(msg)
+class Metrics:
+    """Process-wide per-operation latency histograms."""
+    _lock = threading.Lock()
+    _histograms = {}
+    _last_export = 0.0
 
-    def debug(self, msg):
-        self._lg.debug(msg)
+    @classmethod
+    def observe(cls, op, seconds):
+        with cls._lock:
+            h = cls._histograms.get(op)
+            if h is None:
+                h = cls._histograms[op] = Histogram()
+            h.observe(seconds)
+
+    @classmethod
+    def snapshot(cls):
+        with cls._lock:
+            return {op: {"count": h.count, "sum": h.total, "buckets": list(h.counts)}
+                    for op, h in cls._histograms.items()}
+
+    @classmethod
+    def to_prometheus(cls, name="study_planner_operation_seconds"):
+        lines = [f"# HELP {name} Latency of instrumented operations.", f"# TYPE {name} histogram"]
+        for op, h in sorted(cls.snapshot().items()):
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS + ("+Inf",), h["buckets"]):
+                cumulative += n
+                lines.append(f'{name}_bucket{{op="{op}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{op="{op}"}} {h["sum"]:.6f}')
+            lines.append(f'{name}_count{{op="{op}"}} {h["count"]}')
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def export_prometheus(cls, path):
+        """Write the Prometheus text exposition to `path` atomically."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(cls.to_prometheus())
+        os.replace(tmp, path)
+
+    @classmethod
+    def maybe_export(cls, path, interval=10.0):
+        """Export at most once per `interval` seconds; cheap to call on every rerun."""
+        now = time.monotonic()
+        with cls._lock:
+            if now - cls._last_export < interval:
+                return False
+            cls._last_export = now
+        cls.export_prometheus(path)
+        return True
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._histograms.clear()
 
 class Trace:
-    _traces = {}
+    """
+    Traces made of nested spans. Open and finished traces are kept in bounded
+    buffers (MAX_TRACES each, MAX_SPANS spans/events per trace), so memory has a
+    fixed ceiling however many sessions run. Every span also feeds Metrics.
+    """
+    MAX_TRACES = 256
+    MAX_SPANS = 512
+    _lock = threading.Lock()
+    _traces = OrderedDict()
+    _finished = deque(maxlen=MAX_TRACES)
+    _local = threading.local()
+
+    @classmethod
+    def _new(cls, trace_id):
+        return {"id": trace_id, "start": datetime.utcnow().isoformat(), "t0": time.perf_counter(),
+                "spans": deque(maxlen=cls.MAX_SPANS), "events": deque(maxlen=cls.MAX_SPANS)}
 
     @classmethod
     def start_trace(cls, trace_id):
-        cls._traces[trace_id] = {"start": datetime.utcnow().isoformat(), "events": []}
+        with cls._lock:
+            cls._traces[trace_id] = cls._new(trace_id)
+            cls._traces.move_to_end(trace_id)
+            while len(cls._traces) > cls.MAX_TRACES:
+                cls._traces.popitem(last=False)
+        cls._local.trace_id = trace_id
 
     @classmethod
     def log_event(cls, trace_id, event):
-        if trace_id in cls._traces:
-            cls._traces[trace_id]["events"].append({"ts": datetime.utcnow().isoformat(), "event": event})
+        with cls._lock:
+            if trace_id in cls._traces:
+                cls._traces[trace_id]["events"].append({"ts": datetime.utcnow().isoformat(), "event": event})
 
     @classmethod
     def end_trace(cls, trace_id):
-        if trace_id in cls._traces:
-            cls._traces[trace_id]["end"] = datetime.utcnow().isoformat()
-            # For demo, print summary
-            print("\nTRACE SUMMARY:", json_safe(cls._traces[trace_id]))
+        """Close a trace and return its summary (also kept in the finished ring buffer)."""
+        with cls._lock:
+            t = cls._traces.pop(trace_id, None)
+            if t is None:
+                return None
+            summary = {"id": trace_id, "start": t["start"], "end": datetime.utcnow().isoformat(),
+                       "duration": time.perf_counter() - t["t0"],
+                       "spans": list(t["spans"]), "events": list(t["events"])}
+            cls._finished.append(summary)
+        if getattr(cls._local, "trace_id", None) == trace_id:
+            cls._local.trace_id = None
+        return summary
+
+    @classmethod
+    def recent(cls, n=20):
+        with cls._lock:
+            return list(cls._finished)[-n:]
+
+    @classmethod
+    @contextmanager
+    def span(cls, name, trace_id=None):
+        """Time a block with the monotonic clock; nests under the thread's current span."""
+        stack = getattr(cls._local, "stack", None)
+        if stack is None:
+            stack = cls._local.stack = []
+        trace_id = trace_id or getattr(cls._local, "trace_id", None)
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        prof = Profiler.current() if Profiler._active else None
+        if prof is not None:
+            prof._enter()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            stack.pop()
+            if prof is not None:
+                prof._exit(name, parent, elapsed)
+            Metrics.observe(name, elapsed)
+            if trace_id is not None:
+                with cls._lock:
+                    t = cls._traces.get(trace_id)
+                    if t is not None:
+                        t["spans"].append({"name": name, "parent": parent,
+                                           "offset": t0 - t["t0"], "duration": elapsed})
+
+class Profiler:
+    """
+    Opt-in profiler for one script run (one Streamlit rerun) on the current thread.
+
+    While a Profiler is active every Trace.span, and every function wrapped with
+    @profiled, is recorded as a stage with its wall time and, with
+    `allocations`, its tracemalloc peak. With `cprofile` the whole run is also
+    sampled by cProfile. When no Profiler is active anywhere, @profiled and
+    Trace.span only test a class counter before skipping the bookkeeping.
+    tracemalloc is process-wide: it runs while any profiler tracks allocations
+    and stops with the last one (unless something else started it), and
+    concurrent profilers' peaks include each other's allocations.
+    """
+    _local = threading.local()
+    _count_lock = threading.Lock()
+    _active = 0             # profilers active on any thread; lets @profiled skip the thread-local lookup
+    _tracing = 0            # profilers tracking allocations
+    _owns_tracemalloc = False
+
+    def __init__(self, allocations=False, cprofile=False):
+        self.allocations = allocations
+        self.cprofile = cprofile
+        self.stages = []        # {"name", "parent", "seconds", "peak_kb"}
+        self.seconds = 0.0
+        self.cprofile_text = ""
+        self._peaks = []
+        self._tracing = False
+        self._profile = None
+        self._t0 = 0.0
+        self._stopped = False
+
+    @classmethod
+    def current(cls):
+        prof = getattr(cls._local, "profiler", None)
+        return prof if prof is not None and not prof._stopped else None
+
+    @classmethod
+    def start(cls, allocations=False, cprofile=False):
+        """Activate a new Profiler on this thread, discarding one a previous run left open."""
+        stale = cls.current()
+        if stale is not None:
+            stale.stop()
+        prof = cls(allocations, cprofile)
+        if allocations:
+            with cls._count_lock:
+                if cls._tracing == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    cls._owns_tracemalloc = True
+                cls._tracing += 1
+            prof._tracing = True
+        if cprofile:
+            import cProfile
+            prof._profile = cProfile.Profile()
+            prof._profile.enable()
+        with cls._count_lock:
+            cls._active += 1
+        cls._local.profiler = prof
+        prof._t0 = time.perf_counter()
+        return prof
+
+    def stop(self):
+        """Deactivate and finish collecting (safe to call twice, or from another thread); returns self."""
+        if self._stopped:
+            return self
+        self._stopped = True
+        if Profiler.current() is self:
+            Profiler._local.profiler = None
+        with Profiler._count_lock:
+            Profiler._active -= 1
+        self.seconds = time.perf_counter() - self._t0
+        if self._profile is not None:
+            import io
+            import pstats
+            self._profile.disable()
+            out = io.StringIO()
+            try:
+                pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(25)
+            except TypeError:
+                pass  # nothing was sampled
+            self.cprofile_text = out.getvalue()
+            self._profile = None
+        if self._tracing:
+            self._tracing = False
+            with Profiler._count_lock:
+                Profiler._tracing -= 1
+                if Profiler._tracing == 0 and Profiler._owns_tracemalloc:
+                    tracemalloc.stop()
+                    Profiler._owns_tracemalloc = False
+        return self
+
+    def _enter(self):
+        if self.allocations and tracemalloc.is_tracing():
+            # fold the peak so far into the enclosing stage before resetting it
+            current, peak = tracemalloc.get_traced_memory()
+            if self._peaks:
+                self._peaks[-1][1] = max(self._peaks[-1][1], peak)
+            tracemalloc.reset_peak()
+            self._peaks.append([current, current])
+
+    def _exit(self, name, parent, elapsed):
+        peak_kb = None
+        if self._peaks:
+            base, peak = self._peaks.pop()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            if self._peaks:
+                self._peaks[-1][1] = max(self._peaks[-1][1], peak)
+            peak_kb = (peak - base) / 1024
+        self.stages.append({"name": name, "parent": parent, "seconds": elapsed, "peak_kb": peak_kb})
+
+    def summary(self):
+        """Stages aggregated by name: calls, total/max seconds and max peak, slowest first."""
+        agg = {}
+        for st in self.stages:
+            a = agg.setdefault(st["name"], {"stage": st["name"], "parent": st["parent"], "calls": 0,
+                                             "total_ms": 0.0, "max_ms": 0.0, "peak_kb": None})
+            a["calls"] += 1
+            a["total_ms"] += st["seconds"] * 1000
+            a["max_ms"] = max(a["max_ms"], st["seconds"] * 1000)
+            if st["peak_kb"] is not None:
+                a["peak_kb"] = max(a["peak_kb"] or 0.0, st["peak_kb"])
+        return sorted(agg.values(), key=lambda a: -a["total_ms"])
+
+    def record(self, **extra):
+        return {"ts": datetime.utcnow().isoformat(), "seconds": self.seconds, **extra, "stages": self.summary()}
+
+_profile_logs = {}
+_profile_logs_lock = threading.Lock()
+
+def append_profile(path, record, max_bytes=1_000_000, backups=3):
+    """Append one JSON line to `path`, rotating it to path.1..path.N past `max_bytes`."""
+    with _profile_logs_lock:
+        lg = _profile_logs.get(path)
+        if lg is None:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                           encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            lg = logging.getLogger(f"StudyPlannerAgent.profile.{path}")
+            lg.propagate = False
+            lg.setLevel(logging.INFO)
+            lg.addHandler(handler)
+            _profile_logs[path] = lg
+    lg.info(json.dumps(record, default=str))
+
+def profiled(name=None):
+    """Decorator: time calls as a Trace span, but only while a Profiler is active."""
+    def wrap(fn):
+        stage = name or fn.__name__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not Profiler._active or Profiler.current() is None:
+                return fn(*args, **kwargs)
+            with Trace.span(stage):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
 
 def json_safe(obj):
-    import json
     return json.dumps(obj, indent=2, default=str)
@@ -0,0 +1,155 @@
+"""
+pdf_export.py — width-aware PDF writer and a bounded, content-addressed PDF cache
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+FONT = "Helvetica"
+FONT_SIZE = 11
+TITLE_FONT = "Helvetica-Bold"
+TITLE_SIZE = 14
+LEADING = 14
+MARGIN = 40
+
+def pdf_key(*parts):
+    """Cache key for a PDF built from `parts` (e.g. plan hashes and titles)."""
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(str(p).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def wrap_to_width(line, max_width, font=FONT, size=FONT_SIZE):
+    """Greedy word wrap on rendered width; words wider than a line are split by character."""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    if not line.strip():
+        yield ""
+        return
+    space = stringWidth(" ", font, size)
+    current, width = [], 0.0
+    for word in line.split():
+        w = stringWidth(word, font, size)
+        if w > max_width:
+            if current:
+                yield " ".join(current)
+                current, width = [], 0.0
+            part = ""
+            for ch in word:
+                if stringWidth(part + ch, font, size) > max_width:
+                    yield part
+                    part = ""
+                part += ch
+            word, w = part, stringWidth(part, font, size)
+        extra = w + (space if current else 0)
+        if current and width + extra > max_width:
+            yield " ".join(current)
+            current, width = [word], w
+        else:
+            current.append(word)
+            width += extra
+    if current:
+        yield " ".join(current)
+
+def write_pdf(out, documents):
+    """
+    Write `documents`, an iterable of (title, text), to the binary file `out`,
+    each starting on a new page.
+
+    Documents and lines are consumed lazily and every page's content stream is
+    compressed when the page is finished, so a long export never holds the
+    full text or the uncompressed pages at once.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    c = canvas.Canvas(out, pagesize=A4, pageCompression=1)
+    w, h = A4
+    max_width = w - 2 * MARGIN
+    first = True
+    for title, text in documents:
+        if not first:
+            c.showPage()
+        first = False
+        y = h - MARGIN
+        c.setFont(TITLE_FONT, TITLE_SIZE)
+        for part in wrap_to_width(title, max_width, TITLE_FONT, TITLE_SIZE):
+            c.drawString(MARGIN, y, part)
+            y -= 18
+        y -= 4
+        c.setFont(FONT, FONT_SIZE)
+        for line in text.splitlines():
+            for part in wrap_to_width(line, max_width):
+                if y < 60:
+                    c.showPage()
+                    c.setFont(FONT, FONT_SIZE)
+                    y = h - MARGIN
+                c.drawString(MARGIN, y, part)
+                y -= LEADING
+    c.save()
+    return out
+
+def build_pdf(documents):
+    """PDF bytes for `documents`, built in memory (PDFCache and st.download_button both need bytes)."""
+    out = io.BytesIO()
+    write_pdf(out, documents)
+    return out.getvalue()
+
+class PDFCache:
+    """
+    Thread-safe LRU of built PDFs keyed by content hash, bounded by entry count
+    and total bytes. Concurrent requests for the same key build it once.
+    """
+    def __init__(self, max_entries=32, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._building = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            if len(data) > self.max_bytes:
+                return
+            self._entries[key] = data
+            self._bytes += len(data)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def get_or_build(self, key, build):
+        """Cached bytes for `key`, calling `build()` (once across threads) on a miss."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+            lock = self._building.setdefault(key, threading.Lock())
+        with lock:
+            data = self.get(key)
+            if data is None:
+                data = build()
+                self.put(key, data)
+        with self._lock:
+            self._building.pop(key, None)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,172 @@
+"""
+plan_model.py — typed study plan parsed once from structured (JSON) planner output.
+HTML, markdown/TXT/PDF text and dashboard aggregates are all derived from it.
+"""
+import json
+from dataclasses import dataclass, asdict
+from html import escape
+
+from agent.observability import profiled
+
+def _row_schema(fields):
+    return {
+        "type": "object",
+        "additionalProperties": False,
+        "required": list(fields),
+        "properties": {k: {"type": t} for k, t in fields.items()},
+    }
+
+PLAN_SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": ["weekly", "daily", "tips"],
+    "properties": {
+        "weekly": {"type": "array", "items": _row_schema({
+            "day": "string", "subject": "string", "hours": "number",
+            "focus": "string", "revision_hours": "number",
+        })},
+        "daily": {"type": "array", "items": _row_schema({
+            "day": "string", "start": "string", "end": "string",
+            "subject": "string", "task": "string",
+        })},
+        "tips": {"type": "array", "items": {"type": "string"}},
+    },
+}
+
+# `response_format` argument for chat.completions.create
+PLAN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "study_plan", "strict": True, "schema": PLAN_SCHEMA},
+}
+
+WEEKLY_HEADER = ("Day", "Subject", "Study Hours", "Focus Area", "Revision Hours")
+
+def _hours(v):
+    return f"{v:g}"
+
+@dataclass(frozen=True)
+class WeeklyRow:
+    day: str
+    subject: str
+    hours: float
+    focus: str = ""
+    revision_hours: float = 0.0
+
+    def cells(self):
+        return (self.day, self.subject, _hours(self.hours), self.focus, _hours(self.revision_hours))
+
+@dataclass(frozen=True)
+class DailyBlock:
+    day: str
+    start: str
+    end: str
+    subject: str
+    task: str = ""
+
+@dataclass(frozen=True)
+class StudyPlan:
+    name: str
+    weekly: tuple = ()
+    daily: tuple = ()
+    tips: tuple = ()
+
+    @classmethod
+    def from_dict(cls, data, name="Student"):
+        try:
+            weekly = tuple(
+                WeeklyRow(str(r["day"]), str(r["subject"]), float(r["hours"]),
+                          str(r.get("focus", "")), float(r.get("revision_hours", 0) or 0))
+                for r in data.get("weekly", [])
+            )
+            daily = tuple(
+                DailyBlock(str(b["day"]), str(b["start"]), str(b["end"]),
+                           str(b["subject"]), str(b.get("task", "")))
+                for b in data.get("daily", [])
+            )
+            tips = tuple(str(t) for t in data.get("tips", []))
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"malformed study plan: {e!r}") from e
+        return cls(name=name, weekly=weekly, daily=daily, tips=tips)
+
+    @classmethod
+    def from_json(cls, text, name="Student"):
+        """Parse model output; raises ValueError if it is not a valid plan object."""
+        data = json.loads(text)
+        if not isinstance(data, dict):
+            raise ValueError("study plan JSON must be an object")
+        return cls.from_dict(data, name=name)
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(",", ":"), ensure_ascii=False)
+
+    # ---- derived views ----
+    def subject_hours(self):
+        totals = {}
+        for r in self.weekly:
+            totals[r.subject] = totals.get(r.subject, 0.0) + r.hours
+        return totals
+
+    def daily_by_day(self):
+        days = {}
+        for b in self.daily:
+            days.setdefault(b.day, []).append(b)
+        return days
+
+    def to_markdown(self):
+        """Plain-text rendering used for TXT/PDF export and as `last_plan_raw`."""
+        out = ["## Weekly Overview", "| " + " | ".join(WEEKLY_HEADER) + " |",
+               "|" + "---|" * len(WEEKLY_HEADER)]
+        out.extend("| " + " | ".join(r.cells()) + " |" for r in self.weekly)
+        out += ["", "## Daily Breakdown"]
+        for day, blocks in self.daily_by_day().items():
+            out.append(f"### {day}")
+            out.extend(f"- {b.start}-{b.end} {b.subject}" + (f": {b.task}" if b.task else "") for b in blocks)
+        out += ["", "## Study Tips"]
+        out.extend(f"- {t}" for t in self.tips)
+        return "\n".join(out)
+
+    def weekly_html(self):
+        head = "".join(f"<th>{h}</th>" for h in WEEKLY_HEADER)
+        body = "".join(
+            "<tr>" + "".join(f"<td>{escape(c)}</td>" for c in r.cells()) + "</tr>"
+            for r in self.weekly
+        )
+        return f"<table class='tbl'><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+    def daily_html(self):
+        parts = []
+        for day, blocks in self.daily_by_day().items():
+            parts.append(f"<h3>{escape(day)}</h3>")
+            parts.extend(
+                f"<li><b>{escape(b.start)}–{escape(b.end)}</b> {escape(b.subject)}"
+                + (f": {escape(b.task)}" if b.task else "") + "</li>"
+                for b in blocks
+            )
+        return "".join(parts)
+
+    def tips_html(self):
+        return "".join(f"<li>{escape(t)}</li>" for t in self.tips)
+
+    def html_sections(self):
+        return self.weekly_html(), self.daily_html(), self.tips_html()
+
+@profiled()
+def subject_hours_from_markdown(raw):
+    """Fallback aggregate for markdown plans: sum the Study Hours column of the weekly table."""
+    subjects = {}
+    for line in (raw or "").splitlines():
+        # Must contain markdown table pipes
+        if "|" not in line:
+            continue
+        parts = [p.strip() for p in line.split("|") if p.strip()]
+        # We need at least 3 columns for Day + Subject + Hours
+        if len(parts) < 3:
+            continue
+        # Skip header row (non-numeric hrs column)
+        if not parts[2].replace(".", "", 1).isdigit():
+            continue
+        subjects[parts[1]] = subjects.get(parts[1], 0) + float(parts[2])
+    return subjects
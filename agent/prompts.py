@@ -0,0 +1,46 @@
+"""
+prompts.py — Planner prompt template shared by the app and the cohort generator
+"""
+
+PLAN_SYSTEM_MSG = {"role": "system", "content": "You generate clear, actionable study plans."}
+
+MARKDOWN_INSTRUCTIONS = """
+Output 3 sections:
+1) Weekly Overview (as a markdown table with columns: Day | Subject | Study Hours | Focus Area | Revision Hours)
+2) Daily Breakdown with time blocks and tasks (clear bullet points)
+3) Short Study Tips (3-6 items)
+Keep language concise and professional.
+"""
+
+JSON_INSTRUCTIONS = """
+Return JSON with:
+- weekly: one row per day and subject (day, subject, hours, focus, revision_hours)
+- daily: time blocks (day, start and end as HH:MM, subject, task)
+- tips: 3-6 short study tips
+Keep language concise and professional.
+"""
+
+def plan_details(profile):
+    """
+    Student section of the prompt. profile keys: name, subjects (list),
+    weekly_hours, deadline, intensity, include_revision, include_tips and
+    optional revision_topics (weak topics due for spaced revision).
+    """
+    details = f"""Generate a clear, professional weekly study plan for a student.
+
+Name: {profile.get("name") or "Student"}
+Subjects: {list(profile.get("subjects", []))}
+Weekly hours: {profile.get("weekly_hours", 20)}
+Deadline: {profile.get("deadline", "")}
+Intensity: {profile.get("intensity", 6)}
+Include revision: {profile.get("include_revision", True)}
+Include tips: {profile.get("include_tips", True)}
+"""
+    if profile.get("revision_topics"):
+        details += f"Weak topics due for revision: {list(profile['revision_topics'])}\n"
+    return details
+
+def plan_messages(profile, structured=False):
+    """Chat messages asking for a plan as markdown, or as JSON when `structured`."""
+    instructions = JSON_INSTRUCTIONS if structured else MARKDOWN_INSTRUCTIONS
+    return [PLAN_SYSTEM_MSG, {"role": "user", "content": plan_details(profile) + instructions}]
@@ -0,0 +1,149 @@
+"""
+render.py — single-pass, incremental markdown → HTML renderer for plan text.
+Handles the subset the planner emits: pipe tables, ##/### headings, "- " lists
+and paragraphs. Text can be fed in arbitrary chunks (e.g. straight from a
+streaming LLM response); HTML is emitted as soon as each line is complete.
+Also holds the plan text helpers shared by the app and the benchmarks
+(sanitize_text, pretty_split_plan, render_plan_card).
+"""
+import re
+
+from agent.observability import profiled
+
+SEPARATOR_RE = re.compile(r"^\|?\s*-[-\s|]*\|?$")
+
+class MarkdownRenderer:
+    def __init__(self):
+        self._tail = ""        # incomplete last line of the input seen so far
+        self._in_table = False
+
+    def feed(self, chunk):
+        """Consume a chunk of markdown and return the HTML for the lines it completes."""
+        if "\n" not in chunk:
+            self._tail += chunk
+            return ""
+        lines = (self._tail + chunk).split("\n")
+        self._tail = lines.pop()
+        out = []
+        for line in lines:
+            self._render_line(line.strip(), out)
+        return "".join(out)
+
+    def close(self):
+        """Flush the pending partial line and close any open table."""
+        out = []
+        if self._tail:
+            self._render_line(self._tail.strip(), out)
+            self._tail = ""
+        if self._in_table:
+            self._in_table = False
+            out.append("</tbody></table>")
+        return "".join(out)
+
+    def _render_line(self, line, out):
+        first = line[:1]
+        # skip separator rows
+        if first in ("|", "-") and SEPARATOR_RE.match(line):
+            return
+        if first == "|" and line.endswith("|"):
+            cols = [c.strip() for c in line.split("|")[1:-1]]
+            if not self._in_table:
+                self._in_table = True
+                out.append("<table class='tbl'><thead><tr>")
+                out.extend(f"<th>{c}</th>" for c in cols)
+                out.append("</tr></thead><tbody>")
+            else:
+                out.append("<tr>")
+                out.extend(f"<td>{c}</td>" for c in cols)
+                out.append("</tr>")
+            return
+        if self._in_table:
+            self._in_table = False
+            out.append("</tbody></table><br>")
+        if line.startswith("### "):
+            out.append(f"<h3>{line[4:]}</h3>")
+        elif line.startswith("## "):
+            out.append(f"<h2>{line[3:]}</h2>")
+        elif line.startswith("- "):
+            out.append(f"<li>{line[2:]}</li>")
+        elif line:
+            out.append(f"<p>{line}</p>")
+
+def render_markdown_stream(chunks):
+    """Yield HTML fragments for an iterable of markdown chunks."""
+    r = MarkdownRenderer()
+    for chunk in chunks:
+        html = r.feed(chunk)
+        if html:
+            yield html
+    html = r.close()
+    if html:
+        yield html
+
+def render_markdown(md):
+    if not md:
+        return ""
+    r = MarkdownRenderer()
+    return r.feed(md) + r.close()
+
+@profiled()
+def sanitize_text(s: str) -> str:
+    # Remove harmful tags and stray control chars
+    s = re.sub(r"<[^a-zA-Z/][^>]*>", "", s)
+    s = s.replace("< ", "&lt; ").replace(" >", " &gt;")
+    return s.strip()
+
+@profiled()
+def pretty_split_plan(raw: str):
+    """Attempt to split plan into Weekly / Daily / Tips. Fallbacks to raw."""
+    if not raw:
+        return "", "", ""
+    lower = raw.lower()
+    # heuristics for splitting
+    start_weekly = raw.find("weekly")
+    start_daily = raw.lower().find("daily")
+    start_tips = raw.lower().find("tips")
+    if start_daily != -1 and start_tips != -1:
+        weekly = raw[:start_daily]
+        daily = raw[start_daily:start_tips]
+        tips = raw[start_tips:]
+    elif start_daily != -1:
+        weekly = raw[:start_daily]
+        daily = raw[start_daily:]
+        tips = ""
+    elif start_tips != -1:
+        weekly = raw[:start_tips]
+        daily = ""
+        tips = raw[start_tips:]
+    else:
+        # fallback: split into three equal parts (best-effort)
+        parts = raw.splitlines()
+        n = len(parts) or 1
+        p1 = parts[:max(1, n//3)]
+        p2 = parts[max(1, n//3):max(1, 2*n//3)]
+        p3 = parts[max(1, 2*n//3):]
+        weekly = "\n".join(p1)
+        daily = "\n".join(p2)
+        tips = "\n".join(p3)
+    return weekly, daily, tips
+
+@profiled()
+def render_plan_card(name, weekly_html, daily_html, tips_html):
+    return f"""
+    <div style="background:white;padding:28px;border-radius:16px;
+                box-shadow:0 14px 40px rgba(11,66,255,0.08);font-family:Inter;">
+      <h1 style="font-size:34px;margin:6px 0 8px 0;color:#0b66ff;font-weight:800;text-align:center">
+        📘 Weekly Study Plan — {name or 'Student'}
+      </h1>
+      <p style="text-align:center;color:#64748b;margin-bottom:20px">AI-generated personalized plan</p>
+
+      <h2 style="color:#0b66ff;font-size:20px;margin-bottom:6px">📅 Weekly Overview</h2>
+      <div style="padding:14px;border-left:6px solid #0b66ff;background:#f5f9ff;border-radius:10px;margin-bottom:18px;">{weekly_html}</div>
+
+      <h2 style="color:#0b66ff;font-size:20px;margin-bottom:6px">🕒 Daily Breakdown</h2>
+      <div style="padding:14px;border-left:6px solid #0284c7;background:#f0f7ff;border-radius:10px;margin-bottom:18px;">{daily_html}</div>
+
+      <h2 style="color:#0b66ff;font-size:20px;margin-bottom:6px">💡 Study Tips</h2>
+      <div style="padding:14px;border-left:6px solid #f59e0b;background:#fff8e6;border-radius:10px;margin-bottom:6px;">{tips_html}</div>
+    </div>
+    """
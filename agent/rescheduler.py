@@ -0,0 +1,119 @@
+"""
+rescheduler.py — incremental re-planning after progress updates.
+Instead of rebuilding a timetable, reassigns only as many future, unlocked
+blocks as needed so each subject's future hours track its remaining hours,
+and returns the minimal change set.
+"""
+from datetime import date, datetime
+
+from agent.utils import week_days
+
+def _as_date(value):
+    if value is None:
+        return date.today()
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+def remaining_hours(planned, progress):
+    """Planned hours minus completed hours per subject (never negative)."""
+    return {s: max(0.0, float(h) - float(progress.get(s, 0.0))) for s, h in planned.items()}
+
+def remaining_diff(planned, old_progress, new_progress):
+    """{subject: change in remaining hours} for the subjects whose remaining hours changed."""
+    old = remaining_hours(planned, old_progress)
+    new = remaining_hours(planned, new_progress)
+    return {s: new[s] - old[s] for s in planned if abs(new[s] - old[s]) > 1e-9}
+
+def rebalance(blocks, remaining, mutable):
+    """
+    Reassign subjects of mutable blocks so each subject's share of the mutable
+    hours follows its share of `remaining` hours.
+
+    blocks: sequence of (subject, hours); mutable: indexes that may change.
+    A block only moves when that brings both the donor and the receiving
+    subject closer to their targets by more than half the block, so small
+    drifts leave the plan alone. Returns [(index, old_subject, new_subject)].
+    """
+    mutable = list(mutable)
+    capacity = sum(blocks[i][1] for i in mutable)
+    total_remaining = sum(remaining.values())
+    if capacity <= 0:
+        return []
+    if total_remaining > 0:
+        target = {s: capacity * r / total_remaining for s, r in remaining.items()}
+    else:
+        target = {s: 0.0 for s in remaining}
+    current = {s: 0.0 for s in remaining}
+    for i in mutable:
+        s = blocks[i][0]
+        if s in current:
+            current[s] += blocks[i][1]
+    subjects = {i: blocks[i][0] for i in mutable}
+
+    changes = []
+    # latest blocks move first, so the next few days stay as the student saw them
+    for i in sorted(mutable, reverse=True):
+        donor, hours = subjects[i], blocks[i][1]
+        if donor not in current or current[donor] - target[donor] <= hours / 2:
+            continue
+        receiver = max(target, key=lambda s: target[s] - current[s])
+        if receiver == donor or target[receiver] - current[receiver] <= hours / 2:
+            continue
+        current[donor] -= hours
+        current[receiver] += hours
+        subjects[i] = receiver
+        changes.append((i, donor, receiver))
+    return changes
+
+def reschedule_timetable(timetable, planned, progress, today=None, locked=()):
+    """
+    Rebalance a generate_smart_timetable DataFrame (Day, Slot, Subject, Hours) in place.
+
+    Slots on days before `today` (a date, default today) count as done, and
+    (Day, Slot) pairs in `locked` are kept, as are rows whose Subject is not in
+    `planned` (e.g. "Revise: ..." rows); every other slot may change subject.
+    Returns the list of changes as {"Day", "Slot", "from", "to", "Hours"} dicts.
+    """
+    today = _as_date(today)
+    day_index = {d: i for i, d in enumerate(week_days())}
+    locked = set(locked)
+    days = timetable["Day"].tolist()
+    slots = timetable["Slot"].tolist()
+    blocks = list(zip(timetable["Subject"].tolist(), timetable["Hours"].astype(float).tolist()))
+    # rows of other subjects ("Revise: ..." rows) have no target, so they stay out of the capacity
+    mutable = [i for i, (d, sl) in enumerate(zip(days, slots))
+               if day_index.get(d, 0) >= today.weekday() and (d, sl) not in locked
+               and blocks[i][0] in planned]
+    changes = rebalance(blocks, remaining_hours(planned, progress), mutable)
+    col = timetable.columns.get_loc("Subject")
+    out = []
+    for i, old, new in changes:
+        timetable.iat[i, col] = new
+        out.append({"Day": days[i], "Slot": slots[i], "from": old, "to": new, "Hours": blocks[i][1]})
+    return out
+
+def reschedule_plan(schedule, planned, progress, today=None, locked=()):
+    """
+    Same for a PlannerTool schedule ({iso_date: [block, ...]}), in place.
+    Days before `today` are done; `locked` holds (iso_date, start) pairs, and
+    blocks of subjects not in `planned` are kept.
+    Returns changes as {"date", "start", "end", "from", "to", "hours"} dicts.
+    """
+    today = _as_date(today).isoformat()
+    locked = set(locked)
+    refs, blocks, mutable = [], [], []
+    for day in sorted(schedule):
+        for b in schedule[day]:
+            if day >= today and (day, b["start"]) not in locked and b["subject"] in planned:
+                mutable.append(len(blocks))
+            refs.append((day, b))
+            blocks.append((b["subject"], b["hours"]))
+    out = []
+    for i, old, new in rebalance(blocks, remaining_hours(planned, progress), mutable):
+        day, b = refs[i]
+        b["subject"] = new
+        out.append({"date": day, "start": b["start"], "end": b["end"], "from": old, "to": new, "hours": b["hours"]})
+    return out
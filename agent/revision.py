@@ -0,0 +1,188 @@
+"""
+revision.py — SM-2 spaced-repetition scheduler for weak topics, with a heap-ordered
+due queue, and helpers that add revision blocks to timetables and PlannerTool schedules
+"""
+import heapq
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from agent.tools import DEFAULT_AVAILABILITY, SLOT_MINUTES, first_fit, slot_time, to_slot, window_mask
+from agent.utils import week_days
+
+REVISION_SLOT = "Revision"
+MIN_EASINESS = 1.3
+
+@dataclass
+class TopicState:
+    topic: str
+    subject: str = ""
+    easiness: float = 2.5
+    interval: int = 0       # days
+    repetitions: int = 0
+    lapses: int = 0
+    due: int = 0            # date ordinal
+    version: int = 0        # bumped on every change; older heap entries are stale
+
+def sm2(state, quality):
+    """Apply one SM-2 review graded 0-5 (>= 3 is a successful recall) to `state`."""
+    quality = max(0, min(5, int(quality)))
+    if quality < 3:
+        state.repetitions = 0
+        state.interval = 1
+        state.lapses += 1
+    else:
+        state.repetitions += 1
+        if state.repetitions == 1:
+            state.interval = 1
+        elif state.repetitions == 2:
+            state.interval = 6
+        else:
+            state.interval = round(state.interval * state.easiness)
+    state.easiness = max(MIN_EASINESS, state.easiness + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+class RevisionScheduler:
+    """
+    Per-student SM-2 state for any number of topics.
+
+    Topics sit in a min-heap keyed on due date. Updates push a fresh entry and
+    leave the old one behind as stale (lazy deletion), so adding, reviewing and
+    taking the next N due topics cost O(log n) each; nothing rescans the topics.
+    """
+    def __init__(self):
+        self.topics = {}
+        self._heap = []     # (due, seq, topic, version)
+        self._seq = 0
+
+    def __len__(self):
+        return len(self.topics)
+
+    def _push(self, st):
+        st.version += 1
+        self._seq += 1
+        heapq.heappush(self._heap, (st.due, self._seq, st.topic, st.version))
+        # drop stale entries once they dominate the heap
+        if len(self._heap) > 2 * len(self.topics) + 64:
+            self._heap = [(s.due, i, s.topic, s.version) for i, s in enumerate(self.topics.values())]
+            heapq.heapify(self._heap)
+
+    def _valid(self, entry):
+        st = self.topics.get(entry[2])
+        return st is not None and st.version == entry[3]
+
+    def add(self, topic, subject="", today=None):
+        """Track a weak topic (due immediately); re-adding an existing topic keeps its history."""
+        if topic in self.topics:
+            return self.topics[topic]
+        st = TopicState(topic, subject, due=(today or date.today()).toordinal())
+        self.topics[topic] = st
+        self._push(st)
+        return st
+
+    def remove(self, topic):
+        self.topics.pop(topic, None)
+
+    def review(self, topic, quality, today=None):
+        """Record a review graded 0-5 and reschedule the topic."""
+        st = self.topics[topic]
+        sm2(st, quality)
+        st.due = (today or date.today()).toordinal() + st.interval
+        self._push(st)
+        return st
+
+    def due(self, today=None, n=10):
+        """Up to `n` topics due on or before `today`, most overdue first."""
+        taken = []
+        picked = self._take((today or date.today()).toordinal(), n, taken)
+        for entry in taken:
+            heapq.heappush(self._heap, entry)
+        return picked
+
+    def _take(self, day, n, taken):
+        picked = []
+        while self._heap and len(picked) < n and self._heap[0][0] <= day:
+            entry = heapq.heappop(self._heap)
+            if self._valid(entry):
+                picked.append(self.topics[entry[2]])
+                taken.append(entry)
+        return picked
+
+    def plan(self, start=None, days=7, per_day=3):
+        """
+        {date: [TopicState]} for the next `days` days, at most `per_day` topics a
+        day. A topic not yet reviewed stays due, so overdue work carries forward
+        instead of piling onto one day; each topic appears once.
+        """
+        start = start or date.today()
+        taken, out = [], {}
+        try:
+            for k in range(days):
+                day = start + timedelta(days=k)
+                picked = self._take(day.toordinal(), per_day, taken)
+                if picked:
+                    out[day] = picked
+        finally:
+            for entry in taken:
+                heapq.heappush(self._heap, entry)
+        return out
+
+    def to_dict(self):
+        return {t: vars(s) for t, s in self.topics.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        sched = cls()
+        for t, fields in data.items():
+            st = TopicState(**{**fields, "version": 0})
+            sched.topics[t] = st
+            sched._push(st)
+        return sched
+
+def _label(states):
+    return "Revise: " + ", ".join(s.topic for s in states)
+
+def add_revision_rows(timetable, plan, minutes_per_topic=20, start=None):
+    """
+    Append one "Revision" row per day to a generate_smart_timetable DataFrame.
+    `plan` is RevisionScheduler.plan(); weekday names map to the next 7 days from `start`.
+    """
+    import pandas as pd
+    start = start or date.today()
+    rows = []
+    for d in week_days():
+        day = start + timedelta(days=(week_days().index(d) - start.weekday()) % 7)
+        states = plan.get(day)
+        if states:
+            rows.append([d, REVISION_SLOT, _label(states), round(len(states) * minutes_per_topic / 60, 2)])
+    if not rows:
+        return timetable
+    return pd.concat([timetable, pd.DataFrame(rows, columns=["Day", "Slot", "Subject", "Hours"])],
+                     ignore_index=True)
+
+def add_revision_blocks(schedule, plan, minutes_per_topic=20, availability=None):
+    """
+    Add a revision block to each planned day of a PlannerTool schedule, placed
+    first-fit in that day's free availability (in place; returns `schedule`).
+    """
+    availability = availability or {}
+    days = week_days()
+    for day, states in plan.items():
+        iso, weekday = day.isoformat(), days[day.weekday()]
+        blocks = schedule.setdefault(iso, [])
+        free = window_mask(availability.get(weekday, DEFAULT_AVAILABILITY))
+        for b in blocks:
+            a, e = to_slot(b["start"]), to_slot(b["end"])
+            free &= ~(((1 << (e - a)) - 1) << a)
+        n = max(1, -(-len(states) * minutes_per_topic // SLOT_MINUTES))
+        while n > 0:
+            pos = first_fit(free, n)
+            if pos >= 0:
+                break
+            n -= 1
+        if pos < 0:
+            continue  # no free time that day
+        fit = states[:max(1, n * SLOT_MINUTES // minutes_per_topic)]
+        blocks.append({"subject": _label(fit), "hours": n * SLOT_MINUTES / 60,
+                       "start": slot_time(pos), "end": slot_time(pos + n),
+                       "day": weekday, "revision": [s.topic for s in fit]})
+        blocks.sort(key=lambda b: b["start"])
+    return schedule
@@ -0,0 +1,256 @@
+"""
+router.py — per-request model routing against a p95 latency SLO and a per-user
+cost budget, with per-call timeouts and fallback to the cheapest model
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from agent.chat_context import count_tokens
+from agent.utils import percentile
+
+@dataclass
+class ModelSpec:
+    name: str
+    input_cost: float           # USD per 1M prompt tokens
+    output_cost: float          # USD per 1M completion tokens
+    rank: int = 0               # higher is more capable; auto routing tries the highest first
+
+DEFAULT_MODELS = [
+    ModelSpec("gpt-4o", 2.50, 10.00, rank=1),
+    ModelSpec("gpt-4o-mini", 0.15, 0.60, rank=0),
+]
+
+@dataclass
+class Decision:
+    model: str
+    reason: str
+    user_id: str = ""
+    requested: str = None       # preferred model, None when routed automatically
+    streamed: bool = False
+    fallback_from: str = None   # model that timed out, if the call fell back
+    over_budget: bool = False   # the user's budget cannot cover even the cheapest model
+    ts: float = field(default_factory=time.time)
+
+class BudgetExceeded(RuntimeError):
+    """Raised by ModelRouter.complete / stream for a user whose budget is used up."""
+
+def prompt_tokens(messages):
+    # ~4 tokens of per-message framing, as in the chat format
+    return sum(count_tokens(m.get("content", "")) + 4 for m in messages)
+
+class ModelRouter:
+    """
+    Picks a model for each request and keeps rolling per-model stats.
+
+    Candidates are the preferred model or, when routing automatically, every
+    model from most to least capable. The first candidate whose rolling p95
+    latency (time to first token for streams, total time otherwise) is within
+    `p95_slo` seconds, whose error rate is at most `max_error_rate`, and whose
+    estimated cost fits the user's remaining `user_budget` (USD per
+    `budget_window` seconds) is used; otherwise the cheapest model. The budget
+    is a hard limit: when even the cheapest model does not fit, the decision
+    is marked over budget and complete / stream refuse it with BudgetExceeded
+    until older spend leaves the window (a cache hit still costs nothing).
+    Latency and error stats only count once a model has `min_samples` calls in
+    the last `window` seconds, so an avoided model is tried again once its bad
+    samples age out. Only decisions that reach a model are kept in `decisions`.
+
+    Each call passes `timeout` (`ttft_timeout` for a stream's tokens) to the
+    backend, which abandons the request itself when it expires. A timed-out
+    call is recorded as an error and retried once on the cheapest model.
+    Token counts are estimated from the prompt and reply text.
+    """
+    def __init__(self, models=None, p95_slo=20.0, user_budget=0.50, budget_window=86400.0,
+                 timeout=60.0, ttft_timeout=15.0, window=600.0, min_samples=5, max_error_rate=0.5,
+                 expected_completion_tokens=1200, history=50):
+        self.models = {m.name: m for m in (models or DEFAULT_MODELS)}
+        self.cheapest = min(self.models.values(), key=lambda m: (m.output_cost, m.input_cost))
+        self.p95_slo = p95_slo
+        self.user_budget = user_budget
+        self.budget_window = budget_window
+        self.timeout = timeout
+        self.ttft_timeout = ttft_timeout
+        self.window = window
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.expected_completion_tokens = expected_completion_tokens
+        self.decisions = deque(maxlen=history)
+        self._calls = {name: deque(maxlen=1000) for name in self.models}  # (ts, ttft, total, in, out, cost, error)
+        self._spend = {}            # user_id -> deque of (ts, cost)
+        self._lock = threading.Lock()
+
+    # ---- stats ----
+    def _recent(self, model, now):
+        calls = self._calls[model]
+        while calls and now - calls[0][0] > self.window:
+            calls.popleft()
+        return calls
+
+    def _spent(self, user_id, now):
+        spend = self._spend.get(user_id)
+        if not spend:
+            return 0.0
+        while spend and now - spend[0][0] > self.budget_window:
+            spend.popleft()
+        return sum(c for _, c in spend)
+
+    def cost(self, model, prompt, completion):
+        spec = self.models[model]
+        return (prompt * spec.input_cost + completion * spec.output_cost) / 1e6
+
+    def _record(self, model, user_id, ttft, total, prompt, completion, error):
+        now = time.time()
+        cost = self.cost(model, prompt, completion)
+        with self._lock:
+            self._calls[model].append((now, ttft, total, prompt, completion, cost, error))
+            if cost:
+                self._spend.setdefault(user_id, deque()).append((now, cost))
+
+    def _health(self, model, now, streamed):
+        calls = self._recent(model, now)
+        latencies = sorted(c[1] if streamed else c[2] for c in calls if not c[6])
+        errors = sum(1 for c in calls if c[6])
+        completions = [c[4] for c in calls if not c[6]]
+        expected = sum(completions) / len(completions) if completions else self.expected_completion_tokens
+        return len(calls), percentile(latencies, 95), errors / len(calls) if calls else 0.0, expected
+
+    def spent(self, user_id):
+        with self._lock:
+            return self._spent(user_id, time.time())
+
+    def snapshot(self):
+        """Per-model rolling stats for display."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for name in self.models:
+                calls = list(self._recent(name, now))
+                ok = [c for c in calls if not c[6]]
+                ttft = sorted(c[1] for c in ok)
+                total = sorted(c[2] for c in ok)
+                rows.append({"model": name, "calls": len(calls),
+                             "error_rate": round(1 - len(ok) / len(calls), 3) if calls else 0.0,
+                             "p50_ttft_s": round(percentile(ttft, 50), 3), "p95_ttft_s": round(percentile(ttft, 95), 3),
+                             "p95_total_s": round(percentile(total, 95), 3),
+                             "tokens": sum(c[3] + c[4] for c in calls),
+                             "cost_usd": round(sum(c[5] for c in calls), 4)})
+        return rows
+
+    # ---- routing ----
+    def choose(self, user_id, messages, preferred=None, streamed=False):
+        """Decision for one request; `preferred` of None (or "auto") routes automatically."""
+        preferred = None if preferred in (None, "auto", "Auto") else preferred
+        if preferred is not None and preferred not in self.models:
+            raise ValueError(f"unknown model {preferred!r}")
+        tokens = prompt_tokens(messages)
+        now = time.time()
+        if preferred:
+            candidates = [self.models[preferred]]
+        else:
+            candidates = sorted(self.models.values(), key=lambda m: -m.rank)
+        rejected = []
+        over_budget = False
+        with self._lock:
+            remaining = self.user_budget - self._spent(user_id, now) if self.user_budget is not None else None
+            for spec in candidates:
+                n, p95, error_rate, expected = self._health(spec.name, now, streamed)
+                estimate = self.cost(spec.name, tokens, expected)
+                if n >= self.min_samples and p95 > self.p95_slo:
+                    rejected.append(f"{spec.name} p95 {p95:.1f}s over the {self.p95_slo:g}s SLO")
+                elif n >= self.min_samples and error_rate > self.max_error_rate:
+                    rejected.append(f"{spec.name} error rate {error_rate:.0%}")
+                elif remaining is not None and estimate > remaining:
+                    rejected.append(f"{spec.name} est. ${estimate:.4f} over the ${max(0.0, remaining):.4f} budget left")
+                else:
+                    chosen = spec
+                    break
+            else:
+                chosen = self.cheapest
+                _, _, _, expected = self._health(chosen.name, now, streamed)
+                over_budget = remaining is not None and self.cost(chosen.name, tokens, expected) > remaining
+        mode = "requested" if preferred else "auto"
+        if over_budget:
+            reason = (f"{mode}: ${self.user_budget - remaining:.4f} of the ${self.user_budget:.2f} budget spent, "
+                      f"not enough for {chosen.name}; refused")
+        elif chosen.name == (preferred or candidates[0].name):
+            reason = f"{mode}: {chosen.name}"
+        else:
+            reason = f"{mode}: {'; '.join(rejected)} → {chosen.name}"
+        if remaining is not None and not over_budget:
+            reason += f" (${max(0.0, remaining):.4f} budget left)"
+        return Decision(chosen.name, reason, user_id, preferred, streamed, over_budget=over_budget)
+
+    def _admit(self, decision):
+        # called once the request is really going to a model, so cache hits leave no trace
+        if decision.over_budget:
+            raise BudgetExceeded(f"model budget of ${self.user_budget:.2f} used up ({decision.reason})")
+        self.decisions.append(decision)
+
+    def _fall_back(self, decision, limit):
+        if decision.model == self.cheapest.name:
+            raise TimeoutError(f"{decision.model} did not respond within {limit:g}s")
+        decision.fallback_from, decision.model = decision.model, self.cheapest.name
+        decision.reason += f"; {decision.fallback_from} timed out after {limit:g}s → {decision.model}"
+
+    def complete(self, backend, decision, messages, temperature, response_format=None):
+        """Run the completion for `decision` on `backend` (an LLMBackend); returns the content."""
+        self._admit(decision)
+        tokens = prompt_tokens(messages)
+        while True:
+            start = time.monotonic()
+            try:
+                content, _ = backend.complete(decision.model, messages, temperature, response_format,
+                                              timeout=self.timeout)
+            except TimeoutError:
+                elapsed = time.monotonic() - start
+                self._record(decision.model, decision.user_id, elapsed, elapsed, tokens, 0, True)
+                self._fall_back(decision, self.timeout)
+                continue
+            except Exception:
+                elapsed = time.monotonic() - start
+                self._record(decision.model, decision.user_id, elapsed, elapsed, tokens, 0, True)
+                raise
+            elapsed = time.monotonic() - start
+            self._record(decision.model, decision.user_id, elapsed, elapsed, tokens, count_tokens(content or ""), False)
+            return content
+
+    def stream(self, backend, decision, messages, temperature):
+        """Open a stream for `decision` and return a generator of deltas; stats are recorded when it ends."""
+        self._admit(decision)
+        tokens = prompt_tokens(messages)
+        while True:
+            start = time.monotonic()
+            try:
+                deltas = backend.stream(decision.model, messages, temperature, timeout=self.ttft_timeout)
+                first = next(deltas, None)
+            except TimeoutError:
+                # the backend has already dropped the request
+                elapsed = time.monotonic() - start
+                self._record(decision.model, decision.user_id, elapsed, elapsed, tokens, 0, True)
+                self._fall_back(decision, self.ttft_timeout)
+                continue
+            except Exception:
+                elapsed = time.monotonic() - start
+                self._record(decision.model, decision.user_id, elapsed, elapsed, tokens, 0, True)
+                raise
+            return self._tail(decision, deltas, first, start, time.monotonic() - start, tokens)
+
+    def _tail(self, decision, deltas, first, start, ttft, tokens):
+        parts = []
+        error = True
+        try:
+            if first is not None:
+                parts.append(first)
+                yield first
+            for d in deltas:
+                parts.append(d)
+                yield d
+            error = False
+        except GeneratorExit:
+            error = False  # the caller stopped reading
+            raise
+        finally:
+            self._record(decision.model, decision.user_id, ttft, time.monotonic() - start, tokens,
+                         count_tokens("".join(parts)), error)
@@ -0,0 +1,90 @@
+"""
+timetable.py — smart weekly timetable (7 days x 3 slots) for one student,
+and a vectorized NumPy version that builds timetables for a whole cohort at once
+"""
+import numpy as np
+import pandas as pd
+from agent.revision import REVISION_SLOT
+from agent.utils import week_days
+
+SLOTS = ["Morning (9-12)","Afternoon (1-4)","Evening (6-8)"]
+# wall-clock window of each slot, for calendar export
+SLOT_TIMES = {SLOTS[0]: ("09:00", "12:00"), SLOTS[1]: ("13:00", "16:00"), SLOTS[2]: ("18:00", "20:00"),
+              REVISION_SLOT: ("20:00", "21:00")}
+
+def generate_smart_timetable(subjects, weekly_hours, deadline, intensity, progress):
+    days = week_days()
+    if not subjects:
+        subjects = ["General"]
+    weights = {s: 1 + progress.get(s, 0)*0.1 for s in subjects}
+    total_weight = sum(weights.values()) or 1
+    subject_hours = {s: round((weights[s]/total_weight) * weekly_hours, 2) for s in subjects}
+    timetable = []
+    subject_cycle = list(subjects) * 10
+    idx = 0
+    for d in days:
+        for sl in SLOTS:
+            sb = subject_cycle[idx % len(subject_cycle)]
+            hrs = round(subject_hours.get(sb, 0)/3 if sb in subject_hours else round(weekly_hours/21,2), 2)
+            timetable.append([d, sl, sb, hrs])
+            idx += 1
+    df = pd.DataFrame(timetable, columns=["Day","Slot","Subject","Hours"])
+    pivot = df.pivot(index="Slot", columns="Day", values="Subject")
+    summary = "Weekly spaced revision recommended."
+    return df, pivot, subject_hours, summary
+
+def generate_cohort_timetables(profiles):
+    """
+    Timetables for N students in one pass, matching generate_smart_timetable per student.
+
+    profiles: sequence of dicts with subjects (list), weekly_hours (number) and
+    optional progress (dict subject -> completed hours).
+    Returns (timetable, subject_hours): a long DataFrame with columns
+    Student, Day, Slot, Subject, Hours (21 contiguous rows per student, Student
+    is the profile's position) and a long DataFrame of Student, Subject, Hours.
+    """
+    profiles = list(profiles)
+    n = len(profiles)
+    n_slots = len(SLOTS) * 7
+    subject_lists = [p.get("subjects") or ["General"] for p in profiles]
+    lens = np.fromiter((len(s) for s in subject_lists), dtype=np.int64, count=n)
+    width = int(lens.max()) if n else 1
+    weekly = np.fromiter((p.get("weekly_hours", 0) for p in profiles), dtype=np.float64, count=n)
+
+    # scatter the ragged subject lists into padded (n, width) arrays
+    rows = np.repeat(np.arange(n), lens)
+    cols = np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens)
+    names = np.full((n, width), "", dtype=object)
+    names[rows, cols] = np.array([s for subs in subject_lists for s in subs], dtype=object)
+    progress = np.zeros((n, width))
+    progress[rows, cols] = [
+        (p.get("progress") or {}).get(s, 0) for p, subs in zip(profiles, subject_lists) for s in subs
+    ]
+
+    mask = np.arange(width)[None, :] < lens[:, None]
+    weights = np.where(mask, 1 + progress * 0.1, 0.0)
+    total = weights.sum(axis=1, keepdims=True)
+    total[total == 0] = 1
+    hours = np.round(weights / total * weekly[:, None], 2)
+
+    # slot k of every student cycles through that student's subjects
+    subject_idx = np.arange(n_slots)[None, :] % lens[:, None]
+    slot_subjects = np.take_along_axis(names, subject_idx, axis=1)
+    slot_hours = np.round(np.take_along_axis(hours, subject_idx, axis=1) / 3, 2)
+
+    day_codes = np.repeat(np.arange(7), len(SLOTS))
+    slot_codes = np.tile(np.arange(len(SLOTS)), 7)
+    timetable = pd.DataFrame({
+        "Student": np.repeat(np.arange(n), n_slots),
+        "Day": pd.Categorical.from_codes(np.tile(day_codes, n), week_days()),
+        "Slot": pd.Categorical.from_codes(np.tile(slot_codes, n), SLOTS),
+        "Subject": slot_subjects.ravel(),
+        "Hours": slot_hours.ravel(),
+    })
+    subject_hours = pd.DataFrame({"Student": rows, "Subject": names[mask], "Hours": hours[mask]})
+    return timetable, subject_hours
+
+def student_view(timetable, i):
+    """Rows of student `i` from a cohort timetable (no copy, no groupby)."""
+    n_slots = len(SLOTS) * 7
+    return timetable.iloc[i * n_slots:(i + 1) * n_slots]
@@ -2,9 +2,47 @@
 tools.py — Planner tool and helpers
 """
 from dateutil import parser
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from agent.utils import week_days
-import math
+
+SLOT_MINUTES = 30
+MAX_BLOCK_SLOTS = 4                 # blocks are at most 2 hours
+DEFAULT_HORIZON_DAYS = 7            # used when no future deadline is given
+URGENCY_BOOST = 7.0                 # a deadline one day away weighs (1 + 7)x, one week away 2x
+DEFAULT_AVAILABILITY = [("09:00", "12:00"), ("13:00", "17:00"), ("18:00", "21:00")]
+
+def to_slot(hhmm):
+    h, m = (int(x) for x in hhmm.split(":"))
+    return (h * 60 + m) // SLOT_MINUTES
+
+def slot_time(slot):
+    minutes = slot * SLOT_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def window_mask(windows):
+    """Bitmap of free slots (bit i = slot i of the day) for a list of (start, end) windows."""
+    mask = 0
+    for start, end in windows:
+        a, b = to_slot(start), to_slot(end)
+        if b > a:
+            mask |= ((1 << (b - a)) - 1) << a
+    return mask
+
+def first_fit(free, n):
+    """Lowest slot index starting a run of `n` free slots in bitmap `free`, or -1."""
+    run = free
+    for i in range(1, n):
+        run &= free >> i
+    if not run:
+        return -1
+    return (run & -run).bit_length() - 1
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return parser.parse(str(value)).date()
 
 class PlannerTool:
     def __init__(self, logger=None, memory=None):
@@ -12,8 +50,22 @@ class PlannerTool:
         self.memory = memory
 
     def create_schedule(self, profile):
-        # profile keys: subjects (list), weekly_hours (int), priority (dict), deadlines (dict)
+        """
+        Plan every day from `start_date` (default today) until the latest deadline.
+
+        profile keys: subjects (list), weekly_hours (number), priority (dict),
+        deadlines (dict subject -> date), optional availability (dict weekday ->
+        list of ("HH:MM", "HH:MM") windows) and start_date.
+
+        Each day's hours are split across subjects whose deadline has not passed,
+        in proportion to priority * (1 + URGENCY_BOOST / days_left). Fractions
+        carry over to later days, and blocks are placed first-fit into a 30-minute
+        occupancy bitmap per day so they never overlap.
+        Returns {iso_date: [{"subject", "hours", "start", "end", "day"}, ...]}.
+        """
         subjects = profile.get("subjects", [])
+        if not subjects:
+            return {}
         total_hours = profile.get("weekly_hours", 10)
         priority = profile.get("priority", {})
         # Normalize priority
@@ -21,23 +73,96 @@ class PlannerTool:
         s = sum(pvals) if sum(pvals)>0 else len(subjects)
         weights = [pv/s for pv in pvals]
 
-        # Distribute hours across 7 days
-        hours_per_subject = {subjects[i]: max(0.5, round(weights[i]*total_hours,1)) for i in range(len(subjects))}
+        start_date = _to_date(profile.get("start_date") or datetime.now())
+        # deadlines already in the past are ignored rather than dropping the subject
+        deadlines = {}
+        for subj, dl in (profile.get("deadlines") or {}).items():
+            d = _to_date(dl)
+            if subj in subjects and d >= start_date:
+                deadlines[subj] = d
+        end_date = max(deadlines.values(), default=start_date + timedelta(days=DEFAULT_HORIZON_DAYS - 1))
+
+        availability = profile.get("availability") or {}
+        days = week_days()
+        day_masks = {d: window_mask(availability.get(d, DEFAULT_AVAILABILITY)) for d in days}
+        daily_slots = total_hours / 7 * 60 / SLOT_MINUTES
+
+        credit = [0.0] * len(subjects)
         schedule = {}
-        start_date = datetime.utcnow()
-        for d in week_days():
-            day_blocks = []
-            for subj, hrs in hours_per_subject.items():
-                # split into 1-2 hour blocks
-                blocks = int(max(1, round(hrs/1.5)))
-                for bi in range(blocks):
-                    start = (start_date + timedelta(days=0)).replace(hour=9+bi%8, minute=0)
-                    end = start + timedelta(hours=min(2, hrs))
-                    day_blocks.append({"subject": subj, "hours": round(hrs/blocks,2), "start": start.strftime("%H:%M"), "end": end.strftime("%H:%M")})
-            schedule[d] = day_blocks
+        day = start_date
+        while day <= end_date:
+            weekday = days[day.weekday()]
+            urgency = []
+            for i, subj in enumerate(subjects):
+                dl = deadlines.get(subj)
+                if dl is not None and dl < day:
+                    urgency.append(0.0)
+                elif dl is not None:
+                    urgency.append(weights[i] * (1 + URGENCY_BOOST / ((dl - day).days + 1)))
+                else:
+                    urgency.append(weights[i])
+            total_u = sum(urgency)
+            if total_u > 0:
+                alloc = self._allocate(urgency, total_u, daily_slots, credit)
+                schedule[day.isoformat()] = self._place(subjects, alloc, credit, day_masks[weekday], weekday)
+            day += timedelta(days=1)
+
         # Save to memory if provided
         if self.memory:
             self.memory.add(profile.get("name","anon"), {"schedule": schedule})
             if self.logger:
                 self.logger.info("Schedule saved to MemoryBank")
         return schedule
+
+    @staticmethod
+    def _allocate(urgency, total_u, daily_slots, credit):
+        """
+        Largest-remainder split of today's slots; unspent fractions stay in `credit`.
+        Today gets the whole slots of the running target not yet placed, so the
+        days of a week add up to its hours instead of rounding each day alone.
+        """
+        for i, u in enumerate(urgency):
+            if u > 0:
+                credit[i] += daily_slots * u / total_u
+        alloc = [int(c) if u > 0 else 0 for c, u in zip(credit, urgency)]
+        # the 1e-9 absorbs float error in the running sum of fractional slots
+        today = int(sum(c for c, u in zip(credit, urgency) if u > 0) + 1e-9)
+        spare = today - sum(alloc)
+        if spare > 0:
+            order = sorted((i for i, u in enumerate(urgency) if u > 0),
+                           key=lambda i: credit[i] - alloc[i], reverse=True)
+            for i in order[:spare]:
+                alloc[i] += 1
+        return alloc
+
+    @staticmethod
+    def _place(subjects, alloc, credit, free, weekday):
+        """Place blocks round-robin (most slots first) into the day's free bitmap."""
+        blocks = []
+        pending = sorted((i for i, n in enumerate(alloc) if n > 0), key=lambda i: -alloc[i])
+        left = list(alloc)
+        while pending:
+            still = []
+            for i in pending:
+                n = min(MAX_BLOCK_SLOTS, left[i])
+                pos = -1
+                while n > 0:
+                    pos = first_fit(free, n)
+                    if pos >= 0:
+                        break
+                    n -= 1
+                if pos < 0:
+                    continue  # day is full; leftover stays as credit for later days
+                free &= ~(((1 << n) - 1) << pos)
+                left[i] -= n
+                credit[i] -= n
+                blocks.append((pos, n, i))
+                if left[i] > 0:
+                    still.append(i)
+            pending = still
+        blocks.sort()
+        return [
+            {"subject": subjects[i], "hours": n * SLOT_MINUTES / 60,
+             "start": slot_time(pos), "end": slot_time(pos + n), "day": weekday}
+            for pos, n, i in blocks
+        ]
@@ -0,0 +1,228 @@
+"""
+trends.py — columnar store of planned vs completed study hours across every
+saved plan and day, with vectorized weekly, completion-rate and streak rollups
+"""
+import threading
+from datetime import date, datetime
+
+import numpy as np
+
+def day_ordinal(value):
+    """Date ordinal of a date, datetime or ISO string (None is today)."""
+    if value is None:
+        return date.today().toordinal()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10]).toordinal()
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    return value.toordinal()
+
+class _Columns:
+    """Growable NumPy columns; appends are amortized O(1)."""
+    def __init__(self, **dtypes):
+        self.n = 0
+        self._data = {k: np.empty(16, dt) for k, dt in dtypes.items()}
+
+    def _reserve(self, n):
+        size = len(next(iter(self._data.values())))
+        if n > size:
+            size = max(n, size * 2)
+            for k, arr in self._data.items():
+                grown = np.empty(size, arr.dtype)
+                grown[:self.n] = arr[:self.n]
+                self._data[k] = grown
+
+    def extend(self, **values):
+        count = len(next(iter(values.values())))
+        self._reserve(self.n + count)
+        for k, v in values.items():
+            self._data[k][self.n:self.n + count] = v
+        self.n += count
+
+    def __getitem__(self, key):
+        return self._data[key][:self.n]
+
+class TrendStore:
+    """
+    Planned and completed hours of one student, across plans and days.
+
+    A plan contributes its weekly hours per subject, spread evenly over the days
+    from when it was generated until the next plan replaces it. Progress entries
+    are completed-hour deltas per subject and day. Both are kept as NumPy
+    columns; completed hours per day and per subject are also kept as running
+    totals updated on every append, so adding a plan or progress entry is O(1)
+    amortized and every rollup is one vectorized pass over days, never a
+    Python loop over entries. `version` changes on every write and can key caches.
+    """
+    def __init__(self):
+        self.version = 0
+        self.subjects = []          # subject code -> name
+        self._codes = {}
+        self._lock = threading.Lock()
+        self._plan_day = _Columns(day=np.int64)                               # one row per plan
+        self._plan_hours = _Columns(plan=np.int64, subject=np.int32, hours=np.float64)
+        self._progress = _Columns(day=np.int64, subject=np.int32, hours=np.float64)
+        self._order = None          # plan indexes sorted by day (rebuilt after out-of-order adds)
+        self._origin = None         # ordinal of _done_daily[0]
+        self._last = None           # latest day with progress
+        self._done_daily = np.zeros(0)
+        self._done_by_subject = np.zeros(0)
+
+    def _code(self, subject):
+        code = self._codes.get(subject)
+        if code is None:
+            code = self._codes[subject] = len(self.subjects)
+            self.subjects.append(subject)
+            self._done_by_subject = np.append(self._done_by_subject, 0.0)
+        return code
+
+    # ---- writes ----
+    def add_plan(self, when, subject_hours):
+        """Record a plan generated on `when` with {subject: weekly hours}."""
+        day = day_ordinal(when)
+        with self._lock:
+            plan = self._plan_day.n
+            days = self._plan_day["day"]
+            if self._order is not None and (not plan or day >= days[self._order[-1]]):
+                self._order = np.append(self._order, plan)
+            else:
+                self._order = None
+            self._plan_day.extend(day=[day])
+            if subject_hours:
+                self._plan_hours.extend(plan=np.full(len(subject_hours), plan),
+                                        subject=[self._code(s) for s in subject_hours],
+                                        hours=[float(h) for h in subject_hours.values()])
+            self.version += 1
+
+    def add_progress(self, when, subject, hours):
+        """Record `hours` completed (negative to correct an entry) for `subject` on `when`."""
+        self.add_progress_many([day_ordinal(when)], [subject], [hours])
+
+    def add_progress_many(self, days, subjects, hours):
+        if not len(days):
+            return
+        with self._lock:
+            days = np.asarray(days, np.int64)
+            codes = np.array([self._code(s) for s in subjects], np.int32)
+            hours = np.asarray(hours, np.float64)
+            self._progress.extend(day=days, subject=codes, hours=hours)
+            lo, hi = int(days.min()), int(days.max())
+            if self._origin is None:
+                self._origin = self._last = lo
+            self._last = max(self._last, hi)
+            if lo < self._origin:
+                self._done_daily = np.concatenate([np.zeros(self._origin - lo), self._done_daily])
+                self._origin = lo
+            if hi - self._origin >= len(self._done_daily):
+                need = hi - self._origin + 1
+                self._done_daily = np.concatenate([self._done_daily,
+                                                   np.zeros(max(need, 2 * len(self._done_daily)) - len(self._done_daily))])
+            np.add.at(self._done_daily, days - self._origin, hours)
+            np.add.at(self._done_by_subject, codes, hours)
+            self.version += 1
+
+    def clear_plans(self):
+        with self._lock:
+            self._plan_day = _Columns(day=np.int64)
+            self._plan_hours = _Columns(plan=np.int64, subject=np.int32, hours=np.float64)
+            self._order = None
+            self.version += 1
+
+    # ---- rollups ----
+    def _plan_order(self):
+        if self._order is None:
+            self._order = np.argsort(self._plan_day["day"], kind="stable")
+        return self._order
+
+    def _daily(self, today):
+        """(days, planned per day, completed per day, active plan per day or -1)."""
+        plan_days = self._plan_day["day"]
+        starts = []
+        if len(plan_days):
+            starts.append(int(plan_days.min()))
+        if self._origin is not None:
+            starts.append(self._origin)
+        if not starts:
+            return np.zeros(0, np.int64), np.zeros(0), np.zeros(0), np.zeros(0, np.int64)
+        end = max(today, self._last) if self._last is not None else today
+        days = np.arange(min(starts), end + 1)
+
+        active = np.full(len(days), -1)
+        planned = np.zeros(len(days))
+        if len(plan_days):
+            order = self._plan_order()
+            pos = np.searchsorted(plan_days[order], days, side="right") - 1
+            active = np.where(pos >= 0, order[np.clip(pos, 0, None)], -1)
+            totals = np.bincount(self._plan_hours["plan"], weights=self._plan_hours["hours"],
+                                 minlength=len(plan_days))
+            planned = np.where(active >= 0, totals[np.clip(active, 0, None)] / 7.0, 0.0)
+
+        done = np.zeros(len(days))
+        if self._origin is not None:
+            at = self._origin - days[0]
+            chunk = self._done_daily[:len(days) - at]
+            done[at:at + len(chunk)] = chunk
+        return days, planned, done, active
+
+    def daily(self, today=None):
+        """DataFrame with one row per day: Date, Planned, Completed."""
+        import pandas as pd
+        with self._lock:
+            days, planned, done, _ = self._daily(day_ordinal(today))
+        return pd.DataFrame({"Date": [date.fromordinal(int(d)) for d in days],
+                             "Planned": planned.round(2), "Completed": done.round(2)})
+
+    def weekly(self, today=None, weeks=None):
+        """DataFrame with one row per week (Monday): Week, Planned, Completed, Rate."""
+        import pandas as pd
+        with self._lock:
+            days, planned, done, _ = self._daily(day_ordinal(today))
+        if not len(days):
+            return pd.DataFrame(columns=["Week", "Planned", "Completed", "Rate"])
+        mondays = days - (days - 1) % 7      # ordinal 1 (0001-01-01) is a Monday
+        week = (mondays - mondays[0]) // 7
+        planned_w = np.bincount(week, weights=planned)
+        done_w = np.bincount(week, weights=done)
+        starts = mondays[0] + 7 * np.arange(len(planned_w))
+        if weeks:
+            planned_w, done_w, starts = planned_w[-weeks:], done_w[-weeks:], starts[-weeks:]
+        rate = np.divide(done_w, planned_w, out=np.zeros_like(done_w), where=planned_w > 0)
+        return pd.DataFrame({"Week": [date.fromordinal(int(d)) for d in starts],
+                             "Planned": planned_w.round(2), "Completed": done_w.round(2),
+                             "Rate": rate.round(3)})
+
+    def by_subject(self, today=None):
+        """DataFrame per subject of planned hours to date, completed hours and Rate."""
+        import pandas as pd
+        with self._lock:
+            _, _, _, active = self._daily(day_ordinal(today))
+            days_active = np.bincount(active[active >= 0], minlength=self._plan_day.n)
+            rows = self._plan_hours
+            planned = np.bincount(rows["subject"], weights=rows["hours"] / 7.0 * days_active[rows["plan"]],
+                                  minlength=len(self.subjects)) if rows.n else np.zeros(len(self.subjects))
+            done = self._done_by_subject.copy()
+            names = list(self.subjects)
+        rate = np.divide(done, planned, out=np.zeros_like(done), where=planned > 0)
+        return pd.DataFrame({"Subject": names, "Planned": planned.round(2),
+                             "Completed": done.round(2), "Rate": rate.round(3)})
+
+    def completion_rate(self, today=None, days=None):
+        """Completed / planned hours over the last `days` days (all history when None)."""
+        with self._lock:
+            _, planned, done, _ = self._daily(day_ordinal(today))
+        if days:
+            planned, done = planned[-days:], done[-days:]
+        total = planned.sum()
+        return float(done.sum() / total) if total > 0 else 0.0
+
+    def streak(self, today=None):
+        """Consecutive days with completed hours, ending today (or yesterday if nothing is logged yet today)."""
+        today = day_ordinal(today)
+        with self._lock:
+            if self._origin is None:
+                return 0
+            studied = self._done_daily[:max(0, today - self._origin + 1)] > 1e-9
+        if len(studied) and not studied[-1]:
+            studied = studied[:-1]
+        gaps = np.flatnonzero(~studied)
+        return int(len(studied) - (gaps[-1] + 1 if len(gaps) else 0))
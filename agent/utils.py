@@ -3,3 +3,10 @@ utils.py — utility helpers
 """
 def week_days():
     return ["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday"]
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list (0 for an empty one)."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
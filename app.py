@@ -1,181 +1,390 @@
 # app.py — AI Study Planner Pro (Premium Blue Dashboard)
+# Heavy libraries (openai, pandas, plotly, numpy, reportlab) are imported inside the
+# page branches and helpers that need them, so pages like About/History never pay for them.
 import streamlit as st
 import datetime
 import time
-import io
-import re
-from textwrap import wrap
-import pandas as pd
-import plotly.express as px
-from openai import OpenAI
-
-# Optional PDF export
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfgen import canvas
-    REPORTLAB = True
-except Exception:
-    REPORTLAB = False
+import importlib.util
+import uuid
+from agent.llm_cache import LLMCache, cache_key
+from agent.render import (
+    MarkdownRenderer, pretty_split_plan, render_markdown, render_plan_card, sanitize_text,
+)
+from agent.memory import SessionStore, SQLiteMemoryBank
+from agent.history import PlanHistory, plan_hash
+from agent.chat_context import ChatContext
+from agent.pdf_export import PDFCache, pdf_key
+from agent.observability import Logger, Metrics, Profiler, Trace, append_profile, configure_logging, profiled
+from agent.prompts import plan_messages
+from agent.rescheduler import remaining_diff, reschedule_timetable
+from agent.router import BudgetExceeded
+from agent.revision import RevisionScheduler, add_revision_rows
+from agent.plan_model import PLAN_RESPONSE_FORMAT, StudyPlan, subject_hours_from_markdown
+
+# Optional PDF export (imported on first use)
+REPORTLAB = importlib.util.find_spec("reportlab") is not None
 
 # ---------------- Page config ----------------
 st.set_page_config(page_title="AI Study Planner Pro", page_icon="📘", layout="wide")
 
 # ---------------- Session init ----------------
+@st.cache_resource
+def get_history_bank():
+    # shared by every session; plan history survives restarts
+    return SQLiteMemoryBank(
+        st.secrets.get("HISTORY_DB_PATH", ".data/history.sqlite3"),
+        retention_days=st.secrets.get("HISTORY_RETENTION_DAYS", 365),
+        max_records_per_user=st.secrets.get("HISTORY_MAX_PLANS", 500),
+    )
+
+def current_user_id():
+    """
+    Owner of the plans, progress and budget of this run: the signed-in user
+    (st.login), else HISTORY_USER for single-user deployments, else this
+    browser session alone. Never taken from the URL.
+    """
+    if st.user.get("is_logged_in"):
+        return f"user:{st.user.get('email') or st.user.get('sub')}"
+    if st.secrets.get("HISTORY_USER"):
+        return st.secrets["HISTORY_USER"]
+    return f"session:{st.session_state.setdefault('anon_id', uuid.uuid4().hex)}"
+
+@st.cache_resource(max_entries=256, ttl=86400)
+def get_plan_history(user_id):
+    # one metadata index per user, shared by all of that user's sessions
+    return PlanHistory(get_history_bank(), user_id, page_size=st.secrets.get("HISTORY_PAGE_SIZE", 10))
+
+@st.cache_data(max_entries=64)
+def plan_subject_hours(plan_hash, _raw, _plan):
+    """Planned {subject: weekly hours} of a plan, parsed once per content hash (_plan is a StudyPlan or None)."""
+    return _plan.subject_hours() if _plan is not None else subject_hours_from_markdown(_raw)
+
+@st.cache_resource(max_entries=256, ttl=86400)
+def get_trend_store(user_id):
+    """Planned vs completed hours across all of a user's plans, loaded from history once per process."""
+    from agent.trends import TrendStore, day_ordinal
+    history = get_plan_history(user_id)
+    store = TrendStore()
+    for meta in reversed(history.search()):  # oldest first
+        store.add_plan(meta["time"], meta["hours"])
+    rows = get_history_bank().totals(user_id)
+    store.add_progress_many([day_ordinal(day) for day, _, _ in rows], [subject for _, subject, _ in rows],
+                            [hours for _, _, hours in rows])
+    return store
+
+def record_progress(deltas):
+    """Log {subject: change in completed hours} for today in the trend store and the history database."""
+    user_id = current_user_id()
+    today = datetime.date.today()
+    get_trend_store(user_id).add_progress_many([today.toordinal()] * len(deltas), list(deltas), list(deltas.values()))
+    # per-day totals, outside the plan records that retention compacts
+    get_history_bank().add_totals(user_id, today.isoformat(), deltas)
+
+@st.cache_resource(on_release=lambda store: store.close())
+def get_session_store():
+    # per-session state survives restarts: snapshotted to disk, restored on the session's first run
+    return SessionStore(
+        st.secrets.get("SESSION_SNAPSHOT_DIR", ".data/sessions"),
+        max_bytes=st.secrets.get("SESSION_STORE_MB", 64) * 1024 * 1024,
+        snapshot_interval=st.secrets.get("SESSION_SNAPSHOT_SECONDS", 30),
+        session_ttl=st.secrets.get("SESSION_TTL_DAYS", 7) * 86400,
+    )
+
+# session_state keys saved to the SessionStore at the end of a run that reassigned them or
+# flagged them with mark_changed
+PERSISTED_KEYS = ("last_plan_html", "last_plan_raw", "last_plan", "last_plan_hash", "chat", "chat_ctx",
+                  "timetable", "timetable_hours", "timetable_progress", "timetable_changes", "locked_slots",
+                  "progress", "weak_topics", "streak")
+
+def session_id():
+    """
+    Key of this session's saved state: the signed-in user (or HISTORY_USER),
+    whose state comes back after a reload or redeploy. None for an anonymous
+    session, whose id dies with the browser session, so its state is not
+    snapshotted. Never taken from the URL, so it cannot be shared.
+    """
+    user_id = current_user_id()
+    return None if user_id.startswith("session:") else user_id
+
+def mark_changed(*keys):
+    """Flag persisted keys whose values were changed in place, so the next persist_session saves them."""
+    st.session_state.setdefault("session_changed", set()).update(keys)
+
+def restore_session():
+    sid = session_id()
+    if sid is None:
+        return
+    store = get_session_store()
+    for key in store.keys(sid):
+        if key in PERSISTED_KEYS and key not in st.session_state:
+            st.session_state[key] = store.get(sid, key)
+
+def persist_session():
+    """Save the persisted keys reassigned or flagged since the last save; the rest are not pickled."""
+    sid = session_id()
+    if sid is None:
+        return
+    store = get_session_store()
+    saved_sid, saved = st.session_state.get("session_saved", (None, {}))
+    if saved_sid != sid:
+        saved = {}  # new owner (e.g. after sign-in): save everything under it once
+    changed = st.session_state.get("session_changed", set())
+    with Trace.span("session_persist"):
+        for key in PERSISTED_KEYS:
+            value = st.session_state[key]
+            if key in changed or key not in saved or saved[key] is not value:
+                store.set(sid, key, value)
+                saved[key] = value
+        store.touch(sid)
+    changed.clear()
+    st.session_state["session_saved"] = (sid, saved)
+
 def init_session():
-    st.session_state.setdefault("plans", [])
+    if "session_restored" not in st.session_state:
+        restore_session()
+        st.session_state["session_restored"] = True
+    # looked up every run: the shared entry may have been evicted, and sign-in changes the owner
+    st.session_state["plans"] = get_plan_history(current_user_id())
     st.session_state.setdefault("last_plan_html", None)
     st.session_state.setdefault("last_plan_raw", None)
+    st.session_state.setdefault("last_plan", None)
+    st.session_state.setdefault("last_plan_hash", None)
     st.session_state.setdefault("chat", [])
+    st.session_state.setdefault("chat_ctx", ChatContext(budget=st.secrets.get("CHAT_CONTEXT_TOKENS", 3000)))
     st.session_state.setdefault("timetable", None)
+    st.session_state.setdefault("timetable_hours", {})
+    st.session_state.setdefault("timetable_progress", {})
+    st.session_state.setdefault("timetable_changes", [])
+    st.session_state.setdefault("locked_slots", [])
     st.session_state.setdefault("progress", {})
-    st.session_state.setdefault("weak_topics", {})
+    st.session_state.setdefault("weak_topics", RevisionScheduler())
     st.session_state.setdefault("streak", 0)
 init_session()
 
+# ---------------- Debug profiling (opt-in) ----------------
+# enabled from the sidebar debug panel, shown only with secret DEBUG_PANEL = true: profiling is
+# process-wide, so visitors must not be able to switch it on
+DEBUG_PANEL = st.secrets.get("DEBUG_PANEL", False)
+profiler = None
+stale = st.session_state.pop("profiler", None)
+if stale is not None:
+    stale.stop()  # the previous run ended early (st.rerun) before reaching the debug panel
+if DEBUG_PANEL and st.session_state.get("prof_on"):
+    profiler = Profiler.start(allocations=st.session_state.get("prof_alloc", False),
+                              cprofile=st.session_state.get("prof_cprofile", False))
+    st.session_state["profiler"] = profiler
+
 # ---------------- Helpers ----------------
-def export_pdf(text, title="Study Plan"):
-    if not REPORTLAB:
-        return None
-    buf = io.BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-    w, h = A4
-    margin = 40
-    y = h - margin
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(margin, y, title)
-    y -= 22
-    c.setFont("Helvetica", 11)
-    for line in text.splitlines():
-        for part in wrap(line, 95):
-            if y < 60:
-                c.showPage()
-                c.setFont("Helvetica", 11)
-                y = h - margin
-            c.drawString(margin, y, part)
-            y -= 14
-    c.save()
-    buf.seek(0)
-    return buf
-
-def sanitize_text(s: str) -> str:
-    # Remove harmful tags and stray control chars
-    s = re.sub(r"<[^a-zA-Z/][^>]*>", "", s)
-    s = s.replace("< ", "&lt; ").replace(" >", " &gt;")
-    return s.strip()
+@st.cache_resource
+def setup_logging():
+    # handlers live for the process; records reach them through a background queue
+    configure_logging(level=st.secrets.get("LOG_LEVEL", "INFO"),
+                      path=st.secrets.get("LOG_PATH", ".data/logs/app.jsonl"),
+                      debug_sample_rate=st.secrets.get("LOG_DEBUG_SAMPLE", 0.01))
+    return True
+
+def app_logger():
+    setup_logging()
+    return Logger(session_id=current_user_id())
+
+@st.cache_resource
+def get_llm_cache():
+    return LLMCache(st.secrets.get("LLM_CACHE_PATH", ".llm_cache/responses.sqlite3"))
+
+@st.cache_resource
+def get_llm_client():
+    # one backend per process, shared by every session; LLM_BACKEND = "fake" runs offline
+    from agent.llm_backend import make_backend
+    if st.secrets.get("LLM_BACKEND", "openai") == "fake":
+        return make_backend("fake", latency=st.secrets.get("FAKE_LLM_LATENCY", 0.5), sigma=0.3,
+                            chunk_delay=st.secrets.get("FAKE_LLM_CHUNK_DELAY", 0.01),
+                            model_latency=st.secrets.get("FAKE_LLM_MODEL_LATENCY", None))
+    return make_backend(
+        "openai",
+        api_key=st.secrets.get("OPENAI_API_KEY", None),
+        base_url=st.secrets.get("OPENAI_BASE_URL", None),
+    )
 
-def convert_markdown_table_to_html(md: str) -> str:
-    """Convert simple markdown tables and headings/lists to HTML blocks."""
-    if not md:
-        return ""
-    lines = md.splitlines()
-    html = ""
-    inside = False
-    for raw in lines:
-        line = raw.rstrip()
-        # skip separator rows
-        if re.match(r"^\|?\s*-[-\s|]*\|?$", line.strip()):
-            continue
-        if line.strip().startswith("|") and line.strip().endswith("|"):
-            cols = [c.strip() for c in line.strip().split("|")[1:-1]]
-            if not inside:
-                inside = True
-                html += "<table class='tbl'><thead><tr>"
-                html += "".join([f"<th>{c}</th>" for c in cols])
-                html += "</tr></thead><tbody>"
-            else:
-                html += "<tr>" + "".join([f"<td>{c}</td>" for c in cols]) + "</tr>"
-        else:
-            if inside:
-                inside = False
-                html += "</tbody></table><br>"
-            if line.strip().startswith("### "):
-                html += f"<h3>{line.strip()[4:]}</h3>"
-            elif line.strip().startswith("## "):
-                html += f"<h2>{line.strip()[3:]}</h2>"
-            elif line.strip().startswith("- "):
-                html += f"<li>{line.strip()[2:]}</li>"
-            elif line.strip():
-                html += f"<p>{line.strip()}</p>"
-    if inside:
-        html += "</tbody></table>"
-    return html
-
-def pretty_split_plan(raw: str):
-    """Attempt to split plan into Weekly / Daily / Tips. Fallbacks to raw."""
-    if not raw:
-        return "", "", ""
-    lower = raw.lower()
-    # heuristics for splitting
-    start_weekly = raw.find("weekly")
-    start_daily = raw.lower().find("daily")
-    start_tips = raw.lower().find("tips")
-    if start_daily != -1 and start_tips != -1:
-        weekly = raw[:start_daily]
-        daily = raw[start_daily:start_tips]
-        tips = raw[start_tips:]
-    elif start_daily != -1:
-        weekly = raw[:start_daily]
-        daily = raw[start_daily:]
-        tips = ""
-    elif start_tips != -1:
-        weekly = raw[:start_tips]
-        daily = ""
-        tips = raw[start_tips:]
+@st.cache_resource
+def get_model_router():
+    # rolling latency / cost stats are shared by every session; budgets are per user
+    from agent.router import ModelRouter
+    return ModelRouter(
+        p95_slo=st.secrets.get("ROUTER_P95_SECONDS", 20.0),
+        user_budget=st.secrets.get("ROUTER_USER_BUDGET_USD", 0.50),
+        timeout=st.secrets.get("ROUTER_TIMEOUT", 60.0),
+        ttft_timeout=st.secrets.get("ROUTER_TTFT_TIMEOUT", 15.0),
+    )
+
+def route(model, messages, streamed=False):
+    """Router decision for one request ("Auto" or a preferred model); the latest is kept for display."""
+    decision = get_model_router().choose(current_user_id(), messages, preferred=model, streamed=streamed)
+    st.session_state["route"] = decision
+    return decision
+
+def log_route(decision):
+    # logged only for requests that reach the router, not for cache hits
+    if decision.over_budget:
+        app_logger().warning("model budget used up, request refused", reason=decision.reason)
     else:
-        # fallback: split into three equal parts (best-effort)
-        parts = raw.splitlines()
-        n = len(parts) or 1
-        p1 = parts[:max(1, n//3)]
-        p2 = parts[max(1, n//3):max(1, 2*n//3)]
-        p3 = parts[max(1, 2*n//3):]
-        weekly = "\n".join(p1)
-        daily = "\n".join(p2)
-        tips = "\n".join(p3)
-    return weekly, daily, tips
+        app_logger().info("model routed", model=decision.model, requested=decision.requested,
+                          streamed=decision.streamed, reason=decision.reason)
 
-# ---------------- UI helpers ----------------
-def render_plan_card(name, weekly_html, daily_html, tips_html):
-    return f"""
-    <div style="background:white;padding:28px;border-radius:16px;
-                box-shadow:0 14px 40px rgba(11,66,255,0.08);font-family:Inter;">
-      <h1 style="font-size:34px;margin:6px 0 8px 0;color:#0b66ff;font-weight:800;text-align:center">
-        📘 Weekly Study Plan — {name or 'Student'}
-      </h1>
-      <p style="text-align:center;color:#64748b;margin-bottom:20px">AI-generated personalized plan</p>
-
-      <h2 style="color:#0b66ff;font-size:20px;margin-bottom:6px">📅 Weekly Overview</h2>
-      <div style="padding:14px;border-left:6px solid #0b66ff;background:#f5f9ff;border-radius:10px;margin-bottom:18px;">{weekly_html}</div>
-
-      <h2 style="color:#0b66ff;font-size:20px;margin-bottom:6px">🕒 Daily Breakdown</h2>
-      <div style="padding:14px;border-left:6px solid #0284c7;background:#f0f7ff;border-radius:10px;margin-bottom:18px;">{daily_html}</div>
-
-      <h2 style="color:#0b66ff;font-size:20px;margin-bottom:6px">💡 Study Tips</h2>
-      <div style="padding:14px;border-left:6px solid #f59e0b;background:#fff8e6;border-radius:10px;margin-bottom:6px;">{tips_html}</div>
-    </div>
+def cached_completion(model, messages, temperature, use_cache=True, response_format=None, parse=None):
+    """
+    Return (content, cache_hit) for a chat completion, consulting the response
+    cache first. With `parse`, content is parse(reply), and a reply it rejects
+    (by raising) is not cached.
+    """
+    decision = route(model, messages)
+    cache = get_llm_cache()
+    if use_cache:
+        hit = cache.get(cache_key(decision.model, temperature, messages, response_format))
+        if hit is not None:
+            if parse is None:
+                return hit, True
+            with Trace.span("parse"):
+                return parse(hit), True
+    log_route(decision)
+    with Trace.span("llm_call"):
+        content = get_model_router().complete(get_llm_client(), decision, messages, temperature,
+                                              response_format=response_format)
+    result = content
+    if parse is not None:
+        with Trace.span("parse"):
+            result = parse(content)
+    if use_cache and content:
+        # keyed on the model that answered, which differs after a timeout fallback
+        cache.put(cache_key(decision.model, temperature, messages, response_format), content)
+    return result, False
+
+@st.cache_resource
+def get_pdf_cache():
+    return PDFCache(max_entries=st.secrets.get("PDF_CACHE_ENTRIES", 32),
+                    max_bytes=st.secrets.get("PDF_CACHE_MB", 32) * 1024 * 1024)
+
+def lazy_pdf(key, documents):
+    """
+    Deferred data for st.download_button: the PDF is only built (or taken from
+    the cache) when the button is clicked. `documents` is a zero-argument
+    callable returning an iterable of (title, text).
+    """
+    cache = get_pdf_cache()
+    def build():
+        from agent.pdf_export import build_pdf
+        with Trace.span("pdf_export"):
+            return build_pdf(documents())
+    return lambda: cache.get_or_build(key, build)
+
+def sync_timetable_with_progress():
+    """Rebalance the saved timetable in place when progress changed since it was last planned."""
+    tt = st.session_state["timetable"]
+    planned = st.session_state["timetable_hours"]
+    progress = st.session_state["progress"]
+    if tt is None or not remaining_diff(planned, st.session_state["timetable_progress"], progress):
+        return []
+    with Trace.span("reschedule"):
+        changes = reschedule_timetable(tt, planned, progress, locked=st.session_state["locked_slots"])
+    st.session_state["timetable_progress"] = dict(progress)
+    mark_changed("timetable")  # rebalanced in place
+    if changes:
+        st.session_state["timetable_changes"] = changes
+    return changes
+
+def summarize_turns(summary, turns, max_tokens):
+    """Fold evicted chat turns into the rolling conversation summary."""
+    convo = "\n".join(f"{'Student' if r == 'you' else 'Assistant'}: {t}" for r, t in turns)
+    prompt = (f"Summary so far:\n{summary or '(none)'}\n\nNew turns:\n{convo}\n\n"
+              f"Rewrite the summary to include the new turns in under {max_tokens * 3 // 4} words. "
+              "Keep the student's goals, subjects, weak topics and any commitments made.")
+    content, _ = cached_completion("gpt-4o-mini", [
+        {"role": "system", "content": "You condense tutoring conversations into short factual notes."},
+        {"role": "user", "content": prompt},
+    ], 0)
+    return content
+
+def coalesce_stream(deltas, min_interval=0.08, min_chars=400):
+    """Accumulate streamed deltas and yield the text so far in coalesced chunks.
+
+    The first delta is yielded immediately; after that a new snapshot is only
+    emitted once `min_interval` seconds or `min_chars` new characters have
+    accumulated, so the UI re-renders a bounded number of times per plan.
     """
+    text = ""
+    pending = []
+    pending_chars = 0
+    last = None
+    for d in deltas:
+        pending.append(d)
+        pending_chars += len(d)
+        now = time.monotonic()
+        if last is None or pending_chars >= min_chars or now - last >= min_interval:
+            text += "".join(pending)
+            pending, pending_chars, last = [], 0, now
+            yield text
+    if pending or last is None:
+        yield text + "".join(pending)
+
+@profiled()
+def convert_markdown_table_to_html(md: str) -> str:
+    """Convert simple markdown tables and headings/lists to HTML blocks."""
+    return render_markdown(md)
 
-# ---------------- Smart timetable ----------------
-def generate_smart_timetable(subjects, weekly_hours, deadline, intensity, progress):
-    days = ["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday"]
-    slots = ["Morning (9-12)","Afternoon (1-4)","Evening (6-8)"]
-    if not subjects:
-        subjects = ["General"]
-    weights = {s: 1 + progress.get(s, 0)*0.1 for s in subjects}
-    total_weight = sum(weights.values()) or 1
-    subject_hours = {s: round((weights[s]/total_weight) * weekly_hours, 2) for s in subjects}
-    timetable = []
-    subject_cycle = list(subjects) * 10
-    idx = 0
-    for d in days:
-        for sl in slots:
-            sb = subject_cycle[idx % len(subject_cycle)]
-            hrs = round(subject_hours.get(sb, 0)/3 if sb in subject_hours else round(weekly_hours/21,2), 2)
-            timetable.append([d, sl, sb, hrs])
-            idx += 1
-    df = pd.DataFrame(timetable, columns=["Day","Slot","Subject","Hours"])
-    pivot = df.pivot(index="Slot", columns="Day", values="Subject")
-    summary = "Weekly spaced revision recommended."
-    return df, pivot, subject_hours, summary
+# ---------------- UI helpers ----------------
+@st.cache_data(max_entries=64)
+def render_saved_plan(plan_hash, _name, _raw, _plan):
+    """HTML card for a saved plan, cached per content hash (the underscored args are not hashed)."""
+    if _plan:
+        return render_plan_card(_name, *StudyPlan.from_dict(_plan).html_sections())
+    weekly_raw, daily_raw, tips_raw = pretty_split_plan(_raw)
+    return render_plan_card(_name, convert_markdown_table_to_html(weekly_raw),
+                            convert_markdown_table_to_html(daily_raw), convert_markdown_table_to_html(tips_raw))
+
+@st.cache_data(max_entries=64)
+def plan_changes(old_id, new_id, _history):
+    """Row-level diff between two saved plans; versions never change, so it is cached per id pair."""
+    return _history.diff(old_id, new_id)
+
+def show_plan_changes(history, old_id, new_id, limit=200):
+    changes = plan_changes(old_id, new_id, history)
+    if changes is None:
+        st.warning("One of these plans is no longer available.")
+        return
+    if not changes:
+        st.caption("No changes.")
+        return
+    counts = {}
+    for c in changes:
+        counts[c["change"]] = counts.get(c["change"], 0) + 1
+    st.caption(f"{len(changes)} change(s): " + ", ".join(f"{n} {kind}" for kind, n in counts.items()))
+    def cell(v):
+        return str(v).replace("|", "\\|") or "—"
+    st.markdown("\n".join(["| Section | Change | Row | Before | After |", "|---|---|---|---|---|"]
+                          + [f"| {c['section']} | {c['change']} | {cell(c['key'])} | {cell(c['before'])} | "
+                             f"{cell(c['after'])} |" for c in changes[:limit]]))
+    if len(changes) > limit:
+        st.caption(f"… and {len(changes) - limit} more")
+
+@st.cache_data(max_entries=64)
+def planned_hours_chart(plan_hash, _subjects):
+    """Planned-hours bar chart of one plan; rebuilt only when the plan changes."""
+    import pandas as pd
+    import plotly.express as px
+    df = pd.DataFrame({"Subject": list(_subjects.keys()), "Hours": list(_subjects.values())})
+    return px.bar(df, x="Subject", y="Hours", text="Hours", title="Planned Hours by Subject")
+
+@st.cache_data(max_entries=32)
+def trend_charts(user_id, version, today):
+    """Weekly planned-vs-completed chart and per-subject rollup, rebuilt only when the trend store changes."""
+    import plotly.express as px
+    store = get_trend_store(user_id)
+    weekly = store.weekly(today, weeks=12)
+    if weekly.empty:
+        return None, None
+    long = weekly.melt(id_vars="Week", value_vars=["Planned", "Completed"], var_name="Kind", value_name="Hours")
+    fig = px.bar(long, x="Week", y="Hours", color="Kind", barmode="group",
+                 title="Planned vs completed hours per week")
+    return fig, store.by_subject(today)
 
 # ---------------- Premium Blue CSS ----------------
 st.markdown("""
@@ -215,7 +424,7 @@ input, textarea, select { outline-color:#0b66ff !important; }
 
 # ---------------- Sidebar + Header ----------------
 st.sidebar.title("AI Study Planner Pro")
-page = st.sidebar.radio("Navigate", ["Planner","Dashboard","Chatbot","Calendar","History","About"])
+page = st.sidebar.radio("Navigate", ["Planner","Dashboard","Chatbot","Calendar","History","About"], key="page")
 st.markdown("<h1 class='main-title'>📘 AI Study Planner Pro</h1>", unsafe_allow_html=True)
 st.markdown("<div class='main-sub'>Premium Blue Dashboard</div>", unsafe_allow_html=True)
 
@@ -237,13 +446,23 @@ if page == "Planner":
 
         st.markdown("<div class='section'>", unsafe_allow_html=True)
         st.markdown("<div style='font-weight:700;color:#0b66ff;margin-bottom:6px'>Model & Options</div>", unsafe_allow_html=True)
-        model_choice = st.selectbox("OpenAI Model", ["gpt-4o-mini","gpt-4o"])
+        model_choice = st.selectbox("OpenAI Model", ["Auto","gpt-4o-mini","gpt-4o"],
+                                    help="Auto picks a model per request within the latency SLO and your cost budget")
         temp = st.slider("Temperature", 0.0, 1.0, 0.25)
-        typing = st.checkbox("Typing animation (preview)", True)
+        structured = st.checkbox("Structured output (JSON)", True, help="Falls back to markdown if the model does not support it")
+        # a JSON plan is only rendered once it parses, so there is nothing to preview while it arrives
+        stream_output = st.checkbox("Stream response (live preview)", True, disabled=structured,
+                                    help="Markdown plans only; used by structured output when it falls back to markdown")
+        if structured:
+            st.caption("Live preview is off while structured output is on: the JSON plan is shown once complete.")
+        bypass_cache = st.checkbox("Bypass cache when temperature > 0", False)
         if st.button("Clear saved plans"):
-            st.session_state["plans"] = []
+            st.session_state["plans"].clear()
             st.session_state["last_plan_html"] = None
             st.session_state["last_plan_raw"] = None
+            st.session_state["last_plan"] = None
+            st.session_state["last_plan_hash"] = None
+            get_trend_store(current_user_id()).clear_plans()
             st.success("Saved plans cleared.")
         st.markdown("</div>", unsafe_allow_html=True)
 
@@ -252,85 +471,166 @@ if page == "Planner":
         st.markdown("<h2 style='color:#0b66ff;margin-bottom:6px'>AI Generated Study Plan</h2>", unsafe_allow_html=True)
 
         if st.button("Generate Plan"):
+            from openai import BadRequestError
+            trace_id = f"plan-{time.time_ns()}"
+            Trace.start_trace(trace_id)
             subs = [s.strip() for s in subjects_input.split(",") if s.strip()]
             if not student_name:
                 display_name = "Student"
             else:
                 display_name = student_name.strip()
 
-            # Prompt - keep concise and structured
-            prompt = f"""Generate a clear, professional weekly study plan for a student.
-
-Name: {display_name}
-Subjects: {subs}
-Weekly hours: {weekly_hours}
-Deadline: {exam_date}
-Intensity: {intensity}
-Include revision: {include_revision}
-Include tips: {include_tips}
-
-Output 3 sections:
-1) Weekly Overview (as a markdown table with columns: Day | Subject | Study Hours | Focus Area | Revision Hours)
-2) Daily Breakdown with time blocks and tasks (clear bullet points)
-3) Short Study Tips (3-6 items)
-Keep language concise and professional.
-"""
-
-            client = OpenAI(api_key=st.secrets.get("OPENAI_API_KEY", None))
-            try:
-                with st.spinner("Generating study plan..."):
-                    res = client.chat.completions.create(
-                        model=model_choice,
-                        messages=[{"role":"system","content":"You generate clear, actionable study plans."},
-                                  {"role":"user","content":prompt}],
-                        temperature=temp
-                    )
-                raw = sanitize_text(res.choices[0].message.content)
-            except Exception as e:
-                st.error(f"OpenAI request failed: {e}")
-                raw = ""
-
-            # Parse into parts and convert to HTML
-            weekly_raw, daily_raw, tips_raw = pretty_split_plan(raw)
-            weekly_html = convert_markdown_table_to_html(weekly_raw)
-            daily_html = convert_markdown_table_to_html(daily_raw)
-            tips_html = convert_markdown_table_to_html(tips_raw)
-
-            final_html = render_plan_card(display_name, weekly_html, daily_html, tips_html)
-
-            # Save
-            st.session_state["plans"].insert(0, {"name": display_name, "raw": raw, "html": final_html, "time": str(datetime.datetime.now())})
-            st.session_state["last_plan_html"] = final_html
-            st.session_state["last_plan_raw"] = raw
-
-            # show with typing effect if requested
-            if typing:
-                ph = st.empty()
-                out = ""
-                for ch in final_html:
-                    out += ch
-                    ph.markdown(out, unsafe_allow_html=True)
-                    time.sleep(0.001)
+            profile = {"name": display_name, "subjects": subs, "weekly_hours": weekly_hours,
+                       "deadline": exam_date, "intensity": intensity,
+                       "include_revision": include_revision, "include_tips": include_tips}
+            if include_revision:
+                profile["revision_topics"] = [t.topic for t in st.session_state["weak_topics"].due(n=10)]
+
+            ph = st.empty()
+            use_cache = not (bypass_cache and temp > 0)
+            plan = None
+            raw = ""
+            hit = False
+            failed = False
+            if structured:
+                try:
+                    with st.spinner("Generating study plan..."):
+                        # parsed before caching, so an off-schema reply is not served again
+                        plan, hit = cached_completion(
+                            model_choice, plan_messages(profile, structured=True), temp,
+                            use_cache=use_cache, response_format=PLAN_RESPONSE_FORMAT,
+                            parse=lambda content: StudyPlan.from_json(content, display_name)
+                        )
+                    raw = plan.to_markdown()
+                except (ValueError, BadRequestError) as e:
+                    # model without structured output support, or unparseable JSON
+                    st.caption(f"Structured output unavailable ({type(e).__name__}); falling back to markdown.")
+                except BudgetExceeded as e:
+                    st.warning(f"Plan not generated: {e}. Try again later.")
+                    failed = True
+                except Exception as e:
+                    app_logger().error("plan request failed", exc_info=True, model=model_choice)
+                    st.error(f"OpenAI request failed: {e}")
+                    failed = True
+
+            if plan is None and not failed:
+                messages = plan_messages(profile)
+                decision = route(model_choice, messages, streamed=stream_output)
+                cache = get_llm_cache()
+                cached = cache.get(cache_key(decision.model, temp, messages)) if use_cache else None
+                hit = cached is not None
+                try:
+                    if cached is not None:
+                        raw = sanitize_text(cached)
+                    elif stream_output:
+                        # render the markdown as it arrives; the final card replaces it below
+                        renderer = MarkdownRenderer()
+                        preview = []
+                        text = ""
+                        log_route(decision)
+                        with Trace.span("llm_call"):
+                            deltas = get_model_router().stream(get_llm_client(), decision, messages, temp)
+                            for snapshot in coalesce_stream(deltas):
+                                # only the new suffix is rendered; completed lines are never re-parsed
+                                preview.append(sanitize_text(renderer.feed(snapshot[len(text):])))
+                                text = snapshot
+                                ph.markdown("".join(preview), unsafe_allow_html=True)
+                        if use_cache and text:
+                            cache.put(cache_key(decision.model, temp, messages), text)
+                        raw = sanitize_text(text)
+                    else:
+                        log_route(decision)
+                        with st.spinner("Generating study plan..."), Trace.span("llm_call"):
+                            content = get_model_router().complete(get_llm_client(), decision, messages, temp)
+                        if use_cache and content:
+                            cache.put(cache_key(decision.model, temp, messages), content)
+                        raw = sanitize_text(content)
+                except BudgetExceeded as e:
+                    st.warning(f"Plan not generated: {e}. Try again later.")
+                    failed = True
+                except Exception as e:
+                    app_logger().error("plan request failed", exc_info=True, model=model_choice)
+                    st.error(f"OpenAI request failed: {e}")
+                    failed = True
+            if not use_cache:
+                st.caption("Response cache: bypassed")
             else:
-                st.markdown(final_html, unsafe_allow_html=True)
-
-            # downloads
-            if REPORTLAB and raw:
-                pdf_buf = export_pdf(raw, title=f"{display_name} — Study Plan")
-                st.download_button("📥 Download PDF", pdf_buf, file_name="study_plan.pdf")
-            if raw:
+                st.caption("Response cache: ⚡ hit" if hit else "Response cache: miss")
+            if st.session_state.get("route") is not None:
+                st.caption(f"Model: {st.session_state['route'].model} — {st.session_state['route'].reason}")
+
+            if not failed and not raw:
+                st.error("The model returned an empty plan; try again.")
+            # after a failure nothing is rendered or saved: the previous plan stays the active one
+            if raw and not failed:
+                if plan is not None:
+                    with Trace.span("render"):
+                        weekly_html, daily_html, tips_html = plan.html_sections()
+                else:
+                    # markdown fallback: split into parts and convert to HTML
+                    with Trace.span("parse"):
+                        weekly_raw, daily_raw, tips_raw = pretty_split_plan(raw)
+                    with Trace.span("render"):
+                        weekly_html = convert_markdown_table_to_html(weekly_raw)
+                        daily_html = convert_markdown_table_to_html(daily_raw)
+                        tips_html = convert_markdown_table_to_html(tips_raw)
+
+                with Trace.span("render"):
+                    final_html = render_plan_card(display_name, weekly_html, daily_html, tips_html)
+
+                # Save
+                h = plan_hash(display_name, raw)
+                hours = plan_subject_hours(h, raw, plan)
+                now = datetime.datetime.now()
+                trends = get_trend_store(current_user_id())  # loaded before the insert so the plan is counted once
+                st.session_state["plans"].insert(0, {"name": display_name, "raw": raw,
+                                                     "plan": plan.to_dict() if plan else None,
+                                                     "time": str(now), "hours": hours})
+                trends.add_plan(now, hours)
+                st.session_state["last_plan_hash"] = h
+                app_logger().info("plan generated", plan_hash=h, structured=plan is not None, cache_hit=hit,
+                                  subjects=len(hours))
+                st.session_state["last_plan_html"] = final_html
+                st.session_state["last_plan_raw"] = raw
+                st.session_state["last_plan"] = plan
+
+                with Trace.span("st_render"):
+                    ph.markdown(final_html, unsafe_allow_html=True)
+
+                # downloads
+                if REPORTLAB:
+                    title = f"{display_name} — Study Plan"
+                    st.download_button("📥 Download PDF", lazy_pdf(pdf_key(title, raw), lambda: [(title, raw)]),
+                                       file_name="study_plan.pdf", mime="application/pdf")
                 st.download_button("📥 Download TXT", raw, file_name="study_plan.txt")
+            Trace.end_trace(trace_id)
 
         elif st.session_state["last_plan_html"]:
             st.markdown(st.session_state["last_plan_html"], unsafe_allow_html=True)
         else:
             st.info("Click 'Generate Plan' to create a study plan.")
 
+        router = get_model_router()
+        with st.expander("Model routing"):
+            st.caption(f"p95 SLO {router.p95_slo:g}s · budget ${router.user_budget:.2f} per day, "
+                       f"${router.spent(current_user_id()):.4f} spent · timeout {router.timeout:g}s "
+                       f"(first token {router.ttft_timeout:g}s)")
+            # markdown tables: st.dataframe would pull pandas into every Planner run
+            stats = router.snapshot()
+            st.markdown("\n".join(["| " + " | ".join(stats[0]) + " |", "|" + "---|" * len(stats[0])]
+                                  + ["| " + " | ".join(str(v) for v in row.values()) + " |" for row in stats]))
+            recent = [d for d in router.decisions if d.user_id == current_user_id()][::-1][:10]
+            if recent:
+                st.markdown("\n".join(["| time | model | reason |", "|---|---|---|"] + [
+                    f"| {datetime.datetime.fromtimestamp(d.ts):%H:%M:%S} | {d.model} | {d.reason} |" for d in recent]))
+
         st.markdown("</div>", unsafe_allow_html=True)
 
 # ---------------- Dashboard ----------------
 # ---------------- Dashboard ----------------
 elif page == "Dashboard":
+    import pandas as pd
+
     st.markdown("<div class='section'>", unsafe_allow_html=True)
     st.markdown("<h2 class='stitle'>📊 Dashboard • Progress</h2>", unsafe_allow_html=True)
 
@@ -341,35 +641,10 @@ elif page == "Dashboard":
         st.markdown("</div>", unsafe_allow_html=True)
        
 
-    # ---------------- SMART TABLE PARSER ----------------
-    subjects = {}
-
-    for line in raw.splitlines():
-
-        # Must contain markdown table pipes
-        if "|" not in line:
-            continue
-
-        # Split the row
-        parts = [p.strip() for p in line.split("|") if p.strip()]
-
-        # We need at least 3 columns for Subject + Hours
-        if len(parts) < 3:
-            continue
-
-        col1 = parts[0].lower()  # Possibilities: Day, Monday …
-        col2 = parts[1]          # Subject
-        col3 = parts[2]          # Study hours if numeric
-
-        # Skip header row (non-numeric hrs column)
-        if not col3.replace(".", "", 1).isdigit():
-            continue
-
-        # Extract subject + hours
-        subject = col2
-        hours = float(col3)
-
-        subjects[subject] = subjects.get(subject, 0) + hours
+    # ---------------- PLAN AGGREGATES ----------------
+    plan = st.session_state.get("last_plan")
+    h = st.session_state.get("last_plan_hash") or plan_hash("", raw or "")
+    subjects = plan_subject_hours(h, raw, plan)
 
     # ---------------- Fallback ----------------
     if not subjects:
@@ -377,34 +652,56 @@ elif page == "Dashboard":
         subjects = {"Math": 6, "DBMS": 6, "AI": 6}
 
     # ---------------- BUILD CHART ----------------
-    df = pd.DataFrame({"Subject": list(subjects.keys()), "Hours": list(subjects.values())})
-
-    fig = px.bar(
-        df, x="Subject", y="Hours", text="Hours",
-        title="Planned Hours by Subject"
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(planned_hours_chart(h, subjects), use_container_width=True)
 
     st.markdown("### Track completed hours")
     completed = {}
+    deltas = {}
 
-    for s in df["Subject"]:
+    for s, planned_hours in subjects.items():
         completed[s] = st.number_input(
             f"Completed hours — {s}",
             min_value=0.0,
-            max_value=float(df[df["Subject"] == s]["Hours"].iloc[0]),
+            max_value=float(planned_hours),
             value=float(st.session_state["progress"].get(s, 0.0)),
             step=0.5
         )
+        delta = completed[s] - st.session_state["progress"].get(s, 0.0)
+        if delta:
+            deltas[s] = delta
         st.session_state["progress"][s] = completed[s]
+    if deltas:
+        mark_changed("progress")
+        record_progress(deltas)
 
-    total_planned = df["Hours"].sum()
+    total_planned = sum(subjects.values())
     total_done = sum(completed.values())
     pct = min(1.0, total_done / (total_planned if total_planned else 1))
 
     st.progress(pct)
     st.markdown(f"Completed: {total_done:.1f} / {total_planned} hours — {pct*100:.1f}%")
 
+    changes = sync_timetable_with_progress()
+    if changes:
+        st.success(f"Timetable rebalanced for your progress: {len(changes)} slot(s) changed.")
+        st.dataframe(pd.DataFrame(changes), hide_index=True)
+
+    # ---------------- TRENDS ACROSS PLANS ----------------
+    st.markdown("### 📈 Trends across plans")
+    user_id = current_user_id()
+    store = get_trend_store(user_id)
+    today = datetime.date.today()
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Completion (last 4 weeks)", f"{store.completion_rate(today, days=28) * 100:.0f}%")
+    c2.metric("Study streak", f"{store.streak(today)} day(s)")
+    c3.metric("Plans tracked", len(st.session_state["plans"]))
+    weekly_fig, per_subject = trend_charts(user_id, store.version, today)
+    if weekly_fig is None:
+        st.info("Trends appear once you have saved plans or logged progress.")
+    else:
+        st.plotly_chart(weekly_fig, use_container_width=True)
+        st.dataframe(per_subject, hide_index=True)
+
     st.markdown("</div>", unsafe_allow_html=True)
 
 # ---------------- Chatbot ----------------
@@ -413,6 +710,7 @@ elif page == "Chatbot":
     st.markdown("<h2 style='color:#0b66ff'>🤖 Study Assistant</h2>", unsafe_allow_html=True)
 
     mode = st.selectbox("Mode", ["Study Mode","Subject Mode","Motivation Mode"])
+    chat_model = st.selectbox("Model", ["Auto","gpt-4o-mini","gpt-4o"], index=1, key="chat_model")
     subj = None
     if mode == "Subject Mode":
         subj = st.text_input("Subject (e.g., Math)", "Math")
@@ -422,6 +720,9 @@ elif page == "Chatbot":
         user_msg = st.text_input("Your message", "")
     with col2:
         send = st.button("Send")
+    bypass_cache = st.checkbox("Bypass response cache", False)
+    attach_plan = st.checkbox("Use my latest study plan as context", bool(st.session_state["last_plan_raw"]),
+                              disabled=not st.session_state["last_plan_raw"])
 
     if send and user_msg.strip():
         if mode == "Study Mode":
@@ -431,19 +732,30 @@ elif page == "Chatbot":
         else:
             system = f"You are an expert tutor in {subj}."
 
-        client = OpenAI(api_key=st.secrets.get("OPENAI_API_KEY", None))
+        ctx = st.session_state["chat_ctx"]
+        plan_ctx = st.session_state["last_plan_raw"] if attach_plan else None
+        # the turn is taken back if the request fails, so it is not resent with the next message
+        ctx.add("you", user_msg)
         try:
-            res = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role":"system","content":system},{"role":"user","content":user_msg}],
-                temperature=0.25
-            )
-            ai_msg = sanitize_text(res.choices[0].message.content)
+            if ctx.needs_compaction(system, plan_ctx):
+                with Trace.span("chat_compact"):
+                    ctx.compact(system, plan_ctx, summarize=summarize_turns)
+            messages = ctx.messages(system, plan_ctx)
+            content, hit = cached_completion(chat_model, messages, 0.25, use_cache=not bypass_cache)
+            ai_msg = sanitize_text(content)
+            ctx.add("ai", ai_msg)
+            st.session_state["chat_cache"] = "bypassed" if bypass_cache else ("⚡ hit" if hit else "miss")
+            st.session_state["chat_model_used"] = st.session_state["route"].model
+            st.session_state["chat_prompt_tokens"] = ctx.prompt_tokens(messages)
         except Exception as e:
+            app_logger().error("chat request failed", exc_info=True, model=chat_model)
+            if ctx.turns and ctx.turns[-1][0] == "you":
+                ctx.pop()
             ai_msg = f"Assistant error: {e}"
 
-        st.session_state["chat"].append(("you", user_msg))
-        st.session_state["chat"].append(("ai", ai_msg))
+        # only the displayed tail is kept; older turns live on in the context summary
+        st.session_state["chat"] = st.session_state["chat"][-38:] + [("you", user_msg), ("ai", ai_msg)]
+        mark_changed("chat_ctx")
         st.rerun()
 
 
@@ -454,8 +766,14 @@ elif page == "Chatbot":
         else:
             st.markdown(f"<div class='chat-ai'>AI: {txt}</div>", unsafe_allow_html=True)
 
+    if st.session_state.get("chat_cache"):
+        st.caption(f"Last reply from {st.session_state.get('chat_model_used', '?')} · response cache: "
+                   f"{st.session_state['chat_cache']} · prompt ≈ {st.session_state.get('chat_prompt_tokens', 0)} tokens")
+
     if st.button("Clear Chat"):
         st.session_state["chat"] = []
+        st.session_state["chat_ctx"].clear()
+        mark_changed("chat_ctx")
         st.rerun()
 
 
@@ -463,6 +781,9 @@ elif page == "Chatbot":
 
 # ---------------- Calendar ----------------
 elif page == "Calendar":
+    from agent.export import export_bytes, timetable_csv, timetable_ics
+    from agent.timetable import generate_smart_timetable
+
     st.markdown("<div class='section'>", unsafe_allow_html=True)
     st.markdown("<h2 style='color:#0b66ff'>📅 Smart Timetable</h2>", unsafe_allow_html=True)
 
@@ -471,22 +792,77 @@ elif page == "Calendar":
     deadline = st.date_input("Deadline", datetime.date.today(), key="calendar_deadline")
     intensity = st.slider("Priority (1-10)", 1, 10, 5, key="calendar_intensity")
 
+    weak = st.session_state["weak_topics"]
+    add_revision = st.checkbox("Add spaced revision blocks for weak topics", True, disabled=not len(weak))
+
     if st.button("Generate Timetable"):
         subs = [s.strip() for s in subjects_input.split(",") if s.strip()]
-        df, pivot, subj_hours, summary = generate_smart_timetable(subs, weekly_hours, deadline, intensity, st.session_state["progress"])
+        with Trace.span("schedule_build"):
+            df, pivot, subj_hours, summary = generate_smart_timetable(subs, weekly_hours, deadline, intensity, st.session_state["progress"])
+            if add_revision and len(weak):
+                df = add_revision_rows(df, weak.plan(days=7, per_day=3))
         st.session_state["timetable"] = df
+        st.session_state["timetable_hours"] = subj_hours
+        st.session_state["timetable_progress"] = dict(st.session_state["progress"])
+        st.session_state["timetable_changes"] = []
         st.success("Timetable generated.")
 
     if st.session_state["timetable"] is not None:
+        tt = st.session_state["timetable"]
+        options = list(zip(tt["Day"], tt["Slot"]))
+        locked = st.multiselect(
+            "Locked slots (kept when progress changes)", options,
+            default=[ds for ds in st.session_state["locked_slots"] if ds in options],
+            format_func=lambda ds: f"{ds[0]} · {ds[1]}",
+        )
+        if locked != st.session_state["locked_slots"]:
+            st.session_state["locked_slots"] = locked
+        sync_timetable_with_progress()
+        if st.session_state["timetable_changes"]:
+            with st.expander(f"Last rebalance: {len(st.session_state['timetable_changes'])} slot(s) changed"):
+                st.dataframe(st.session_state["timetable_changes"], hide_index=True)
         st.dataframe(st.session_state["timetable"])
         pivot = st.session_state["timetable"].pivot(index="Slot", columns="Day", values="Subject")
         st.subheader("Calendar View")
         st.table(pivot)
-        csv = st.session_state["timetable"].to_csv(index=False)
-        st.download_button("Export CSV", csv, "timetable.csv")
+        # generated chunk by chunk, and only when a button is clicked
+        c1, c2 = st.columns(2)
+        c1.download_button("Export CSV", lambda: export_bytes(timetable_csv(tt)), "timetable.csv", mime="text/csv")
+        c2.download_button("Export calendar (.ics)",
+                           lambda: export_bytes(timetable_ics(tt, start=datetime.date.today(), until=deadline)),
+                           "timetable.ics", mime="text/calendar")
     else:
         st.info("Generate a timetable to view it.")
 
+    st.markdown("### 🔁 Spaced revision")
+    c1, c2, c3 = st.columns([3, 2, 1])
+    with c1:
+        new_topic = st.text_input("Weak topic", "", key="weak_topic")
+    with c2:
+        topic_subject = st.text_input("Subject", "", key="weak_subject")
+    with c3:
+        if st.button("Add topic") and new_topic.strip():
+            weak.add(new_topic.strip(), topic_subject.strip())
+            mark_changed("weak_topics")
+            st.rerun()
+    due = weak.due(n=5)
+    if not len(weak):
+        st.caption("Add topics you find hard; they are scheduled for review with SM-2 spacing.")
+    elif not due:
+        st.caption(f"Nothing due today · {len(weak)} topic(s) tracked.")
+    for t in due:
+        c1, c2, c3 = st.columns([3, 2, 1])
+        with c1:
+            spacing = f"interval {t.interval} day(s)" if t.interval else "new"
+            st.markdown(f"**{t.topic}** {('· ' + t.subject) if t.subject else ''} — {spacing}")
+        with c2:
+            quality = st.select_slider("Recall (0-5)", options=list(range(6)), value=4, key=f"q_{t.topic}")
+        with c3:
+            if st.button("Reviewed", key=f"rev_{t.topic}"):
+                weak.review(t.topic, quality)
+                mark_changed("weak_topics")
+                st.rerun()
+
     st.markdown("</div>", unsafe_allow_html=True)
 
 # ---------------- History ----------------
@@ -494,13 +870,64 @@ elif page == "History":
     st.markdown("<div class='section'>", unsafe_allow_html=True)
     st.markdown("<h2 style='color:#0b66ff'>📜 Plan History</h2>", unsafe_allow_html=True)
 
-    if not st.session_state["plans"]:
+    history = st.session_state["plans"]
+    if not history:
         st.info("No saved plans yet.")
     else:
-        for i, p in enumerate(st.session_state["plans"]):
-            with st.expander(f"Plan #{i+1} — {p.get('name','Student')} — {p.get('time','')}"):
-                st.markdown(p.get("html") or convert_markdown_table_to_html(p.get("raw","")), unsafe_allow_html=True)
-                st.download_button(f"Download Plan #{i+1} (TXT)", p.get("raw",""), f"plan_{i+1}.txt")
+        if REPORTLAB:
+            # one document per plan; payloads are loaded one at a time while the PDF is written
+            all_ids = [(m["id"], m["hash"]) for m in history]
+            def all_plans():
+                for plan_id, _ in all_ids:
+                    p = history.load(plan_id)
+                    if p is not None:
+                        yield f"{p['name']} — {p['time']}", p["raw"]
+            st.download_button(f"📚 Export all {len(all_ids)} plans (PDF)",
+                               lazy_pdf(pdf_key("history", *(h for _, h in all_ids)), all_plans),
+                               file_name="study_plan_history.pdf", mime="application/pdf")
+        query = st.text_input("Search plans (name, subject or date)", key="history_query")
+        versions = history.search(query)
+        if len(versions) > 1:
+            with st.expander("🔀 Compare versions"):
+                labels = {m["id"]: f"#{i+1} — {m['name']} — {m['time'][:16]}" for i, m in enumerate(versions)}
+                ids = list(labels)
+                c1, c2 = st.columns(2)
+                old_id = c1.selectbox("From", ids, index=1, format_func=labels.get, key="diff_from")
+                new_id = c2.selectbox("To", ids, index=0, format_func=labels.get, key="diff_to")
+                show_plan_changes(history, old_id, new_id)
+                objects, size = history.storage()
+                st.caption(f"{len(history)} versions share {objects} stored rows and blocks ({size / 1024:.1f} KB)")
+        _, total = history.page(0, query)
+        pages = max(1, -(-total // history.page_size))
+        page_no = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1,
+                                  key="history_page") - 1 if pages > 1 else 0
+        metas, total = history.page(page_no, query)
+        if not metas:
+            st.info("No plans match your search.")
+        offset = page_no * history.page_size
+        for i, m in enumerate(metas):
+            with st.expander(f"Plan #{offset+i+1} — {m['name']} — {m['time']}"):
+                if m["subjects"]:
+                    st.caption(", ".join(m["subjects"]))
+                previous = history.previous(m["id"])
+                if previous is not None and st.toggle("What changed since the previous plan",
+                                                      key=f"changes_{m['id']}"):
+                    show_plan_changes(history, previous["id"], m["id"])
+                # payloads are only loaded and rendered for plans the user opens
+                if st.toggle("Show plan", key=f"show_{m['id']}"):
+                    p = history.load(m["id"])
+                    if p is None:
+                        st.warning("This plan is no longer available.")
+                        continue
+                    st.markdown(render_saved_plan(p["hash"] or str(p["id"]), p["name"], p["raw"], p["plan"]),
+                                unsafe_allow_html=True)
+                    st.download_button(f"Download Plan #{offset+i+1} (TXT)", p["raw"], f"plan_{offset+i+1}.txt",
+                                       key=f"dl_{m['id']}")
+                    if REPORTLAB:
+                        title = f"{p['name']} — Study Plan"
+                        st.download_button(f"Download Plan #{offset+i+1} (PDF)",
+                                           lazy_pdf(pdf_key(title, p["raw"]), lambda p=p, title=title: [(title, p["raw"])]),
+                                           f"plan_{offset+i+1}.pdf", mime="application/pdf", key=f"pdf_{m['id']}")
 
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -515,12 +942,31 @@ A professional, production-friendly Streamlit app that:
 - Generates AI-powered weekly & daily study plans
 - Produces smart timetables and progress dashboards
 - Offers an AI chat assistant for quick help & motivation
-- Supports export to PDF (optional) and TXT, and timetable CSV
+- Supports export to PDF (optional) and TXT, and timetable CSV and calendar (.ics)
 - Polished UI, responsive layout, and saveable plan history
 
 > To use the OpenAI features: add your API key to Streamlit secrets as OPENAI_API_KEY or configure environment secrets.
 """)
     st.markdown("</div>", unsafe_allow_html=True)
 
+persist_session()
+
+# ---------------- Debug panel ----------------
+if DEBUG_PANEL:
+    if profiler is not None:
+        profiler.stop()
+        st.session_state.pop("profiler", None)
+    with st.sidebar.expander("🛠 Debug · profiling", expanded=profiler is not None):
+        st.checkbox("Profile reruns", key="prof_on")
+        st.checkbox("Track allocations (tracemalloc)", key="prof_alloc")
+        st.checkbox("Sample with cProfile", key="prof_cprofile")
+        if profiler is not None:
+            st.caption(f"Last rerun: {profiler.seconds * 1000:.1f} ms on {page}")
+            st.dataframe(profiler.summary(), hide_index=True)
+            if profiler.cprofile_text:
+                st.code(profiler.cprofile_text, language="text")
+            append_profile(st.secrets.get("PROFILE_PATH", ".data/profile.jsonl"), profiler.record(page=page))
+
 # ---------------- Footer ----------------
+Metrics.maybe_export(st.secrets.get("METRICS_PATH", ".data/metrics.prom"))
 st.markdown("<div class='footer'>Made with ❤️ using Streamlit & OpenAI — Premium Blue Edition</div>", unsafe_allow_html=True)
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""
+bench_cohort.py — end-to-end cohort plan generation against a local fake OpenAI server.
+Generates plans for N students, kills the run part-way, resumes from the output
+checkpoint and checks every student ends up with exactly one successful plan.
+Reports throughput and p50/p95 latency; fails if throughput is under budget.
+Run: python -m benchmarks.bench_cohort
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+from agent.cohort import CohortGenerator, make_async_client, print_report
+from benchmarks.fake_openai import FakeOpenAIServer
+
+def make_profiles(n):
+    subjects = ["Math", "DBMS", "AI", "Physics", "Chemistry", "OS", "Networks"]
+    return [(str(i), {"id": i, "name": f"Student {i}", "subjects": subjects[i % 5:i % 5 + 3],
+                      "weekly_hours": 10 + i % 20, "deadline": "2030-06-01", "intensity": 1 + i % 10})
+            for i in range(n)]
+
+async def run(server, profiles, out_path, args, stop_after=None):
+    client = make_async_client("fake", server.url, max_connections=args.concurrency)
+    gen = CohortGenerator(client, concurrency=args.concurrency, rps=args.rps)
+    try:
+        if stop_after is None:
+            return await gen.run(profiles, out_path)
+        # simulate a crash: cancel the run once `stop_after` lines are on disk
+        task = asyncio.create_task(gen.run(profiles, out_path))
+        while not task.done():
+            await asyncio.sleep(0.05)
+            with open(out_path, encoding="utf-8") as f:
+                if sum(1 for _ in f) >= stop_after:
+                    task.cancel()
+                    break
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    finally:
+        await client.close()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--students", type=int, default=300)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--rps", type=float, default=200.0)
+    ap.add_argument("--latency", type=float, default=0.15, help="mean fake server latency (s)")
+    ap.add_argument("--fail-rate", type=float, default=0.02, help="fraction of requests answered with 429")
+    # the fake server shares this process (and its GIL), and retried requests back off,
+    # so the measured rate sits well under the ideal; the budget catches regressions
+    # like lost concurrency, not small overheads
+    ap.add_argument("--min-efficiency", type=float, default=0.3,
+                    help="fail below this fraction of the ideal min(concurrency/latency, rps) throughput")
+    args = ap.parse_args(argv)
+
+    profiles = make_profiles(args.students)
+    with FakeOpenAIServer(latency=(args.latency, args.latency / 4), fail_rate=args.fail_rate) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "plans.jsonl")
+        asyncio.run(run(server, profiles, out_path, args, stop_after=args.students // 3))
+        with open(out_path, encoding="utf-8") as f:
+            before = sum(1 for _ in f)
+        print(f"interrupted after {before} results; resuming", file=sys.stderr)
+        stats = asyncio.run(run(server, profiles, out_path, args))
+        print_report(stats)
+
+        ok = {}
+        with open(out_path, encoding="utf-8") as f:
+            for line in f:
+                rec = json.loads(line)
+                if rec["ok"]:
+                    ok[rec["id"]] = ok.get(rec["id"], 0) + 1
+        print(f"fake server: {server.requests} requests, {server.failures} injected 429s", file=sys.stderr)
+
+    failed = False
+    missing = args.students - len(ok)
+    dupes = sum(1 for n in ok.values() if n > 1)
+    if missing or dupes:
+        print(f"FAIL: {missing} students without a plan, {dupes} with duplicates", file=sys.stderr)
+        failed = True
+    ideal = min(args.concurrency / args.latency, args.rps)
+    if stats["plans_per_sec"] < ideal * args.min_efficiency:
+        print(f"FAIL: {stats['plans_per_sec']:.1f} plans/sec is under {args.min_efficiency:.0%} "
+              f"of the ideal {ideal:.1f}", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
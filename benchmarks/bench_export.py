@@ -0,0 +1,90 @@
+"""
+bench_export.py — streaming .ics / CSV export of long schedules versus building
+the whole document as one string. Reports time, output size and peak traced
+memory; fails if a streamed export's peak memory exceeds --max-mb, whatever
+the size of its output.
+Run: python -m benchmarks.bench_export
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from agent.export import schedule_csv, schedule_ics, timetable_csv, write_chunks
+from agent.tools import slot_time
+from benchmarks.bench_timetable import make_profiles
+
+SUBJECTS = ["Math", "DBMS", "AI", "Physics", "Chemistry", "Biology", "History", "English"]
+
+def make_schedule(days, per_day, seed=0):
+    """PlannerTool-shaped schedule: the same weekly pattern with ~10% of blocks changed."""
+    rnd = random.Random(seed)
+    week = [[rnd.choice(SUBJECTS) for _ in range(per_day)] for _ in range(7)]
+    start = date(2026, 9, 1)
+    schedule = {}
+    for d in range(days):
+        day = start + timedelta(days=d)
+        pattern = week[day.weekday()]
+        blocks = []
+        for k in range(per_day):
+            subject = pattern[k] if rnd.random() > 0.1 else rnd.choice(SUBJECTS)
+            blocks.append({"subject": subject, "hours": 0.5, "start": slot_time(18 + k),
+                           "end": slot_time(19 + k), "day": day.strftime("%A")})
+        schedule[day.isoformat()] = blocks
+    return schedule
+
+def export(make_chunks, streamed, out):
+    if streamed:
+        return write_chunks(make_chunks(), out)
+    return out.write("".join(make_chunks()))
+
+def measure(make_chunks, streamed):
+    """(seconds, characters, peak traced bytes) for writing the chunks to /dev/null."""
+    with open(os.devnull, "w", encoding="utf-8") as out:
+        t0 = time.perf_counter()
+        n = export(make_chunks, streamed, out)
+        seconds = time.perf_counter() - t0
+        # traced separately: tracemalloc slows allocation-heavy code several times over
+        tracemalloc.start()
+        export(make_chunks, streamed, out)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, n, peak
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=int, default=1500)
+    ap.add_argument("--per-day", type=int, default=24, help="30-minute blocks per day")
+    ap.add_argument("--students", type=int, default=2000, help="cohort timetable rows = 21 x students")
+    ap.add_argument("--max-mb", type=float, default=1.0, help="fail if a streamed export's peak memory exceeds this")
+    args = ap.parse_args(argv)
+
+    schedule = make_schedule(args.days, args.per_day)
+    blocks = args.days * args.per_day
+    from agent.timetable import generate_cohort_timetables
+    cohort, _ = generate_cohort_timetables(make_profiles(args.students))
+    cases = [
+        (f"schedule .ics, one event per block ({blocks:,})", lambda: schedule_ics(schedule, recur=False)),
+        ("schedule .ics, weekly RRULE runs", lambda: schedule_ics(schedule)),
+        ("schedule CSV", lambda: schedule_csv(schedule)),
+        (f"cohort timetable CSV ({len(cohort):,} rows)", lambda: timetable_csv(cohort)),
+    ]
+    failures = []
+    print(f"{'export':<48}{'MB':>7}{'stream s':>10}{'peak MB':>9}{'join s':>8}{'peak MB':>9}")
+    for label, make_chunks in cases:
+        s_time, size, s_peak = measure(make_chunks, True)
+        j_time, _, j_peak = measure(make_chunks, False)
+        print(f"{label:<48}{size / 1e6:>7.1f}{s_time:>10.2f}{s_peak / 1e6:>9.2f}{j_time:>8.2f}{j_peak / 1e6:>9.2f}")
+        if s_peak > args.max_mb * 1e6:
+            failures.append(f"{label}: streamed peak {s_peak / 1e6:.2f} MB (budget {args.max_mb} MB)")
+    events = sum(chunk.count("BEGIN:VEVENT") for chunk in schedule_ics(schedule))
+    print(f"weekly RRULE runs: {events:,} events for {blocks:,} blocks")
+    for msg in failures:
+        print("FAIL", msg)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+bench_history.py — versioned plan history: a plan regenerated many times with
+small edits (one subject's hours, a task or a tip). Reports stored bytes per
+version against keeping a compressed full copy of every plan, for two plan
+sizes, and the time to diff and load versions; fails if versions cost more
+than --max-share of full copies, if bytes per version grow more than
+--max-growth between plan sizes, or if a diff takes more than --max-diff-ms.
+Run: python -m benchmarks.bench_history
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+from agent.history import PlanHistory
+from agent.memory import SQLiteMemoryBank
+from agent.plan_model import StudyPlan
+from agent.utils import week_days
+
+def make_plan(n_subjects):
+    subjects = [f"Subject {i}" for i in range(n_subjects)]
+    weekly, daily = [], []
+    for day in week_days():
+        for k, subject in enumerate(subjects):
+            weekly.append({"day": day, "subject": subject, "hours": 2.0, "focus": f"{subject} problem sets",
+                           "revision_hours": 0.5})
+            daily.append({"day": day, "start": f"{(8 * 60 + 45 * k) // 60:02d}:{(45 * k) % 60:02d}",
+                          "end": f"{(8 * 60 + 45 * k + 40) // 60:02d}:{(45 * k + 40) % 60:02d}",
+                          "subject": subject, "task": f"Work through the next {subject} chapter and its exercises"})
+    tips = ["Review notes within 24 hours", "Use active recall", "Sleep at least 7 hours", "Take short breaks"]
+    return {"weekly": weekly, "daily": daily, "tips": tips}
+
+def edit(plan, rnd):
+    """One small regeneration: change a subject's hours on a day, a task, or a tip."""
+    kind = rnd.random()
+    if kind < 0.6:
+        subject = rnd.choice(plan["weekly"])["subject"]
+        day = rnd.choice(week_days())
+        for row in plan["weekly"]:
+            if row["subject"] == subject and row["day"] == day:
+                row["hours"] = round(row["hours"] + rnd.choice([-0.5, 0.5]), 1)
+    elif kind < 0.9:
+        block = rnd.choice(plan["daily"])
+        block["task"] = f"Practice set {rnd.randint(1, 999)} for {block['subject']}"
+    else:
+        plan["tips"][rnd.randrange(len(plan["tips"]))] = f"Tip {rnd.randint(1, 999)}"
+
+def full_copy_bytes(raw, plan):
+    # what PlanHistory stored per plan before versioning: base64(zlib(json))
+    data = zlib.compress(json.dumps({"raw": raw, "plan": plan}, separators=(",", ":")).encode("utf-8"), 6)
+    return len(base64.b64encode(data))
+
+def run(n_subjects, versions):
+    rnd = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.sqlite3")
+        bank = SQLiteMemoryBank(path)
+        history = PlanHistory(bank, "bench")
+        data = make_plan(n_subjects)
+        full = 0
+        t0 = time.perf_counter()
+        for i in range(versions):
+            if i:
+                edit(data, rnd)
+            plan = StudyPlan.from_dict(data, "Student")
+            raw = plan.to_markdown()
+            full += full_copy_bytes(raw, plan.to_dict())
+            history.insert(0, {"name": "Student", "raw": raw, "plan": plan.to_dict(), "time": f"v{i:05d}",
+                               "hours": plan.subject_hours()})
+        insert_ms = (time.perf_counter() - t0) / versions * 1e3
+
+        ids = [m["id"] for m in history.search()]     # newest first
+        diffs, changes = [], 0
+        for new_id, old_id in zip(ids[:50], ids[1:51]):
+            t0 = time.perf_counter()
+            changes += len(history.diff(old_id, new_id))
+            diffs.append((time.perf_counter() - t0) * 1e3)
+        t0 = time.perf_counter()
+        span = len(history.diff(ids[-1], ids[0]))
+        span_ms = (time.perf_counter() - t0) * 1e3
+        t0 = time.perf_counter()
+        for plan_id in ids[:50]:
+            assert history.load(plan_id)["plan"] is not None
+        load_ms = (time.perf_counter() - t0) / min(50, len(ids)) * 1e3
+        objects, object_bytes = history.storage()
+        bank.close()
+        with sqlite3.connect(path) as db:
+            record_bytes = db.execute("SELECT SUM(LENGTH(record)) FROM records").fetchone()[0]
+    return {"subjects": n_subjects, "versions": versions, "full": full, "first": full_copy_bytes(raw, plan.to_dict()),
+            "objects": objects, "object_bytes": object_bytes, "record_bytes": record_bytes,
+            "stored": object_bytes + record_bytes, "insert_ms": insert_ms, "diff_ms": statistics.median(diffs),
+            "changes": changes / len(diffs), "span": span, "span_ms": span_ms, "load_ms": load_ms}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--versions", type=int, default=300)
+    ap.add_argument("--subjects", default="6,24", help="plan sizes to compare (subjects per day)")
+    ap.add_argument("--max-share", type=float, default=0.4,
+                    help="fail if versions take more than this share of compressed full copies")
+    ap.add_argument("--max-growth", type=float, default=2.0,
+                    help="fail if the largest plan's bytes per version exceed the smallest's by more than this factor")
+    ap.add_argument("--max-diff-ms", type=float, default=20.0)
+    args = ap.parse_args(argv)
+
+    results = [run(int(n), args.versions) for n in args.subjects.split(",")]
+    failures = []
+    print(f"{'subjects':>8}{'full copy KB':>13}{'B/version':>10}{'versioned B/version':>21}{'share':>7}"
+          f"{'insert ms':>10}{'diff ms':>9}{'load ms':>9}")
+    for r in results:
+        per_version = r["stored"] / r["versions"]
+        share = r["stored"] / r["full"]
+        print(f"{r['subjects']:>8}{r['first'] / 1024:>13.1f}{r['full'] / r['versions']:>10.0f}{per_version:>21.0f}"
+              f"{share:>7.1%}{r['insert_ms']:>10.2f}{r['diff_ms']:>9.2f}{r['load_ms']:>9.2f}")
+        print(f"{'':>8}  {r['objects']} objects ({r['object_bytes'] / 1024:.0f} KB), version records "
+              f"{r['record_bytes'] / 1024:.0f} KB; {r['changes']:.1f} changes per regeneration, "
+              f"first→last diff {r['span']} changes in {r['span_ms']:.2f} ms")
+        if share > args.max_share:
+            failures.append(f"{r['subjects']} subjects: versions take {share:.1%} of full copies "
+                            f"(budget {args.max_share:.0%})")
+        if r["diff_ms"] > args.max_diff_ms:
+            failures.append(f"{r['subjects']} subjects: median diff {r['diff_ms']:.2f} ms "
+                            f"(budget {args.max_diff_ms} ms)")
+    small, large = results[0], results[-1]
+    growth = (large["stored"] / large["versions"]) / (small["stored"] / small["versions"])
+    size = large["first"] / small["first"]
+    print(f"a {size:.1f}x larger plan costs {growth:.1f}x more per version")
+    if growth > args.max_growth:
+        failures.append(f"bytes per version grow {growth:.1f}x for a {size:.1f}x larger plan "
+                        f"(budget {args.max_growth}x)")
+    for msg in failures:
+        print("FAIL", msg)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
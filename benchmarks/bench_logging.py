@@ -0,0 +1,125 @@
+"""
+bench_logging.py — request-thread cost of agent.observability.Logger versus
+synchronous handlers writing the same stderr-style and JSON-lines output.
+Reports per-call microseconds (median and p99 over batches) with the listener
+idle and during bursts, end-to-end throughput and the cost of sampled / disabled
+debug calls; fails if an info() call costs more than --max-us on the calling thread.
+Run: python -m benchmarks.bench_logging
+"""
+import argparse
+import logging
+import logging.handlers
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from agent.observability import (
+    JsonFormatter, Logger, Trace, _LogState, configure_logging, flush_logging,
+)
+from agent.utils import percentile
+
+def per_call_us(fn, calls, batch=500, between=None):
+    """
+    (median, p99) of the per-call time in microseconds, measured over batches
+    of `batch` calls; `between` runs untimed after each batch.
+    """
+    samples = []
+    for b in range(0, calls, batch):
+        t0 = time.perf_counter()
+        for i in range(b, b + batch):
+            fn(i)
+        samples.append((time.perf_counter() - t0) / batch * 1e6)
+        if between is not None:
+            between()
+    samples.sort()
+    return statistics.median(samples), percentile(samples, 99)
+
+def sync_logger(path, stream):
+    lg = logging.getLogger("bench.sync")
+    lg.handlers.clear()
+    lg.propagate = False
+    lg.setLevel(logging.INFO)
+    console = logging.StreamHandler(stream)
+    console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    rotating = logging.handlers.RotatingFileHandler(path, maxBytes=5_000_000, backupCount=3, encoding="utf-8")
+    rotating.setFormatter(JsonFormatter())
+    lg.addHandler(console)
+    lg.addHandler(rotating)
+    return lg
+
+def drain():
+    # with the listener stopped, timed calls measure only the calling thread;
+    # the records are written here, between batches
+    _LogState.listener.start()
+    _LogState.listener.stop()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=20_000)
+    ap.add_argument("--max-us", type=float, default=15.0,
+                    help="fail if a Logger.info() call costs more than this on the calling thread (median)")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        Trace.start_trace("bench-trace")
+
+        lg = sync_logger(os.path.join(tmp, "sync.jsonl"), devnull)
+        sync = per_call_us(lambda i: lg.info("plan generated %d", i, extra={
+            "session_id": "bench", "trace_id": "bench-trace", "fields": {"model": "gpt-4o-mini", "i": i}}), args.calls)
+        for h in lg.handlers:
+            h.close()
+
+        # stderr output goes to /dev/null so the terminal does not slow the listener down
+        saved_stderr, sys.stderr = sys.stderr, devnull
+        try:
+            configure_logging(level="INFO", path=os.path.join(tmp, "queued.jsonl"), max_bytes=1 << 30,
+                              queue_size=args.calls + 1)
+            log = Logger(session_id="bench")
+            _LogState.listener.stop()
+            queued = per_call_us(lambda i: log.info("plan generated %d", i, model="gpt-4o-mini", i=i),
+                                 args.calls, batch=100, between=drain)
+            _LogState.listener.start()
+            # bursts: the listener competes with the caller for the GIL while it writes
+            burst = per_call_us(lambda i: log.info("plan generated %d", i, model="gpt-4o-mini", i=i), args.calls)
+            flush_logging()
+
+            t0 = time.perf_counter()
+            for i in range(args.calls):
+                log.info("plan generated %d", i, model="gpt-4o-mini", i=i)
+            flush_logging()
+            throughput = args.calls / (time.perf_counter() - t0)
+            calls = 3 * args.calls
+            dropped = _LogState.handler.dropped
+
+            configure_logging(level="DEBUG", path=os.path.join(tmp, "debug.jsonl"), debug_sample_rate=0.01)
+            log = Logger(session_id="bench")
+            sampled = per_call_us(lambda i: log.debug("tick", i=i), args.calls)
+            configure_logging(level="INFO", path=os.path.join(tmp, "debug.jsonl"))
+            log = Logger(session_id="bench")
+            disabled = per_call_us(lambda i: log.debug("tick", i=i), args.calls)
+            flush_logging()
+        finally:
+            sys.stderr = saved_stderr
+        with open(os.path.join(tmp, "queued.jsonl"), encoding="utf-8") as f:
+            written = sum(1 for _ in f)
+
+    print(f"{'call':<34}{'median us':>10}{'p99 us':>10}")
+    for label, (med, p99) in [("sync handlers info()", sync), ("Logger.info()", queued),
+                              ("Logger.info() in a burst", burst), ("Logger.debug() sampled @1%", sampled),
+                              ("Logger.debug() at INFO", disabled)]:
+        print(f"{label:<34}{med:>10.2f}{p99:>10.2f}")
+    print(f"end-to-end {throughput:,.0f} records/s; {written} of {calls} records written, {dropped} dropped")
+
+    failures = []
+    if queued[0] > args.max_us:
+        failures.append(f"Logger.info() costs {queued[0]:.2f} us on the calling thread (budget {args.max_us} us)")
+    if written != calls:
+        failures.append(f"{calls - written} records missing from the log file")
+    for msg in failures:
+        print("FAIL", msg)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+bench_pipeline.py — end-to-end Planner, Dashboard and Chatbot paths on the offline FakeBackend.
+Times each stage (prompt build → LLM → sanitize_text → pretty_split_plan → HTML
+render → dashboard parse, plus the structured-JSON, streaming and chat paths) for
+1-, 4- and 12-week plans, and compares medians with benchmarks/pipeline_baseline.json.
+Run: python -m benchmarks.bench_pipeline [--update-baseline]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from agent.chat_context import ChatContext
+from agent.llm_backend import FakeBackend
+from agent.plan_model import PLAN_RESPONSE_FORMAT, StudyPlan, subject_hours_from_markdown
+from agent.prompts import plan_messages
+from agent.render import (
+    MarkdownRenderer, pretty_split_plan, render_markdown, render_plan_card, sanitize_text,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline_baseline.json")
+MODEL = "gpt-4o-mini"
+
+def make_profile(weeks):
+    return {"name": "Bench", "subjects": ["Math", "DBMS", "AI", "Physics"], "weekly_hours": 20,
+            "deadline": f"in {weeks} weeks", "intensity": 6, "include_revision": True, "include_tips": True}
+
+class Stages:
+    """Collects per-stage timings for one run of a path."""
+    def __init__(self):
+        self.times = {}
+
+    def time(self, stage, fn, *args):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        self.times[stage] = time.perf_counter() - t0
+        return out
+
+def markdown_path(backend, profile):
+    s = Stages()
+    messages = s.time("prompt", plan_messages, profile)
+    content, _ = s.time("llm", backend.complete, MODEL, messages, 0.25)
+    raw = s.time("sanitize", sanitize_text, content)
+    weekly, daily, tips = s.time("split", pretty_split_plan, raw)
+    s.time("render", lambda: render_plan_card("Bench", render_markdown(weekly), render_markdown(daily),
+                                              render_markdown(tips)))
+    s.time("dashboard", subject_hours_from_markdown, raw)
+    return s.times
+
+def structured_path(backend, profile):
+    s = Stages()
+    messages = s.time("prompt", plan_messages, profile, True)
+    content, _ = s.time("llm", backend.complete, MODEL, messages, 0.25, PLAN_RESPONSE_FORMAT)
+    plan = s.time("parse", StudyPlan.from_json, content, "Bench")
+    s.time("render", lambda: render_plan_card("Bench", *plan.html_sections()))
+    s.time("text", plan.to_markdown)
+    s.time("dashboard", plan.subject_hours)
+    return s.times
+
+def stream_path(backend, profile):
+    def consume(deltas):
+        renderer, preview = MarkdownRenderer(), []
+        for d in deltas:
+            preview.append(sanitize_text(renderer.feed(d)))
+        preview.append(renderer.close())
+        return "".join(preview)
+    s = Stages()
+    messages = s.time("prompt", plan_messages, profile)
+    deltas = s.time("llm_open", backend.stream, MODEL, messages, 0.25)
+    s.time("stream_render", consume, deltas)
+    return s.times
+
+def chat_path(backend, turns):
+    ctx = ChatContext()
+    system = "You are a study expert. Provide structured study guidance and short examples."
+    for i in range(turns):
+        ctx.add("you", f"Question {i}: how should I revise topic {i} before the exam?")
+        ctx.add("ai", f"Answer {i}: " + "spaced practice and active recall " * 10)
+    s = Stages()
+    ctx.add("you", "What should I study tomorrow?")
+    if ctx.needs_compaction(system):
+        s.time("compact", ctx.compact, system)
+    messages = s.time("context", ctx.messages, system)
+    content, _ = s.time("llm", backend.complete, MODEL, messages, 0.25)
+    s.time("sanitize", sanitize_text, content)
+    return s.times
+
+def measure(repeat):
+    results = {}
+
+    def record(name, fn):
+        runs = [fn() for _ in range(repeat)]
+        for stage in runs[0]:
+            results[f"{name}/{stage}"] = statistics.median(r[stage] for r in runs) * 1e6
+
+    for weeks in (1, 4, 12):
+        # zero latency: the benchmark measures our code, not the simulated network
+        backend = FakeBackend(weeks=weeks, blocks_per_day=3)
+        profile = make_profile(weeks)
+        record(f"markdown_{weeks}w", lambda: markdown_path(backend, profile))
+        record(f"structured_{weeks}w", lambda: structured_path(backend, profile))
+        record(f"stream_{weeks}w", lambda: stream_path(backend, profile))
+    record("chat_200turns", lambda: chat_path(FakeBackend(), 100))
+    return results
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=15)
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--update-baseline", action="store_true", help="store this run as the new baseline")
+    ap.add_argument("--tolerance", type=float, default=2.5,
+                    help="fail if a stage is slower than this multiple of its baseline")
+    ap.add_argument("--floor-us", type=float, default=50.0,
+                    help="stages faster than this (in baseline and now) are too noisy to compare")
+    args = ap.parse_args(argv)
+
+    results = measure(args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["stages_us"]
+
+    failures = []
+    print(f"{'stage':<32}{'now (us)':>12}{'baseline':>12}{'ratio':>8}")
+    for stage, us in results.items():
+        base = baseline.get(stage)
+        ratio = us / base if base else None
+        print(f"{stage:<32}{us:>12.1f}{base if base is not None else float('nan'):>12.1f}"
+              f"{ratio if ratio is not None else float('nan'):>8.2f}")
+        if ratio is not None and max(us, base) >= args.floor_us and ratio > args.tolerance:
+            failures.append(f"{stage}: {us:.1f} us is {ratio:.2f}x the baseline {base:.1f} us")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"repeat": args.repeat, "stages_us": {k: round(v, 1) for k, v in results.items()}},
+                      f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+    for msg in failures:
+        print("FAIL", msg)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
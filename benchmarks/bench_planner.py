@@ -0,0 +1,60 @@
+"""
+bench_planner.py — PlannerTool.create_schedule on long horizons.
+Plans N subjects over a multi-month horizon and fails if a run exceeds the budget,
+or if a one-week plan does not add up to its weekly hours.
+Run: python -m benchmarks.bench_planner
+"""
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+
+from agent.tools import PlannerTool
+
+def make_profile(n_subjects, horizon_days, weekly_hours):
+    start = date.today()
+    subjects = [f"Subject {i}" for i in range(n_subjects)]
+    return {
+        "name": "bench",
+        "subjects": subjects,
+        "weekly_hours": weekly_hours,
+        "priority": {s: 1 + i % 3 for i, s in enumerate(subjects)},
+        # spread deadlines across the horizon; the last one sets its length
+        "deadlines": {s: (start + timedelta(days=horizon_days * (i + 1) // n_subjects)).isoformat()
+                      for i, s in enumerate(subjects)},
+        "start_date": start.isoformat(),
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--subjects", default="5,20,40", help="comma separated subject counts")
+    ap.add_argument("--days", type=int, default=183, help="planning horizon in days")
+    ap.add_argument("--weekly-hours", type=float, default=40)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--budget", type=float, default=1.0, help="max seconds per schedule")
+    args = ap.parse_args(argv)
+
+    planner = PlannerTool()
+    ok = True
+    # one week, no deadlines: the scheduled hours must match the request, however unevenly they divide
+    for hours in (1, 2, 4, 7.5, 8, 13):
+        schedule = planner.create_schedule({"subjects": ["Math", "AI", "Physics"], "weekly_hours": hours})
+        scheduled = sum(b["hours"] for blocks in schedule.values() for b in blocks)
+        if scheduled != hours:
+            ok = False
+            print(f"FAIL {hours:g} h/week scheduled as {scheduled:g} h")
+    for n in [int(x) for x in args.subjects.split(",")]:
+        profile = make_profile(n, args.days, args.weekly_hours)
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            schedule = planner.create_schedule(profile)
+            best = min(best, time.perf_counter() - t0)
+        blocks = sum(len(b) for b in schedule.values())
+        status = "ok" if best <= args.budget else "OVER BUDGET"
+        ok = ok and best <= args.budget
+        print(f"{n:>4} subjects x {len(schedule):>4} days: {blocks:>6} blocks in {best*1e3:8.1f} ms  {status}")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
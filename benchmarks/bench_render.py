@@ -0,0 +1,77 @@
+"""
+bench_render.py — microbenchmark for agent.render on multi-hundred-KB plans.
+Checks that rendering time per KB stays flat as plans grow (linear scaling),
+both for whole-document and streamed (small chunk) input.
+Run: python -m benchmarks.bench_render
+"""
+import argparse
+import sys
+import time
+
+from agent.render import render_markdown, render_markdown_stream
+
+DAYS = ["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday"]
+SUBJECTS = ["Math", "DBMS", "AI", "Physics", "Algorithms", "Networks"]
+
+def make_plan(target_bytes):
+    """Build a realistic-looking markdown plan of roughly `target_bytes`."""
+    out = []
+    size = 0
+    week = 0
+    while size < target_bytes:
+        week += 1
+        chunk = [f"## Week {week} Overview",
+                 "| Day | Subject | Study Hours | Focus Area | Revision Hours |",
+                 "|---|---|---|---|---|"]
+        for i, d in enumerate(DAYS):
+            s = SUBJECTS[(i + week) % len(SUBJECTS)]
+            chunk.append(f"| {d} | {s} | {1 + i % 3} | Chapter {week}.{i} problems | 0.5 |")
+        chunk.append("")
+        chunk.append("## Daily Breakdown")
+        for d in DAYS:
+            chunk.append(f"### {d}")
+            chunk.append(f"- 09:00-11:00 {SUBJECTS[week % len(SUBJECTS)]}: read notes and summarise key ideas")
+            chunk.append(f"- 14:00-15:30 {SUBJECTS[(week + 1) % len(SUBJECTS)]}: timed practice set")
+        chunk.append("Keep sessions focused and take short breaks.")
+        text = "\n".join(chunk) + "\n"
+        out.append(text)
+        size += len(text)
+    return "".join(out)
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="100,200,400,800", help="plan sizes in KB")
+    ap.add_argument("--chunk", type=int, default=64, help="chunk size for the streamed run")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--max-ratio", type=float, default=2.0,
+                    help="fail if us/KB at the largest size exceeds this multiple of the smallest")
+    args = ap.parse_args(argv)
+
+    rows = []
+    for kb in [int(x) for x in args.sizes.split(",")]:
+        md = make_plan(kb * 1024)
+        chunks = [md[i:i + args.chunk] for i in range(0, len(md), args.chunk)]
+        whole = best_of(lambda: render_markdown(md), args.repeat)
+        streamed = best_of(lambda: "".join(render_markdown_stream(chunks)), args.repeat)
+        real_kb = len(md) / 1024
+        rows.append((kb, whole * 1e6 / real_kb, streamed * 1e6 / real_kb))
+        print(f"{kb:>6} KB  whole {whole*1e3:8.2f} ms ({rows[-1][1]:6.1f} us/KB)"
+              f"  streamed {streamed*1e3:8.2f} ms ({rows[-1][2]:6.1f} us/KB)")
+
+    ok = True
+    for col, label in ((1, "whole"), (2, "streamed")):
+        ratio = rows[-1][col] / rows[0][col]
+        print(f"{label}: us/KB ratio largest/smallest = {ratio:.2f}")
+        ok = ok and ratio <= args.max_ratio
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
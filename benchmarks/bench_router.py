@@ -0,0 +1,104 @@
+"""
+bench_router.py — ModelRouter against the offline FakeBackend with per-model latencies.
+Three scenarios: a slow premium model (served p95 must stay near the SLO), a
+tight per-user budget (total spend must stay within it, with requests refused
+once it is used up) and a premium model that always times out (every request
+must still be answered via the fallback).
+Run: python -m benchmarks.bench_router
+"""
+import argparse
+import sys
+import time
+
+from agent.llm_backend import FakeBackend
+from agent.prompts import plan_messages
+from agent.router import BudgetExceeded, ModelRouter
+from agent.utils import percentile
+
+def request(i):
+    return plan_messages({"name": f"Student {i}", "subjects": ["Math", "AI", f"Topic {i}"]})
+
+def drive(router, backend, n, user="bench", streamed=False):
+    """Send `n` requests; returns (served latencies, decisions of the served ones, refused count)."""
+    latencies, decisions, refused = [], [], 0
+    for i in range(n):
+        messages = request(i)
+        decision = router.choose(user, messages, streamed=streamed)
+        t0 = time.perf_counter()
+        if decision.over_budget:
+            try:
+                router.complete(backend, decision, messages, 0.25)
+            except BudgetExceeded:
+                refused += 1
+                continue
+        if streamed:
+            deltas = router.stream(backend, decision, messages, 0.25)
+            next(deltas)
+            latencies.append(time.perf_counter() - t0)
+            for _ in deltas:
+                pass
+        else:
+            router.complete(backend, decision, messages, 0.25)
+            latencies.append(time.perf_counter() - t0)
+        decisions.append(decision)
+    return latencies, decisions, refused
+
+def share(decisions, model):
+    return sum(d.model == model for d in decisions) / len(decisions)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=80)
+    ap.add_argument("--slo", type=float, default=0.05, help="p95 latency SLO in seconds")
+    args = ap.parse_args(argv)
+    failures = []
+
+    # 1) the premium model is over the SLO: traffic should move to the fast model
+    backend = FakeBackend(sigma=0.3, model_latency={"gpt-4o": 3 * args.slo, "gpt-4o-mini": args.slo / 5})
+    router = ModelRouter(p95_slo=args.slo, user_budget=None, window=60, min_samples=5)
+    latencies, decisions, _ = drive(router, backend, args.requests)
+    served = sorted(latencies[router.min_samples:])
+    p95 = percentile(served, 95)
+    print(f"slow premium: p95 {p95 * 1e3:.1f} ms (SLO {args.slo * 1e3:.0f} ms), "
+          f"gpt-4o share {share(decisions, 'gpt-4o'):.0%}")
+    if p95 > args.slo * 1.2:
+        failures.append(f"served p95 {p95 * 1e3:.1f} ms is over the {args.slo * 1e3:.0f} ms SLO")
+
+    # 2) tight budget: the premium model until the budget runs low, then the cheap
+    # one, then refusals; spend is estimated before each call, hence the tolerance
+    backend = FakeBackend(model_latency={"gpt-4o": 0.001, "gpt-4o-mini": 0.001})
+    budget = 0.05
+    router = ModelRouter(p95_slo=args.slo, user_budget=budget)
+    _, decisions, refused = drive(router, backend, args.requests)
+    spent = router.spent("bench")
+    premium_spend = sum(r["cost_usd"] for r in router.snapshot() if r["model"] == "gpt-4o")
+    print(f"budget: ${spent:.4f} spent of ${budget:.2f} (gpt-4o ${premium_spend:.4f}), "
+          f"gpt-4o share {share(decisions, 'gpt-4o'):.0%}, {refused} refused")
+    if spent > budget * 1.05:
+        failures.append(f"total spend ${spent:.4f} is over the ${budget:.2f} budget")
+    if not refused:
+        failures.append("no request was refused once the budget was used up")
+    if not 0 < share(decisions, "gpt-4o") < 1:
+        failures.append("the budget did not shift traffic to the cheaper model")
+
+    # 3) the premium model hangs: every request falls back within the timeout
+    timeout = 0.1
+    backend = FakeBackend(model_latency={"gpt-4o": 10 * timeout, "gpt-4o-mini": 0.001})
+    router = ModelRouter(user_budget=None, timeout=timeout, ttft_timeout=timeout, min_samples=3)
+    for streamed in (False, True):
+        latencies, decisions, _ = drive(router, backend, 10, streamed=streamed)
+        worst = max(latencies)
+        fell_back = sum(d.fallback_from == "gpt-4o" for d in decisions)
+        print(f"timeouts ({'stream' if streamed else 'complete'}): {fell_back} fallbacks, "
+              f"worst {worst * 1e3:.0f} ms (timeout {timeout * 1e3:.0f} ms)")
+        if worst > 2 * timeout:
+            failures.append(f"a request took {worst * 1e3:.0f} ms with a {timeout * 1e3:.0f} ms timeout")
+        if any(d.model != "gpt-4o-mini" for d in decisions):
+            failures.append("a request was served by the hanging model")
+
+    for msg in failures:
+        print("FAIL", msg)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+bench_startup.py — cold-start and per-page rerun budget for app.py.
+Each page is loaded cold in a fresh interpreter via Streamlit's AppTest, then
+rerun a few times. Fails if any page exceeds benchmarks/startup_budget.json or
+imports a module its page is not supposed to load.
+Run: python -m benchmarks.bench_startup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(ROOT, "benchmarks", "startup_budget.json")
+TRACKED = ("openai", "pandas", "numpy", "plotly.express", "reportlab")
+
+def measure_page(page, reruns):
+    """Runs in the child interpreter; prints one JSON line."""
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_import = time.perf_counter() - t0
+    with tempfile.TemporaryDirectory() as tmp:
+        at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+        # every file the app writes goes to the temp dir, never the repo's .data/
+        for key, name in (("LLM_CACHE_PATH", "cache.sqlite3"), ("HISTORY_DB_PATH", "history.sqlite3"),
+                          ("METRICS_PATH", "metrics.prom"), ("SESSION_SNAPSHOT_DIR", "sessions"),
+                          ("LOG_PATH", "logs/app.jsonl"), ("PROFILE_PATH", "profile.jsonl")):
+            at.secrets[key] = os.path.join(tmp, name)
+        at.session_state["page"] = page
+        t0 = time.perf_counter()
+        at.run()
+        cold = time.perf_counter() - t0
+        times = []
+        for _ in range(reruns):
+            t0 = time.perf_counter()
+            at.run()
+            times.append(time.perf_counter() - t0)
+        errors = [str(e.value) for e in at.exception]
+    print(json.dumps({
+        "page": page, "streamlit_import": streamlit_import, "cold": cold,
+        "rerun": statistics.median(times) if times else None,
+        "imported": [m for m in TRACKED if m in sys.modules], "errors": errors,
+    }))
+
+def run_child(page, reruns):
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child", page, "--reruns", str(reruns)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    ap.add_argument("--reruns", type=int, default=5)
+    ap.add_argument("--budget", default=BUDGET_PATH)
+    args = ap.parse_args(argv)
+    if args.child:
+        measure_page(args.child, args.reruns)
+        return 0
+
+    with open(args.budget) as f:
+        budget = json.load(f)
+    failures = []
+    for page, limits in budget["pages"].items():
+        r = run_child(page, args.reruns)
+        print(f"{page:<10} cold {r['cold']*1e3:8.1f} ms  rerun {r['rerun']*1e3:7.1f} ms"
+              f"  (streamlit import {r['streamlit_import']*1e3:.0f} ms)  loaded: {', '.join(r['imported']) or '-'}")
+        if r["errors"]:
+            failures.append(f"{page}: raised {r['errors']}")
+        if r["cold"] > limits["cold"]:
+            failures.append(f"{page}: cold {r['cold']:.3f}s > budget {limits['cold']}s")
+        if r["rerun"] > limits["rerun"]:
+            failures.append(f"{page}: rerun {r['rerun']:.3f}s > budget {limits['rerun']}s")
+        for m in limits.get("forbid", []):
+            if m in r["imported"]:
+                failures.append(f"{page}: imported {m}")
+    for f in failures:
+        print("FAIL", f)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
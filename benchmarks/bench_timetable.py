@@ -0,0 +1,48 @@
+"""
+bench_timetable.py — cohort timetables: vectorized batch vs. one call per student.
+Run: python -m benchmarks.bench_timetable
+"""
+import argparse
+import random
+import sys
+import time
+
+from agent.timetable import generate_cohort_timetables, generate_smart_timetable
+
+SUBJECTS = ["Math", "DBMS", "AI", "Physics", "Chemistry", "Biology", "History", "English"]
+
+def make_profiles(n, seed=0):
+    rnd = random.Random(seed)
+    profiles = []
+    for _ in range(n):
+        subs = rnd.sample(SUBJECTS, rnd.randint(1, 6))
+        profiles.append({
+            "subjects": subs,
+            "weekly_hours": rnd.randint(5, 40),
+            "progress": {s: rnd.choice([0, 0.5, 1, 2, 4]) for s in subs},
+        })
+    return profiles
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="100,1000,10000")
+    ap.add_argument("--loop-max", type=int, default=1000, help="largest cohort timed with the per-student loop")
+    args = ap.parse_args(argv)
+
+    for n in [int(x) for x in args.sizes.split(",")]:
+        profiles = make_profiles(n)
+        t0 = time.perf_counter()
+        timetable, _ = generate_cohort_timetables(profiles)
+        batch = time.perf_counter() - t0
+        line = f"{n:>7} students: batch {batch*1e3:9.1f} ms ({len(timetable)} rows)"
+        if n <= args.loop_max:
+            t0 = time.perf_counter()
+            for p in profiles:
+                generate_smart_timetable(p["subjects"], p["weekly_hours"], None, 5, p["progress"])
+            loop = time.perf_counter() - t0
+            line += f"  loop {loop*1e3:9.1f} ms  speedup {loop/batch:6.1f}x"
+        print(line)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
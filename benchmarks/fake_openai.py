@@ -0,0 +1,106 @@
+"""
+fake_openai.py — local OpenAI-compatible chat completions server for benchmarks.
+Answers POST /v1/chat/completions with the FakeBackend's plans (JSON when
+response_format is set, markdown otherwise) or short replies, after a simulated
+latency, optionally failing a fraction of requests with 429 and streaming SSE.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from agent.llm_backend import fake_plan, fake_reply, prompt_subjects
+
+class FakeOpenAIServer:
+    """
+    Threaded fake server; use as a context manager and point base_url at `.url`.
+    Latency is drawn from a normal distribution (mean, stdev in seconds, floored at 0).
+    """
+    def __init__(self, latency=(0.2, 0.05), fail_rate=0.0, seed=0, stream_chunk=16):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.stream_chunk = stream_chunk
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self._server = None
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json"):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                try:
+                    self._answer()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client went away (e.g. a cancelled run)
+
+            def _answer(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake.lock:
+                    fake.requests += 1
+                    fail = fake.rng.random() < fake.fail_rate
+                    delay = max(0.0, fake.rng.gauss(*fake.latency))
+                    seed = fake.rng.random()
+                    if fail:
+                        fake.failures += 1
+                if fail:
+                    self._send(429, json.dumps({"error": {"message": "rate limited", "type": "rate_limit"}}))
+                    return
+                time.sleep(delay)
+                rng = random.Random(seed)
+                subjects = prompt_subjects(body["messages"])
+                if subjects is None:
+                    text = fake_reply(rng)
+                else:
+                    text = fake_plan(subjects, bool(body.get("response_format")), rng)
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    for i in range(0, len(text), fake.stream_chunk):
+                        chunk = {"id": "fake", "object": "chat.completion.chunk", "created": 0,
+                                 "model": body["model"], "choices": [{"index": 0, "finish_reason": None,
+                                 "delta": {"content": text[i:i + fake.stream_chunk]}}]}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.close_connection = True
+                    return
+                self._send(200, json.dumps({
+                    "id": "fake", "object": "chat.completion", "created": 0, "model": body["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": text}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }))
+        return Handler
+
+    def __enter__(self):
+        server_cls = type("Server", (ThreadingHTTPServer,), {"request_queue_size": 256})
+        self._server = server_cls(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"